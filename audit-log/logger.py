@@ -5,6 +5,15 @@ import datetime
 
 DB_PATH = "audit-log/audit_log.db"
 
+# Called with no arguments after rows are committed, e.g. to wake a live stream
+listeners = []
+
+
+def _notify_listeners():
+    for listener in listeners:
+        listener()
+
+
 def log_event(user_id: str, action: str, details: str, encrypted=False):
     try:
         conn = sqlite3.connect(DB_PATH)
@@ -19,6 +28,23 @@ def log_event(user_id: str, action: str, details: str, encrypted=False):
 
         conn.commit()
         conn.close()
+        _notify_listeners()
         print(f"[AUDIT LOG] {timestamp} - {action} - {user_id}")
     except Exception as e:
         print(f"[ERROR] Failed to write to audit log: {str(e)}")
+
+
+def log_events(events: list):
+    """Write a batch of (timestamp, user_id, action, details, encrypted) rows in one transaction"""
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        conn.executemany("""
+            INSERT INTO audit_logs (timestamp, user_id, action, details, encrypted)
+            VALUES (?, ?, ?, ?, ?)
+        """, events)
+        conn.commit()
+        conn.close()
+        _notify_listeners()
+        print(f"[AUDIT LOG] {len(events)} batched events")
+    except Exception as e:
+        print(f"[ERROR] Failed to write to audit log: {str(e)}")
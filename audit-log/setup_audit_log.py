@@ -8,14 +8,18 @@ def create_db():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
+    # Same columns as the gateway's audit_logs (backend/app/migrations/0001_initial_schema.sql)
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS audit_logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             timestamp TEXT NOT NULL,
-            user_id TEXT,
+            user_id TEXT NOT NULL,
             action TEXT NOT NULL,
+            resource TEXT,
             details TEXT,
-            encrypted BOOLEAN DEFAULT 0
+            ip_address TEXT,
+            user_agent TEXT,
+            encrypted INTEGER DEFAULT 0
         )
     """)
 
@@ -0,0 +1,283 @@
+"""
+Admission control for FinTrust Gateway
+Per-user token buckets, a priority queue for concurrency slots and early
+load shedding (429/503 with Retry-After) before work reaches the handlers.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from auth import decode_token
+from config import settings
+from metrics import registry, stage
+
+
+class RouteClass:
+    """Requests with the same cost profile share limits and a queue priority (lower is served first)"""
+
+    def __init__(self, name: str, priority: int, rate: float, burst: float, latency_target_ms: float):
+        self.name = name
+        self.priority = priority
+        self.rate = rate
+        self.burst = burst
+        self.latency_target = latency_target_ms / 1000
+        self.admitted = 0
+        self.throttled = 0
+        self.shed = 0
+        self.avg_service = 0.0
+
+    def observe(self, elapsed: float):
+        # EWMA of time spent holding a slot
+        self.avg_service = elapsed if not self.avg_service else 0.8 * self.avg_service + 0.2 * elapsed
+
+    def snapshot(self) -> dict:
+        return {
+            "priority": self.priority,
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "latency_target_ms": self.latency_target * 1000,
+            "admitted": self.admitted,
+            "throttled": self.throttled,
+            "shed": self.shed,
+            "avg_service_ms": round(self.avg_service * 1000, 3),
+        }
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Consume one token; returns 0 if admitted, else seconds until one is available"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionController:
+    """
+    Every request takes a token from its (user, route class) bucket, then a
+    concurrency slot. When slots are busy, waiters are served by class
+    priority; a request whose estimated queue wait exceeds its class latency
+    target is shed immediately instead of queueing.
+    """
+
+    def __init__(self, max_concurrency: int, classes: List[RouteClass], bucket_idle_seconds: float = 600.0):
+        self.max_concurrency = max_concurrency
+        self.classes = {route_class.name: route_class for route_class in classes}
+        self.bucket_idle_seconds = bucket_idle_seconds
+        self.in_flight = 0
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._waiters: List[Tuple[int, int, asyncio.Future, RouteClass]] = []
+        self._sequence = itertools.count()
+        self._last_prune = time.monotonic()
+
+    # ------------------------------
+    # Classification
+    # ------------------------------
+
+    # The audit stream is long-lived and capped by audit_stream_max_subscribers instead
+    EXEMPT_PREFIXES = ("/health", "/metrics", "/docs", "/redoc", "/openapi.json", "/api/v1/admin",
+                       "/api/v1/audit/stream")
+    EXPENSIVE_PATHS = ("/api/v1/evaluate", "/api/v1/transactions/bulk")
+
+    def classify(self, method: str, path: str) -> Optional[RouteClass]:
+        if method == "OPTIONS" or path == "/" or path.startswith(self.EXEMPT_PREFIXES):
+            return None
+        if method == "POST" and path in self.EXPENSIVE_PATHS:
+            return self.classes["expensive"]
+        if method in ("GET", "HEAD"):
+            return self.classes["interactive"]
+        return self.classes["write"]
+
+    # ------------------------------
+    # Admission
+    # ------------------------------
+
+    def _check_rate(self, user_id: str, route_class: RouteClass, now: float):
+        key = (user_id, route_class.name)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(route_class.rate, route_class.burst, now)
+        wait = bucket.take(now)
+        if wait:
+            route_class.throttled += 1
+            raise Rejected(429, f"Rate limit exceeded for {route_class.name} requests", wait)
+
+        if now - self._last_prune > self.bucket_idle_seconds:
+            self._prune(now)
+
+    def _prune(self, now: float):
+        """Drop buckets idle long enough to have refilled completely"""
+        cutoff = now - self.bucket_idle_seconds
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket.updated >= cutoff}
+        self._last_prune = now
+
+    def _estimated_wait(self, route_class: RouteClass) -> float:
+        """Work queued ahead of this request spread over the concurrency slots"""
+        ahead = sum(c.avg_service for priority, _, _, c in self._waiters if priority <= route_class.priority)
+        return (ahead + route_class.avg_service) / self.max_concurrency
+
+    async def acquire(self, user_id: str, route_class: RouteClass):
+        now = time.monotonic()
+        self._check_rate(user_id, route_class, now)
+
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            route_class.admitted += 1
+            return
+
+        estimated = self._estimated_wait(route_class)
+        if estimated > route_class.latency_target:
+            route_class.shed += 1
+            raise Rejected(503, "Server busy, request shed", estimated)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (route_class.priority, next(self._sequence), future, route_class)
+        heapq.heappush(self._waiters, entry)
+        try:
+            # release() hands the slot over, so in_flight is already counted on wake-up
+            await asyncio.wait_for(asyncio.shield(future), timeout=route_class.latency_target)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Slot was handed over just as the wait ended; give it back
+                self.release(route_class, 0.0)
+            else:
+                future.cancel()
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            route_class.shed += 1
+            raise Rejected(503, "Server busy, queue wait exceeded latency target", route_class.latency_target)
+        route_class.admitted += 1
+
+    def release(self, route_class: RouteClass, elapsed: float):
+        if elapsed:
+            route_class.observe(elapsed)
+        while self._waiters:
+            _, _, future, _ = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(True)
+                return
+        self.in_flight -= 1
+
+    def snapshot(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": {
+                name: sum(1 for _, _, _, c in self._waiters if c is route_class)
+                for name, route_class in self.classes.items()
+            },
+            "tracked_buckets": len(self._buckets),
+            "classes": {name: route_class.snapshot() for name, route_class in self.classes.items()},
+        }
+
+    def user_buckets(self, user_id: str) -> dict:
+        now = time.monotonic()
+        return {
+            class_name: round(min(bucket.capacity, bucket.tokens + (now - bucket.updated) * bucket.rate), 3)
+            for (owner, class_name), bucket in self._buckets.items()
+            if owner == user_id
+        }
+
+
+def _request_user(scope) -> str:
+    """Token subject if the bearer token verifies, else the client address"""
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    return decode_token(token).sub
+                except HTTPException:
+                    break
+            break
+    client = scope.get("client")
+    return f"anon:{client[0] if client else 'unknown'}"
+
+
+class AdmissionMiddleware:
+    """ASGI middleware enforcing an AdmissionController on HTTP requests"""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        route_class = self.controller.classify(scope["method"], scope["path"])
+        if route_class is None:
+            return await self.app(scope, receive, send)
+
+        try:
+            with stage("admission_wait"):
+                await self.controller.acquire(_request_user(scope), route_class)
+        except Rejected as e:
+            response = JSONResponse(
+                status_code=e.status_code,
+                content={"detail": e.detail, "path": scope["path"]},
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            return await response(scope, receive, send)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route_class, time.perf_counter() - start)
+
+
+def build_admission_controller(settings) -> AdmissionController:
+    return AdmissionController(
+        max_concurrency=settings.admission_max_concurrency,
+        classes=[
+            RouteClass("interactive", 0, settings.admission_interactive_rate,
+                       settings.admission_interactive_burst, settings.admission_interactive_latency_ms),
+            RouteClass("write", 1, settings.admission_write_rate,
+                       settings.admission_write_burst, settings.admission_write_latency_ms),
+            RouteClass("expensive", 2, settings.admission_expensive_rate,
+                       settings.admission_expensive_burst, settings.admission_expensive_latency_ms),
+        ],
+    )
+
+
+admission_controller = build_admission_controller(settings)
+
+
+def _admission_metrics():
+    state = admission_controller.snapshot()
+    yield ("fintrust_admission_in_flight", "gauge", "Requests holding an admission slot", {}, state["in_flight"])
+    for name, route_class in state["classes"].items():
+        labels = {"route_class": name}
+        yield ("fintrust_admission_queued", "gauge", "Requests waiting for an admission slot", labels, state["queued"][name])
+        yield ("fintrust_admission_admitted_total", "counter", "Requests admitted", labels, route_class["admitted"])
+        yield ("fintrust_admission_throttled_total", "counter", "Requests rejected with 429", labels, route_class["throttled"])
+        yield ("fintrust_admission_shed_total", "counter", "Requests rejected with 503", labels, route_class["shed"])
+
+
+registry.register_collector(_admission_metrics)
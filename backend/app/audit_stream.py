@@ -0,0 +1,335 @@
+"""
+Live audit stream for FinTrust Gateway
+AuditHub tails the durable audit logs (the gateway's audit_logs, written by
+db.log_audit_event, and the audit-log service's, written by
+audit_log.logger.log_event) and fans new rows out to Server-Sent Events
+subscribers.
+
+Writers only wake the hub; the hub reads committed rows in id order, so every
+event it sends is durable and its id is a position in the logs that a client
+can resume from with Last-Event-ID. A periodic poll also picks up rows
+written by other worker processes.
+
+Each subscriber has a bounded queue. When a slow consumer fills it, the hub
+either drops further events for it (reported to the client as a "dropped"
+event) or disconnects it (an "overflow" event); a reconnect with the last id
+it received replays the gap from the logs.
+"""
+import asyncio
+import heapq
+import json
+import os
+import sqlite3
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+import db
+from audit_log import logger as audit_logger
+from config import settings
+from metrics import registry
+
+FETCH_ROWS = 1000
+REPLAY_PAGE_ROWS = 500
+
+
+@dataclass(frozen=True)
+class AuditSource:
+    """One audit_logs table; key prefixes its position in event ids"""
+    key: str
+    name: str
+    path: Callable[[], str]
+    columns: Tuple[str, ...]
+
+
+SOURCES = (
+    AuditSource("g", "gateway", lambda: db.DB_PATH,
+                ("id", "timestamp", "user_id", "action", "resource", "details", "ip_address", "user_agent", "encrypted")),
+    AuditSource("a", "audit", lambda: audit_logger.DB_PATH,
+                ("id", "timestamp", "user_id", "action", "details", "encrypted")),
+)
+
+
+class CursorError(ValueError):
+    """A Last-Event-ID that is not a stream position"""
+
+
+def format_cursor(positions: Dict[str, int]) -> str:
+    return ".".join(f"{key}{position}" for key, position in positions.items())
+
+
+def parse_cursor(cursor: str, keys) -> Dict[str, int]:
+    positions = {}
+    for part in cursor.strip().split("."):
+        key, number = part[:1], part[1:]
+        if key not in keys or not number.isdigit() or key in positions:
+            raise CursorError(f"Invalid event id: {cursor!r}")
+        positions[key] = int(number)
+    return positions
+
+
+def sse_frame(event: str, data: str, event_id: Optional[str] = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {data}\n\n".encode("utf-8")
+
+
+class Subscriber:
+    """One stream's filters, buffer and overflow state"""
+
+    def __init__(self, actions: Optional[FrozenSet[str]], user_ids: Optional[FrozenSet[str]],
+                 overflow: str, buffer_events: int, positions: Dict[str, int]):
+        self.actions = actions
+        self.user_ids = user_ids
+        self.overflow = overflow
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=buffer_events)
+        # Hub positions when subscribed: live events start after these
+        self.positions = dict(positions)
+        self.dropped = 0
+        self.overflowed = False
+        self.delivered = 0
+
+    def wants(self, action: str, user_id: str) -> bool:
+        return ((self.actions is None or action in self.actions)
+                and (self.user_ids is None or user_id in self.user_ids))
+
+    def offer(self, frame: bytes) -> bool:
+        """Queue a frame; False once the subscriber should be disconnected"""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            if self.overflow == "drop":
+                self.dropped += 1
+                return True
+            self.overflowed = True
+            return False
+
+
+class AuditHub:
+    """Tails the audit logs and broadcasts new rows to subscribers"""
+
+    def __init__(self, buffer_events: int = 256, max_subscribers: int = 2000,
+                 poll_seconds: float = 1.0, keepalive_seconds: float = 15.0):
+        self.buffer_events = buffer_events
+        self.max_subscribers = max_subscribers
+        self.poll_seconds = poll_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self.subscribers: "set[Subscriber]" = set()
+        self.sources: List[AuditSource] = []
+        self.positions: Dict[str, int] = {}
+        self._connections: Dict[str, sqlite3.Connection] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.disconnected = 0
+        self.dropped = 0
+
+    # ------------------------------
+    # Lifecycle
+    # ------------------------------
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        # Both writers may share one database file; tail it once
+        self.sources, seen = [], set()
+        for source in SOURCES:
+            path = os.path.realpath(source.path())
+            if path not in seen and os.path.exists(path):
+                seen.add(path)
+                self.sources.append(source)
+        self.positions = await run_in_threadpool(self._current_positions)
+        db.audit_listeners.append(self.notify)
+        audit_logger.listeners.append(self.notify)
+        self._task = asyncio.create_task(self._run())
+        print(f"📡 Audit stream tailing {', '.join(s.name for s in self.sources) or 'nothing'}")
+
+    async def stop(self):
+        for listeners in (db.audit_listeners, audit_logger.listeners):
+            if self.notify in listeners:
+                listeners.remove(self.notify)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for conn in self._connections.values():
+            conn.close()
+        self._connections.clear()
+
+    def notify(self):
+        """Wake the tailer; called from writer threads after commit"""
+        if self._loop is not None and self.subscribers:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # ------------------------------
+    # Reading the logs
+    # ------------------------------
+
+    def _connection(self, source: AuditSource) -> sqlite3.Connection:
+        conn = self._connections.get(source.key)
+        if conn is None:
+            conn = self._connections[source.key] = sqlite3.connect(
+                source.path(), timeout=30, check_same_thread=False, isolation_level=None)
+        return conn
+
+    def _current_positions(self) -> Dict[str, int]:
+        return {source.key: self._connection(source).execute(
+            "SELECT COALESCE(MAX(id), 0) FROM audit_logs").fetchone()[0] for source in self.sources}
+
+    def _fetch(self, conn: sqlite3.Connection, source: AuditSource, after_id: int, until_id: Optional[int] = None,
+               subscriber: Optional[Subscriber] = None, limit: int = FETCH_ROWS) -> List[dict]:
+        where, params = ["id > ?"], [after_id]
+        if until_id is not None:
+            where.append("id <= ?")
+            params.append(until_id)
+        # Replays filter in SQL; live fan-out filters per subscriber
+        for column, values in (("action", subscriber and subscriber.actions),
+                               ("user_id", subscriber and subscriber.user_ids)):
+            if values:
+                where.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        rows = conn.execute(
+            f"SELECT {', '.join(source.columns)} FROM audit_logs WHERE {' AND '.join(where)} ORDER BY id LIMIT ?",
+            params + [limit]).fetchall()
+        return [{"source": source.name, **dict(zip(source.columns, row))} for row in rows]
+
+    def _fetch_new(self) -> List[Tuple[AuditSource, dict]]:
+        per_source = [[(source, row) for row in self._fetch(self._connection(source), source,
+                                                            self.positions[source.key])]
+                      for source in self.sources]
+        # Each source stays in id order, so its cursor only moves forward (batched
+        # read audits can commit after rows with later timestamps); the sources
+        # are interleaved by time
+        return list(heapq.merge(*per_source, key=lambda item: item[1]["timestamp"]))
+
+    # ------------------------------
+    # Fan-out
+    # ------------------------------
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if not self.subscribers:
+                continue
+            try:
+                while True:
+                    events = await run_in_threadpool(self._fetch_new)
+                    self._publish(events)
+                    if len(events) < FETCH_ROWS:
+                        break
+            except sqlite3.Error as e:
+                print(f"❌ Audit stream read error: {e}")
+
+    def _publish(self, events: List[Tuple[AuditSource, dict]]):
+        for source, row in events:
+            self.positions[source.key] = max(self.positions[source.key], row["id"])
+            # Serialized once and shared by every subscriber's queue
+            frame = sse_frame("audit", json.dumps(row, separators=(",", ":")), format_cursor(self.positions))
+            action, user_id = row["action"], row["user_id"]
+            for subscriber in list(self.subscribers):
+                if subscriber.wants(action, user_id) and not subscriber.offer(frame):
+                    self.subscribers.discard(subscriber)
+                    self.disconnected += 1
+            self.published += 1
+
+    def subscribe(self, actions: Optional[FrozenSet[str]] = None, user_ids: Optional[FrozenSet[str]] = None,
+                  overflow: str = "disconnect") -> Subscriber:
+        if len(self.subscribers) >= self.max_subscribers:
+            raise OverflowError("Too many audit stream subscribers")
+        subscriber = Subscriber(actions, user_ids, overflow, self.buffer_events, self.positions)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        self.dropped += subscriber.dropped
+
+    # ------------------------------
+    # Streams
+    # ------------------------------
+
+    async def _replay(self, subscriber: Subscriber, resume: Dict[str, int]) -> AsyncIterator[bytes]:
+        """Rows between the client's last id and the subscription point, one source at a time"""
+        positions = {key: min(resume.get(key, 0), position) for key, position in subscriber.positions.items()}
+        for source in self.sources:
+            until = subscriber.positions[source.key]
+            if positions[source.key] >= until:
+                continue
+            # Its own connection, so long replays do not hold up the live tailer
+            conn = sqlite3.connect(source.path(), timeout=30, check_same_thread=False)
+            try:
+                while positions[source.key] < until:
+                    rows = await run_in_threadpool(self._fetch, conn, source, positions[source.key], until,
+                                                   subscriber, REPLAY_PAGE_ROWS)
+                    if not rows:
+                        positions[source.key] = until
+                        break
+                    for row in rows:
+                        positions[source.key] = row["id"]
+                        yield sse_frame("audit", json.dumps(row, separators=(",", ":")), format_cursor(positions))
+            finally:
+                conn.close()
+
+    async def stream(self, subscriber: Subscriber, resume: Optional[Dict[str, int]] = None) -> AsyncIterator[bytes]:
+        try:
+            # Clients reconnect after 3s, sending the id of the last event they got
+            yield b"retry: 3000\n\n"
+            if resume is not None:
+                async for frame in self._replay(subscriber, resume):
+                    yield frame
+            while True:
+                if subscriber.overflowed:
+                    yield sse_frame("overflow", json.dumps({"buffer_events": self.buffer_events}))
+                    return
+                try:
+                    # wait_for costs a task and a timer, so only when the buffer is empty
+                    frame = subscriber.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    try:
+                        frame = await asyncio.wait_for(subscriber.queue.get(), self.keepalive_seconds)
+                    except asyncio.TimeoutError:
+                        yield b": keepalive\n\n"
+                        continue
+                if subscriber.dropped:
+                    yield sse_frame("dropped", json.dumps({"count": subscriber.dropped}))
+                    self.dropped += subscriber.dropped
+                    subscriber.dropped = 0
+                subscriber.delivered += 1
+                yield frame
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "max_subscribers": self.max_subscribers,
+            "buffer_events": self.buffer_events,
+            "positions": format_cursor(self.positions),
+            "published": self.published,
+            "dropped": self.dropped + sum(s.dropped for s in self.subscribers),
+            "disconnected": self.disconnected,
+        }
+
+
+audit_hub = AuditHub(settings.audit_stream_buffer_events, settings.audit_stream_max_subscribers,
+                     settings.audit_stream_poll_seconds, settings.audit_stream_keepalive_seconds)
+
+
+def _audit_stream_metrics():
+    stats = audit_hub.stats()
+    yield ("fintrust_audit_stream_subscribers", "gauge", "Connected audit stream subscribers", {}, stats["subscribers"])
+    yield ("fintrust_audit_stream_events_total", "counter", "Audit rows broadcast to subscribers", {}, stats["published"])
+    yield ("fintrust_audit_stream_dropped_total", "counter", "Events dropped for slow subscribers", {}, stats["dropped"])
+    yield ("fintrust_audit_stream_disconnects_total", "counter", "Slow subscribers disconnected on overflow", {}, stats["disconnected"])
+
+
+registry.register_collector(_audit_stream_metrics)
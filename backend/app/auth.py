@@ -8,7 +8,12 @@ from pydantic import BaseModel
 from typing import Optional, List
 import jwt
 import os
+import time
 from datetime import datetime, timedelta
+from config import settings
+from metrics import registry, timed_stage
+from result_cache import content_key
+from shared_cache import build_cache, cache_metrics
 
 # Simple JWT configuration for development
 SECRET_KEY = "dev-secret-key-change-in-production"
@@ -17,6 +22,11 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 security = HTTPBearer()
 
+# Verified token claims by token hash; entries never outlive the token's exp
+token_cache = build_cache("tokens", settings.token_cache_max_entries, settings.token_cache_ttl_seconds,
+                          settings.auth_cache_backend, settings.shared_cache_dir or None)
+registry.register_collector(cache_metrics("tokens", token_cache))
+
 class TokenPayload(BaseModel):
     sub: str
     email: Optional[str] = None
@@ -61,11 +71,17 @@ def create_access_token(user_id: str, additional_claims: dict = None) -> str:
 
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
+@timed_stage("jwt_decode")
 def decode_token(token: str) -> TokenPayload:
     """Decode and validate JWT token"""
+    # The key covers the signing key, so rotating it orphans cached tokens
+    key = content_key(ALGORITHM, SECRET_KEY, token)
+    cached = token_cache.get(key)
+    if cached is not None:
+        return TokenPayload(**cached)
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return TokenPayload(
+        token_payload = TokenPayload(
             sub=payload["sub"],
             email=payload.get("email"),
             preferred_username=payload.get("preferred_username"),
@@ -83,6 +99,13 @@ def decode_token(token: str) -> TokenPayload:
             detail=f"Invalid token: {str(e)}"
         )
 
+    ttl = token_cache.ttl_seconds
+    if token_payload.exp is not None:
+        ttl = min(ttl, token_payload.exp - time.time())
+    if ttl > 0:
+        token_cache.set(key, token_payload.model_dump(), ttl)
+    return token_payload
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> TokenPayload:
     """Get current authenticated user from JWT token"""
     token = credentials.credentials
@@ -21,6 +21,87 @@ class Settings(BaseSettings):
     # Encryption service URL
     encryption_service_url: str = "http://encryption-service:5000"
 
+    # Loan evaluation result cache (POST /api/v1/evaluate)
+    loan_model_version: str = "loan-v1"
+    evaluate_cache_ttl_seconds: float = 300.0
+    evaluate_cache_max_entries: int = 1024
+
+    # Admission control: per-user token buckets per route class and a shared
+    # pool of concurrency slots; latency targets bound how long a request may queue
+    admission_enabled: bool = True
+    admission_max_concurrency: int = 32
+    admission_interactive_rate: float = 20.0
+    admission_interactive_burst: float = 40.0
+    admission_interactive_latency_ms: float = 500.0
+    admission_write_rate: float = 5.0
+    admission_write_burst: float = 10.0
+    admission_write_latency_ms: float = 2000.0
+    admission_expensive_rate: float = 1.0
+    admission_expensive_burst: float = 5.0
+    admission_expensive_latency_ms: float = 10000.0
+
+    # Bulk transaction ingestion: rows per write transaction, row errors kept per batch
+    bulk_ingest_chunk_rows: int = 5000
+    bulk_ingest_max_errors: int = 1000
+
+    # Encrypted columns (db.ColumnCipher): the AES-GCM key and the blind index
+    # HMAC keys are derived from this secret
+    column_encryption_secret: str = "dev-column-secret-change-in-production"
+
+    # Conditional GET cache for account and transaction lists: ETags from
+    # per-user data versions, response bodies in an LRU bounded in bytes, and
+    # reads served from it audited in batches
+    read_cache_enabled: bool = True
+    read_cache_max_bytes: int = 32 * 1024 * 1024
+    read_audit_batch_size: int = 200
+    read_audit_flush_seconds: float = 1.0
+
+    # Caches of verified tokens and OPA decisions: "memory" keeps one per
+    # worker process, "shared" one memory-mapped table for all workers on the
+    # host (shared_cache.py), "off" disables them
+    auth_cache_backend: str = "memory"
+    shared_cache_dir: str = ""
+    token_cache_ttl_seconds: float = 60.0
+    token_cache_max_entries: int = 8192
+    policy_cache_ttl_seconds: float = 5.0
+    policy_cache_max_entries: int = 8192
+
+    # Live audit stream (GET /api/v1/audit/stream): events buffered per
+    # subscriber before it is dropped from or disconnected, a subscriber cap,
+    # and how often the audit logs are polled for other workers' writes
+    audit_stream_buffer_events: int = 256
+    audit_stream_max_subscribers: int = 2000
+    audit_stream_poll_seconds: float = 1.0
+    audit_stream_keepalive_seconds: float = 15.0
+
+    # Sharded storage (shards.py): per-user rows spread over shard_count
+    # SQLite files by a consistent-hash ring. The layout in use is recorded in
+    # the primary database; changing shard_count takes effect through
+    # `python shards.py rebalance`, which moves users a batch at a time
+    shard_count: int = 1
+    shard_rebalance_batch_users: int = 100
+    shard_rebalance_drain_seconds: float = 0.5
+
+    # Streaming transaction risk (risk.py): how often the shards are polled
+    # for rows ingested by other workers, and how often the per-user state is
+    # snapshotted (empty path: next to the primary database, as <name>.risk)
+    risk_enabled: bool = True
+    risk_poll_seconds: float = 1.0
+    risk_snapshot_seconds: float = 60.0
+    risk_snapshot_path: str = ""
+
+    # On-demand profiling (profiling.py, /api/v1/admin/profile/*): where
+    # session results are kept for any worker to serve, how many are kept,
+    # and the longest session an admin can start
+    profile_dir: str = ""
+    profile_keep_results: int = 20
+    profile_max_seconds: float = 300.0
+
+    # Metrics and slow-request log
+    metrics_enabled: bool = True
+    slow_request_threshold_ms: float = 1000.0
+    slow_request_sample_rate: float = 1.0
+
     # Allowed CORS origins
     cors_origins: list[str] = ["http://localhost:3000"]
 
@@ -2,139 +2,170 @@
 Database module for FinTrust Gateway
 Fixed version with proper SQLite setup
 """
-import sqlite3
+import hashlib
+import hmac
 import os
+import unicodedata
+from dataclasses import dataclass
 from datetime import datetime
-
-# Use local database path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from config import settings
+from metrics import stage, timed_stage
+from shards import ShardRouter, migrate_all
+
+# Use local database path (the primary database; other shards sit next to it, see shards.py)
 DB_PATH = "./fintrust.db"
 
-def get_db_connection():
-    """Get database connection with row factory"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def init_database():
-    """Initialize database with all required tables and sample data"""
-    print("📊 Initializing database...")
+shard_router = ShardRouter(lambda: DB_PATH)
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    try:
-        # Create users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                created_at TEXT NOT NULL
-            )
-        """)
-
-        # Create accounts table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_accounts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                account_type TEXT NOT NULL,
-                balance REAL DEFAULT 0.0,
-                created_at TEXT NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        """)
-
-        # Create transactions table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                account_id INTEGER,
-                amount REAL NOT NULL,
-                transaction_type TEXT NOT NULL,
-                merchant TEXT,
-                description TEXT,
-                timestamp TEXT NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (account_id) REFERENCES user_accounts (id)
-            )
-        """)
-
-        # Create audit logs table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS audit_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                user_id TEXT NOT NULL,
-                action TEXT NOT NULL,
-                resource TEXT,
-                details TEXT,
-                ip_address TEXT,
-                user_agent TEXT,
-                encrypted INTEGER DEFAULT 0
-            )
-        """)
-
-        # Check if we need to insert sample data
-        cursor.execute("SELECT COUNT(*) FROM users")
-        user_count = cursor.fetchone()[0]
-
-        if user_count == 0:
-            print("📝 Inserting sample data...")
-
-            # Insert sample users
-            now = datetime.utcnow().isoformat()
-            sample_users = [
-                ("user-001", "john_doe", "john@example.com", now),
-                ("user-002", "jane_smith", "jane@example.com", now),
-                ("user-003", "bob_wilson", "bob@example.com", now)
-            ]
-            cursor.executemany(
-                "INSERT INTO users (id, username, email, created_at) VALUES (?, ?, ?, ?)",
-                sample_users
-            )
-
-            # Insert sample accounts
-            sample_accounts = [
-                ("user-001", "checking", 2500.75, now),
-                ("user-001", "savings", 15000.00, now),
-                ("user-002", "checking", 1200.50, now),
-                ("user-002", "investment", 8500.25, now),
-                ("user-003", "checking", 750.00, now)
-            ]
-            cursor.executemany(
-                "INSERT INTO user_accounts (user_id, account_type, balance, created_at) VALUES (?, ?, ?, ?)",
-                sample_accounts
-            )
-
-            # Insert sample transactions
-            sample_transactions = [
-                ("user-001", 1, -45.99, "debit", "Amazon", "Online purchase", "2025-08-21T09:30:00Z"),
-                ("user-001", 1, -12.50, "debit", "Starbucks", "Coffee", "2025-08-21T08:15:00Z"),
-                ("user-001", 1, 2000.00, "credit", "Employer", "Salary deposit", "2025-08-20T00:00:00Z"),
-                ("user-002", 3, -85.20, "debit", "Grocery Store", "Weekly shopping", "2025-08-21T10:45:00Z"),
-                ("user-002", 3, 500.00, "credit", "Freelance", "Project payment", "2025-08-19T14:30:00Z"),
-                ("user-003", 5, -25.00, "debit", "Gas Station", "Fuel", "2025-08-21T07:20:00Z")
-            ]
-            cursor.executemany(
-                """INSERT INTO user_transactions 
-                   (user_id, account_id, amount, transaction_type, merchant, description, timestamp) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                sample_transactions
-            )
-
-            print("✅ Sample data inserted successfully")
-
-        conn.commit()
-        print(f"✅ Database initialized successfully at: {os.path.abspath(DB_PATH)}")
-
-    except Exception as e:
-        print(f"❌ Database initialization error: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+def get_db_connection(user_id: Optional[str] = None, write: bool = False):
+    """
+    Get database connection with row factory: to the shard holding user_id's
+    rows, or to the primary database. write=True raises ShardMovingError
+    while the user is being moved to another shard.
+    """
+    return shard_router.connect(user_id, write)
 
+def init_database():
+    """
+    Bring the schema of every shard up to date (see migrate.py); when it is
+    already current this is a single lookup of the schema version per shard.
+    """
+    result = migrate_all(DB_PATH)
+    if result.applied:
+        print(f"📊 Database migrated {result.from_version} -> {result.to_version} "
+              f"in {result.seconds * 1000:.1f}ms at: {os.path.abspath(DB_PATH)}")
+    else:
+        print(f"✅ Database schema is current (version {result.to_version})")
+    shard_count = shard_router.topology().shard_count
+    if shard_count != settings.shard_count:
+        print(f"⚠️ Databases are laid out for {shard_count} shards, shard_count is {settings.shard_count}: "
+              f"run python shards.py rebalance")
+    return result
+
+# ------------------------------
+# Encrypted columns
+# ------------------------------
+#
+# A sensitive value is stored twice: as AES-256-GCM ciphertext (<column>_enc)
+# and as a keyed HMAC of its normalized form (<column>_bidx). Equality filters
+# and joins compare blind indexes in SQL, so they use ordinary indexes;
+# ciphertext is only decrypted for rows a query actually returns (decrypt_rows).
+
+def normalize_text(value: str) -> str:
+    """Case- and whitespace-insensitive equality"""
+    return " ".join(unicodedata.normalize("NFKC", value).casefold().split())
+
+def normalize_identifier(value: str) -> str:
+    """Account and card numbers match with or without spaces and dashes"""
+    return "".join(ch for ch in unicodedata.normalize("NFKC", value).upper() if ch.isalnum())
+
+@dataclass(frozen=True)
+class EncryptedColumn:
+    table: str
+    column: str
+    # Columns sharing a domain share a blind index key, so they can be joined
+    domain: str
+    normalize: Callable[[str], str] = normalize_text
+
+    @property
+    def ciphertext_column(self) -> str:
+        return f"{self.column}_enc"
+
+    @property
+    def index_column(self) -> str:
+        return f"{self.column}_bidx"
+
+    @property
+    def associated_data(self) -> bytes:
+        # Ciphertext only decrypts in the column it was written for
+        return f"{self.table}.{self.column}".encode("utf-8")
+
+ENCRYPTED_COLUMNS: Dict[str, EncryptedColumn] = {
+    "user_accounts.account_number": EncryptedColumn("user_accounts", "account_number", "account_number",
+                                                    normalize_identifier),
+}
+
+class ColumnCipher:
+    """
+    Keys for encrypted columns, all derived from one secret with HKDF: an
+    AES-256-GCM key for values and one HMAC-SHA256 key per blind index domain.
+    Ciphertext is version byte + 12-byte nonce + ciphertext and tag.
+    """
+
+    VERSION = b"\x01"
+    NONCE_BYTES = 12
+    BLIND_INDEX_BYTES = 16
+
+    def __init__(self, secret: str):
+        self._secret = secret.encode("utf-8")
+        self._aead = AESGCM(self._derive(b"fintrust column encryption"))
+        # Keyed HMAC states, copied per value instead of re-keying every time
+        self._index_macs: Dict[str, "hmac.HMAC"] = {}
+
+    def _derive(self, info: bytes) -> bytes:
+        return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=info).derive(self._secret)
+
+    def blind_index(self, column: EncryptedColumn, value: Optional[str]) -> Optional[bytes]:
+        if value is None:
+            return None
+        mac = self._index_macs.get(column.domain)
+        if mac is None:
+            key = self._derive(b"fintrust blind index " + column.domain.encode("utf-8"))
+            mac = self._index_macs[column.domain] = hmac.new(key, digestmod=hashlib.sha256)
+        mac = mac.copy()
+        mac.update(column.normalize(value).encode("utf-8"))
+        return mac.digest()[:self.BLIND_INDEX_BYTES]
+
+    def encrypt(self, column: EncryptedColumn, value: Optional[str]) -> Optional[bytes]:
+        if value is None:
+            return None
+        nonce = os.urandom(self.NONCE_BYTES)
+        return self.VERSION + nonce + self._aead.encrypt(nonce, value.encode("utf-8"), column.associated_data)
+
+    def decrypt(self, column: EncryptedColumn, token: Optional[bytes]) -> Optional[str]:
+        if token is None:
+            return None
+        if token[:1] != self.VERSION:
+            raise ValueError(f"Unknown ciphertext version in {column.table}.{column.column}")
+        nonce, ciphertext = token[1:1 + self.NONCE_BYTES], token[1 + self.NONCE_BYTES:]
+        return self._aead.decrypt(nonce, ciphertext, column.associated_data).decode("utf-8")
+
+    def seal(self, column: EncryptedColumn, value: Optional[str]) -> Tuple[Optional[bytes], Optional[bytes]]:
+        """(ciphertext, blind index) to store for value"""
+        return self.encrypt(column, value), self.blind_index(column, value)
+
+    def decrypt_rows(self, rows: Iterable[Sequence], columns: Dict[int, EncryptedColumn]) -> List[tuple]:
+        """Rows with the ciphertext at each position replaced by plaintext; call it after LIMIT"""
+        with stage("column_decrypt"):
+            decrypted = []
+            for row in rows:
+                row = list(row)
+                for position, column in columns.items():
+                    row[position] = self.decrypt(column, row[position])
+                decrypted.append(tuple(row))
+            return decrypted
+
+_column_cipher: Optional[ColumnCipher] = None
+
+def get_column_cipher() -> ColumnCipher:
+    """Process-wide ColumnCipher for settings.column_encryption_secret"""
+    global _column_cipher
+    if _column_cipher is None:
+        _column_cipher = ColumnCipher(settings.column_encryption_secret)
+    return _column_cipher
+
+# Called with no arguments after audit rows are committed (audit_stream wakes its tailer)
+audit_listeners: List[Callable[[], None]] = []
+
+def _notify_audit_listeners():
+    for listener in audit_listeners:
+        listener()
+
+@timed_stage("audit_write")
 def log_audit_event(user_id: str, action: str, resource: str = None, details: str = None, 
                    ip_address: str = None, user_agent: str = None):
     """Log audit event to database"""
@@ -150,11 +181,29 @@ def log_audit_event(user_id: str, action: str, resource: str = None, details: st
 
         conn.commit()
         conn.close()
+        _notify_audit_listeners()
         print(f"📋 Audit: {action} by {user_id}")
 
     except Exception as e:
         print(f"❌ Audit logging error: {e}")
 
+def log_audit_events(events: list):
+    """Log a batch of audit events in one transaction. Each event is
+    (timestamp, user_id, action, resource, details, ip_address, user_agent)."""
+    try:
+        conn = get_db_connection()
+        conn.executemany("""
+            INSERT INTO audit_logs (timestamp, user_id, action, resource, details, ip_address, user_agent)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, events)
+        conn.commit()
+        conn.close()
+        _notify_audit_listeners()
+        print(f"📋 Audit: {len(events)} batched events")
+
+    except Exception as e:
+        print(f"❌ Audit logging error: {e}")
+
 if __name__ == "__main__":
     # Initialize database when run directly
     init_database()
@@ -0,0 +1,463 @@
+"""
+Bulk transaction ingestion for FinTrust Gateway
+Streams NDJSON or CSV rows into user_transactions: rows are validated a
+chunk at a time (field checks per row, user and account lookups once per
+chunk) and written with executemany, one write transaction per chunk, together
+with that chunk's monthly_merchant_spend rollup deltas, search index rows
+and one user_data_versions bump per user.
+
+A batch is identified by its batch_id. Every row is stored with
+(batch_id, batch_row), so a re-submitted or resumed batch skips rows that are
+already in, and a completed batch is answered from ingest_batches.
+
+With several shards (shards.py) a chunk is split by the shard of each row's
+user: other shards commit their part first, then the primary commits its part
+with the batch's progress, so a batch interrupted in between is completed by
+re-submitting it.
+"""
+import csv
+import io
+import json
+import sqlite3
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from search import index_rows
+from shards import ShardRouter
+
+FORMATS = ("ndjson", "csv")
+TRANSACTION_TYPES = ("debit", "credit")
+MAX_CHUNK_ROWS = 10000
+
+_INSERT_SQL = """
+    INSERT INTO user_transactions
+        (user_id, account_id, amount, transaction_type, merchant, description, timestamp, batch_id, batch_row)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_ROLLUP_SQL = """
+    INSERT INTO monthly_merchant_spend
+        (user_id, month, merchant, transaction_count, total_amount, debit_total, credit_total)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, month, merchant) DO UPDATE SET
+        transaction_count = transaction_count + excluded.transaction_count,
+        total_amount = total_amount + excluded.total_amount,
+        debit_total = debit_total + excluded.debit_total,
+        credit_total = credit_total + excluded.credit_total
+"""
+
+_VERSION_SQL = """
+    INSERT INTO user_data_versions (user_id, version) VALUES (?, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+"""
+
+
+# Called with no arguments after a chunk's rows are committed (risk.py wakes its tailer)
+listeners: List[Callable[[], None]] = []
+
+
+class BatchConflict(Exception):
+    """batch_id already belongs to another submitter"""
+
+
+class StreamAborted(Exception):
+    """The input ended before its end-of-stream marker (e.g. the client disconnected)"""
+
+
+# ------------------------------
+# Parsing
+# ------------------------------
+
+def iter_records(stream: TextIO, fmt: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Yields (row_number, record, error) per data row; row numbers start at 1"""
+    if fmt == "ndjson":
+        row = 0
+        for line in stream:
+            if not line.strip():
+                continue
+            row += 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row, None, f"invalid JSON: {e.msg}"
+                continue
+            if isinstance(record, dict):
+                yield row, record, None
+            else:
+                yield row, None, "expected a JSON object"
+    elif fmt == "csv":
+        for row, record in enumerate(csv.DictReader(stream), 1):
+            if None in record:
+                yield row, None, "more fields than header columns"
+            else:
+                yield row, {key: (value if value != "" else None) for key, value in record.items()}, None
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def _validate(record: dict) -> Tuple[Optional[tuple], Optional[str]]:
+    """Field-level checks; returns (user_id, account_id, amount, type, merchant, description, timestamp)"""
+    user_id = record.get("user_id")
+    if not user_id or not isinstance(user_id, str):
+        return None, "user_id is required"
+
+    try:
+        amount = float(record.get("amount"))
+    except (TypeError, ValueError):
+        return None, "amount must be a number"
+    if amount != amount or amount in (float("inf"), float("-inf")):
+        return None, "amount must be finite"
+
+    account_id = record.get("account_id")
+    if account_id is not None:
+        try:
+            account_id = int(account_id)
+        except (TypeError, ValueError):
+            return None, "account_id must be an integer"
+
+    transaction_type = record.get("transaction_type") or ("debit" if amount < 0 else "credit")
+    if transaction_type not in TRANSACTION_TYPES:
+        return None, f"transaction_type must be one of {', '.join(TRANSACTION_TYPES)}"
+
+    # Extended format (YYYY-MM-DD...) only: rollups take the month from timestamp[:7]
+    timestamp = record.get("timestamp")
+    try:
+        datetime.fromisoformat(timestamp)
+        valid_timestamp = timestamp[4] == "-"
+    except (TypeError, ValueError, IndexError):
+        valid_timestamp = False
+    if not valid_timestamp:
+        return None, "timestamp must be an ISO 8601 date-time"
+
+    merchant = record.get("merchant")
+    description = record.get("description")
+    return (user_id, account_id, amount, transaction_type,
+            None if merchant is None else str(merchant),
+            None if description is None else str(description), timestamp), None
+
+
+# ------------------------------
+# Ingestion
+# ------------------------------
+
+class BatchIngestor:
+    """Writes one batch; feed it parsed records with add() and call finish()"""
+
+    def __init__(self, db_path: str, batch_id: str, submitted_by: str, fmt: str,
+                 chunk_rows: int = 5000, max_errors: int = 1000):
+        self.db_path = db_path
+        self.batch_id = batch_id
+        self.submitted_by = submitted_by
+        self.format = fmt
+        self.chunk_rows = max(1, min(chunk_rows, MAX_CHUNK_ROWS))
+        self.max_errors = max_errors
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        self.router = ShardRouter(lambda: db_path)
+        self.shard_conns: Dict[int, sqlite3.Connection] = {0: self.conn}
+        self.pending: List[Tuple[int, dict]] = []
+        self.received = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.errors: List[dict] = []
+        self.started = time.perf_counter()
+
+    # Batch bookkeeping
+
+    def begin(self) -> Optional[dict]:
+        """Register the batch; returns the stored result if it already completed"""
+        row = self.conn.execute(
+            "SELECT submitted_by, status FROM ingest_batches WHERE batch_id = ?", (self.batch_id,)
+        ).fetchone()
+        if row is not None:
+            if row[0] != self.submitted_by:
+                raise BatchConflict(f"Batch {self.batch_id} was submitted by another client")
+            if row[1] == "completed":
+                return dict(self.stored_result(), replayed=True)
+            return None
+        self.conn.execute(
+            "INSERT OR IGNORE INTO ingest_batches (batch_id, submitted_by, format, status, started_at) "
+            "VALUES (?, ?, ?, 'running', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))",
+            (self.batch_id, self.submitted_by, self.format),
+        )
+        return None
+
+    def stored_result(self) -> dict:
+        row = self.conn.execute("""
+            SELECT status, format, rows_received, rows_inserted, rows_duplicate, rows_rejected,
+                   errors, started_at, completed_at, duration_ms
+            FROM ingest_batches WHERE batch_id = ?
+        """, (self.batch_id,)).fetchone()
+        status, fmt, received, inserted, duplicates, rejected, errors, started_at, completed_at, duration_ms = row
+        return {
+            "batch_id": self.batch_id,
+            "status": status,
+            "format": fmt,
+            "rows_received": received,
+            "rows_inserted": inserted,
+            "rows_duplicate": duplicates,
+            "rows_rejected": rejected,
+            "errors": json.loads(errors) if errors else [],
+            "started_at": started_at,
+            "completed_at": completed_at,
+            "duration_ms": duration_ms,
+        }
+
+    def _reject(self, row: int, error: str):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row, "error": error})
+
+    # Rows
+
+    def add(self, row: int, record: Optional[dict], error: Optional[str] = None):
+        self.received += 1
+        if error is not None:
+            self._reject(row, error)
+            return
+        self.pending.append((row, record))
+        if len(self.pending) >= self.chunk_rows:
+            self.flush()
+
+    def add_all(self, records: Iterable[Tuple[int, Optional[dict], Optional[str]]]):
+        for row, record, error in records:
+            self.add(row, record, error)
+
+    def _validate_chunk(self, chunk: List[Tuple[int, dict]]) -> List[Tuple[int, tuple]]:
+        valid = []
+        for row, record in chunk:
+            values, error = _validate(record)
+            if error:
+                self._reject(row, error)
+            else:
+                valid.append((row, values))
+        if not valid:
+            return valid
+
+        # Set-based checks: one query for the chunk's users, one per shard for its accounts
+        user_ids = list({values[0] for _, values in valid})
+        known_users = {r[0] for r in self.conn.execute(
+            f"SELECT id FROM users WHERE id IN ({','.join('?' * len(user_ids))})", user_ids)}
+        shard_of = {user_id: self.router.shard_for(user_id) for user_id in known_users}
+        shard_accounts: Dict[int, set] = {}
+        for _, values in valid:
+            if values[1] is not None and values[0] in shard_of:
+                shard_accounts.setdefault(shard_of[values[0]], set()).add(values[1])
+        account_owner: Dict[Tuple[int, int], str] = {}
+        for shard, ids in shard_accounts.items():
+            ids = list(ids)
+            account_owner.update(((shard, account_id), owner) for account_id, owner in self._connection(shard).execute(
+                f"SELECT id, user_id FROM user_accounts WHERE id IN ({','.join('?' * len(ids))})", ids))
+
+        checked = []
+        for row, values in valid:
+            if values[0] not in known_users:
+                self._reject(row, f"unknown user_id {values[0]}")
+            elif values[1] is not None and account_owner.get((shard_of[values[0]], values[1])) != values[0]:
+                self._reject(row, f"account {values[1]} does not belong to {values[0]}")
+            else:
+                checked.append((row, values))
+        return checked
+
+    def _connection(self, shard: int) -> sqlite3.Connection:
+        conn = self.shard_conns.get(shard)
+        if conn is None:
+            conn = self.shard_conns[shard] = sqlite3.connect(
+                self.router.path(shard), timeout=30, isolation_level=None)
+        return conn
+
+    def flush(self):
+        chunk, self.pending = self.pending, []
+        if not chunk:
+            return
+        valid = self._validate_chunk(chunk)
+
+        # Raises ShardMovingError, before anything of the chunk is written,
+        # if one of its users is being moved; the batch can be re-submitted
+        shard_rows: Dict[int, List[Tuple[int, tuple]]] = {}
+        shard_of: Dict[str, int] = {}
+        for row, values in valid:
+            shard = shard_of.get(values[0])
+            if shard is None:
+                shard = shard_of[values[0]] = self.router.shard_for(values[0], write=True)
+            shard_rows.setdefault(shard, []).append((row, values))
+
+        for shard, rows in shard_rows.items():
+            if shard:
+                conn = self._connection(shard)
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._write_rows(conn, rows)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            if shard_rows.get(0):
+                self._write_rows(self.conn, shard_rows[0])
+            self._save_progress("running")
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        if valid:
+            for listener in listeners:
+                listener()
+
+    def _write_rows(self, conn: sqlite3.Connection, valid: List[Tuple[int, tuple]]):
+        """Insert one shard's part of a chunk, in the caller's write transaction"""
+        existing = {r[0] for r in conn.execute(
+            "SELECT batch_row FROM user_transactions WHERE batch_id = ? AND batch_row BETWEEN ? AND ?",
+            (self.batch_id, valid[0][0], valid[-1][0]))}
+        new_rows = [(row, values) for row, values in valid if row not in existing]
+        self.duplicates += len(valid) - len(new_rows)
+
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM user_transactions").fetchone()[0]
+        conn.executemany(_INSERT_SQL, [values + (self.batch_id, row) for row, values in new_rows])
+        conn.executemany(_ROLLUP_SQL, _spend_deltas(values for _, values in new_rows))
+        index_rows(conn, last_id)
+        conn.executemany(_VERSION_SQL, [(user_id,) for user_id in {values[0] for _, values in new_rows}])
+        self.inserted += len(new_rows)
+
+    def _save_progress(self, status: str):
+        completed = status == "completed"
+        self.conn.execute("""
+            UPDATE ingest_batches
+            SET status = ?, rows_received = ?, rows_inserted = ?, rows_duplicate = ?, rows_rejected = ?,
+                errors = ?, completed_at = CASE WHEN ? THEN strftime('%Y-%m-%dT%H:%M:%fZ', 'now') END,
+                duration_ms = ?
+            WHERE batch_id = ?
+        """, (status, self.received, self.inserted, self.duplicates, self.rejected,
+              json.dumps(self.errors), completed, round((time.perf_counter() - self.started) * 1000, 3),
+              self.batch_id))
+
+    def finish(self) -> dict:
+        self.flush()
+        self.conn.execute("BEGIN IMMEDIATE")
+        self._save_progress("completed")
+        self.conn.execute("COMMIT")
+        result = self.stored_result()
+        seconds = time.perf_counter() - self.started
+        result["replayed"] = False
+        result["rows_per_second"] = round(self.received / seconds, 1) if seconds else None
+        result["errors_truncated"] = self.rejected > len(self.errors)
+        return result
+
+    def close(self):
+        for conn in self.shard_conns.values():
+            conn.close()
+        self.router.close()
+
+
+def _spend_deltas(rows: Iterable[tuple]) -> List[tuple]:
+    """Aggregate inserted rows into one monthly_merchant_spend upsert per group"""
+    groups: Dict[tuple, list] = {}
+    for user_id, _, amount, _, merchant, _, timestamp in rows:
+        key = (user_id, timestamp[:7], merchant or "")
+        totals = groups.get(key)
+        if totals is None:
+            totals = groups[key] = [0, 0.0, 0.0, 0.0]
+        totals[0] += 1
+        totals[1] += amount
+        if amount < 0:
+            totals[2] -= amount
+        elif amount > 0:
+            totals[3] += amount
+    return [key + tuple(totals) for key, totals in groups.items()]
+
+
+def ingest_stream(db_path: str, stream: TextIO, fmt: str, batch_id: str, submitted_by: str,
+                  chunk_rows: int = 5000, max_errors: int = 1000) -> dict:
+    """Ingest a whole text stream as one batch (re-submissions are idempotent)"""
+    ingestor = BatchIngestor(db_path, batch_id, submitted_by, fmt, chunk_rows, max_errors)
+    try:
+        stored = ingestor.begin()
+        if stored is not None:
+            return stored
+        ingestor.add_all(iter_records(stream, fmt))
+        return ingestor.finish()
+    finally:
+        ingestor.close()
+
+
+def detect_format(filename: str = "", content_type: str = "") -> Optional[str]:
+    if "csv" in content_type or filename.endswith(".csv"):
+        return "csv"
+    if "ndjson" in content_type or "jsonl" in content_type or filename.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return None
+
+
+class QueueReader(io.RawIOBase):
+    """
+    Binary reader over byte chunks pushed into a queue.Queue. None ends the
+    stream; a StreamAborted instance is raised to the reader instead, so a
+    cut-off upload never reaches finish() and its last partial row is dropped.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.buffer = b""
+        self.done = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        while not self.buffer and not self.done:
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.done = True
+            elif isinstance(chunk, StreamAborted):
+                self.done = True
+                raise chunk
+            else:
+                self.buffer = chunk
+        size = min(len(target), len(self.buffer))
+        target[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import sys
+    import uuid
+
+    from db import DB_PATH
+    from shards import migrate_all
+
+    parser = argparse.ArgumentParser(description="Load NDJSON or CSV transactions into the FinTrust database")
+    parser.add_argument("path", help="Input file, or - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+    parser.add_argument("--batch-id", help="Re-use to resume or safely re-submit a batch (default: derived from path)")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--chunk-rows", type=int, default=5000)
+    parser.add_argument("--max-errors", type=int, default=1000)
+    parser.add_argument("--submitted-by", default="cli-loader")
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.path)
+    if fmt is None:
+        parser.error("cannot infer the format; pass --format")
+    migrate_all(args.db)
+
+    if args.path == "-":
+        source = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+        batch_id = args.batch_id or f"stdin-{uuid.uuid4()}"
+    else:
+        source = open(args.path, encoding="utf-8", newline="")
+        stat = os.stat(args.path)
+        batch_id = args.batch_id or f"{os.path.abspath(args.path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+    with source:
+        try:
+            summary = ingest_stream(args.db, source, fmt, batch_id, args.submitted_by,
+                                    args.chunk_rows, args.max_errors)
+        except BatchConflict as e:
+            sys.exit(f"❌ {e}")
+    print(json.dumps(summary, indent=2))
@@ -2,20 +2,40 @@
 FinTrust Gateway - Main FastAPI Application
 Fixed version for local development
 """
+import time
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse  # ADD THIS LINE
-from routes import accounts, transactions, loan, audit_log
+from fastapi.responses import JSONResponse, PlainTextResponse  # ADD THIS LINE
+import uvicorn
+from routes import accounts, transactions, dashboard, loan, audit_log, admin, risk
 from config import settings
+from auth import get_auth_router
+from db import init_database
+from shards import ShardMovingError
+from response_cache import AuditBatcher
+from audit_stream import audit_hub
+from risk import risk_engine
+from profiling import profiler
+from admission import AdmissionMiddleware, admission_controller
+from metrics import (MetricsMiddleware, SCHEMA_VERSION, STARTUP_SECONDS, TimedJSONResponse, registry,
+                     slow_request_log)
 # Initialize FastAPI app
 app = FastAPI(
     title="FinTrust Gateway Backend",
     description="Secure FinTech API Gateway with Authentication & Encryption",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=TimedJSONResponse
 )
 
+# Admission control: per-user rate limits and load shedding.
+# Registered before CORS so 429/503 responses still carry CORS headers.
+if settings.admission_enabled:
+    app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
 # CORS settings for local development
 app.add_middleware(
     CORSMiddleware,
@@ -25,14 +45,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request metrics: outermost, so shed requests and admission waits are measured too
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware, slow_log=slow_request_log)
+
 # Include auth router (IMPORTANT!)
 app.include_router(get_auth_router(), prefix="/auth", tags=["Authentication"])
 
 # Include API routers
 app.include_router(accounts.router, prefix="/api/v1", tags=["Accounts"])
 app.include_router(transactions.router, prefix="/api/v1", tags=["Transactions"])
+app.include_router(dashboard.router, prefix="/api/v1", tags=["Dashboard"])
 app.include_router(loan.router, prefix="/api/v1", tags=["Loan"])
 app.include_router(audit_log.router, prefix="/api/v1", tags=["Audit"])
+app.include_router(admin.router, prefix="/api/v1", tags=["Admin"])
+app.include_router(risk.router, prefix="/api/v1", tags=["Risk"])
 
 # Health check endpoint
 @app.get("/health", tags=["Health"])
@@ -44,6 +71,12 @@ async def health_check():
         "version": "1.0.0"
     }
 
+# Prometheus metrics endpoint
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request, stage, cache and admission metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # Root endpoint
 @app.get("/", tags=["Root"])
 async def root():
@@ -64,6 +97,15 @@ async def http_exception_handler(request: Request, exc: HTTPException):
         content={"detail": exc.detail, "path": str(request.url)}
     )
 
+@app.exception_handler(ShardMovingError)
+async def shard_moving_handler(request: Request, exc: ShardMovingError):
+    # The rebalancer is copying this user's rows; writes resume within seconds
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "path": str(request.url)},
+        headers={"Retry-After": "1"}
+    )
+
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     return JSONResponse(
@@ -71,15 +113,35 @@ async def general_exception_handler(request: Request, exc: Exception):
         content={"detail": "Internal server error", "path": str(request.url)}
     )
 
+_app_ready = time.perf_counter()
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
     print("🚀 Starting FinTrust Gateway Backend...")
-    init_database()
-    print("✅ Database initialized successfully")
+    schema_started = time.perf_counter()
+    result = init_database()
+    finished = time.perf_counter()
+    STARTUP_SECONDS.set("import", value=_app_ready - _import_started)
+    STARTUP_SECONDS.set("schema", value=finished - schema_started)
+    STARTUP_SECONDS.set("total", value=finished - _import_started)
+    SCHEMA_VERSION.set(value=result.to_version)
+    await audit_hub.start()
+    if settings.risk_enabled:
+        await risk_engine.start()
+    print(f"✅ Database initialized successfully ({(finished - schema_started) * 1000:.1f}ms)")
     print("📖 API Documentation: http://localhost:8000/docs")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Write audit events still queued for cached reads, end audit streams and snapshot risk state"""
+    AuditBatcher.flush_all()
+    await audit_hub.stop()
+    await risk_engine.stop()
+    profiler.stop()
+    print("👋 FinTrust Gateway Backend stopped")
+
 if __name__ == "__main__":
     print("🏃 Running FinTrust Gateway in development mode...")
     uvicorn.run(
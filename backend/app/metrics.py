@@ -0,0 +1,336 @@
+"""
+Metrics for FinTrust Gateway
+Prometheus-format counters, gauges and histograms, a request middleware and
+stage spans that break request latency down by hot-path stage.
+
+Metrics are only written from the event loop thread (stage() just appends to
+the per-request list, which the middleware observes), so updates take no locks.
+"""
+import asyncio
+import bisect
+import contextvars
+import functools
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+from config import settings
+
+# Latency buckets in seconds (100µs .. 10s)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        values = self._values
+        values[label_values] = values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> Iterable[str]:
+        for label_values, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values: str, amount: float = 1.0):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values: str, value: float):
+        self._values[label_values] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        bounds = [f'le="{bound}"' for bound in self.buckets] + ['le="+Inf"']
+        for label_values, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(self.labels, label_values, bound)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {series[-1]}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]] = []
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        metric = Gauge(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """
+        collector() yields (name, kind, help, labels_dict, value) samples computed
+        at scrape time, for state that already lives elsewhere (caches, queues)
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        described = set()
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                print(f"❌ Metrics collector error: {e}")
+                continue
+            for name, kind, help_text, labels, value in samples:
+                if name not in described:
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    described.add(name)
+                label_names = tuple(labels)
+                lines.append(f"{name}{_format_labels(label_names, tuple(labels[n] for n in label_names))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "fintrust_request_duration_seconds", "End-to-end request latency", ("method", "route", "status"))
+STAGE_SECONDS = registry.histogram(
+    "fintrust_stage_duration_seconds", "Time spent per hot-path stage", ("route", "stage"))
+IN_FLIGHT = registry.gauge(
+    "fintrust_requests_in_flight", "Requests currently being handled", ("method",))
+ERRORS = registry.counter(
+    "fintrust_request_errors_total", "Requests that failed with a 5xx status or an exception", ("method", "route", "status"))
+STAGE_ERRORS = registry.counter(
+    "fintrust_stage_errors_total", "Stages that raised", ("route", "stage"))
+SLOW_REQUESTS = registry.counter(
+    "fintrust_slow_requests_total", "Requests slower than the slow-request threshold", ("route",))
+STARTUP_SECONDS = registry.gauge(
+    "fintrust_startup_seconds", "Time spent starting up, by phase (import, schema, total)", ("phase",))
+SCHEMA_VERSION = registry.gauge(
+    "fintrust_schema_version", "Database schema version after startup migrations")
+
+# ------------------------------
+# Stage spans
+# ------------------------------
+
+# (stage, seconds, failed) entries for the request being handled
+_current_stages: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("fintrust_stages", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as one stage of the current request (no-op outside a request)"""
+    stages = _current_stages.get()
+    if stages is None:
+        yield
+        return
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        stages.append((name, time.perf_counter() - start, failed))
+
+
+def timed_stage(name: str):
+    """Decorator form of stage() for plain and async functions"""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse whose rendering counts as the serialize stage"""
+
+    def render(self, content) -> bytes:
+        with stage("serialize"):
+            return super().render(content)
+
+
+# ------------------------------
+# Slow request log
+# ------------------------------
+
+class SlowRequestLog:
+    """Bounded, sampled log of outlier requests with their stage breakdown"""
+
+    def __init__(self, threshold_ms: float, sample_rate: float, max_entries: int = 200):
+        self.threshold = threshold_ms / 1000
+        self.sample_rate = sample_rate
+        self.entries = deque(maxlen=max_entries)
+
+    def maybe_record(self, method: str, route: str, status: int, elapsed: float, stages: list):
+        if elapsed < self.threshold:
+            return
+        SLOW_REQUESTS.inc(route)
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        breakdown = {}
+        for name, seconds, _ in stages:
+            breakdown[name] = round(breakdown.get(name, 0.0) + seconds * 1000, 3)
+        accounted = sum(seconds for _, seconds, _ in stages)
+        breakdown["other"] = round(max(0.0, elapsed - accounted) * 1000, 3)
+        entry = {
+            "timestamp": time.time(),
+            "method": method,
+            "route": route,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 3),
+            "stages_ms": breakdown,
+        }
+        self.entries.append(entry)
+        print(f"🐢 Slow request: {method} {route} {status} {entry['duration_ms']}ms {breakdown}")
+
+    def recent(self, limit: int = 50) -> list:
+        return list(self.entries)[-limit:]
+
+
+slow_request_log = SlowRequestLog(settings.slow_request_threshold_ms, settings.slow_request_sample_rate)
+
+
+# ------------------------------
+# Middleware
+# ------------------------------
+
+_STATUS_TEXT = {code: str(code) for code in range(100, 600)}
+
+
+def _route_label(scope) -> str:
+    """Route template (e.g. /api/v1/accounts/{account_id}) to keep label cardinality bounded"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+# The scope of the request the current task is serving
+_current_scope: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("fintrust_scope", default=None)
+
+
+def current_route() -> Optional[str]:
+    """Method and route template of the request being handled, for CPU profile samples"""
+    scope = _current_scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', None) or '(not routed)'}"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency, in-flight requests, errors and stage timings"""
+
+    def __init__(self, app, slow_log: SlowRequestLog):
+        self.app = app
+        self.slow_log = slow_log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        stages = []
+        token = _current_stages.set(stages)
+        scope_token = _current_scope.set(scope)
+        status = 500
+        event_stream = False
+
+        async def send_wrapper(message):
+            nonlocal status, event_stream
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                event_stream = any(name == b"content-type" and value.startswith(b"text/event-stream")
+                                   for name, value in message.get("headers", ()))
+            await send(message)
+
+        in_flight = IN_FLIGHT._values
+        key = (method,)
+        in_flight[key] = in_flight.get(key, 0) + 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight[key] -= 1
+            _current_stages.reset(token)
+            _current_scope.reset(scope_token)
+
+            route = _route_label(scope)
+            # An event stream lasts as long as its client stays connected; that is not latency
+            if not event_stream:
+                REQUEST_SECONDS.observe(elapsed, method, route, _STATUS_TEXT.get(status) or str(status))
+                if status >= 500:
+                    ERRORS.inc(method, route, str(status))
+                for name, seconds, failed in stages:
+                    STAGE_SECONDS.observe(seconds, route, name)
+                    if failed:
+                        STAGE_ERRORS.inc(route, name)
+                if elapsed >= self.slow_log.threshold:
+                    self.slow_log.maybe_record(method, route, status, elapsed, stages)
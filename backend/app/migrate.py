@@ -0,0 +1,198 @@
+"""
+Schema migrations for FinTrust Gateway
+Ordered scripts in migrations/ (NNNN_name.sql, or NNNN_name.py defining
+upgrade(conn)) are applied once each and recorded in schema_version.
+
+Startup cost when the schema is current is a directory listing and one indexed
+lookup of the latest applied version. Otherwise the migrating process takes
+SQLite's write lock (BEGIN IMMEDIATE), so uvicorn workers starting together
+wait for the first one, re-check, and find nothing left to do.
+"""
+import hashlib
+import importlib.util
+import os
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+LOCK_TIMEOUT_SECONDS = 60.0
+
+_FILENAME = re.compile(r"^(\d{4})_([a-z0-9_]+)\.(sql|py)$")
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    path: str
+
+    @property
+    def checksum(self) -> str:
+        with open(self.path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def apply(self, conn: sqlite3.Connection):
+        if self.path.endswith(".sql"):
+            with open(self.path) as f:
+                for statement in split_statements(f.read()):
+                    conn.execute(statement)
+        else:
+            spec = importlib.util.spec_from_file_location(f"migration_{self.version:04d}", self.path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            upgrade: Callable[[sqlite3.Connection], None] = module.upgrade
+            upgrade(conn)
+
+
+@dataclass
+class MigrationResult:
+    from_version: int
+    to_version: int
+    applied: List[int]
+    seconds: float
+
+
+def split_statements(script: str) -> List[str]:
+    """
+    Split a script into single statements (executescript would COMMIT the
+    surrounding transaction). Trigger bodies stay whole because a statement
+    only ends where sqlite3.complete_statement agrees.
+    """
+    statements, buffer = [], ""
+    for line in script.splitlines(keepends=True):
+        if not buffer and (not line.strip() or line.lstrip().startswith("--")):
+            continue
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ""
+    if buffer.strip():
+        raise ValueError(f"Incomplete SQL statement: {buffer.strip()[:80]}")
+    return statements
+
+
+def discover(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _FILENAME.match(filename)
+        if not match:
+            continue
+        migrations.append(Migration(int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    migrations.sort(key=lambda m: m.version)
+
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    """Latest applied version (0 for a database that predates migrations)"""
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+def _ensure_version_table(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum TEXT NOT NULL,
+            applied_at TEXT NOT NULL,
+            duration_ms REAL NOT NULL
+        )
+    """)
+
+
+def migrate(db_path: str, migrations: Optional[List[Migration]] = None) -> MigrationResult:
+    """
+    Apply pending migrations. When the schema is current this costs a directory
+    listing and one query; scripts are only read when they are applied.
+    """
+    start = time.perf_counter()
+    migrations = discover() if migrations is None else migrations
+    target = migrations[-1].version if migrations else 0
+
+    # isolation_level=None: transactions are managed explicitly below
+    conn = sqlite3.connect(db_path, timeout=LOCK_TIMEOUT_SECONDS, isolation_level=None)
+    try:
+        version = current_version(conn)
+        if version >= target:
+            return MigrationResult(version, version, [], time.perf_counter() - start)
+
+        # Blocks while another worker migrates; re-read the version once we hold the lock
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _ensure_version_table(conn)
+            version = current_version(conn)
+            applied = []
+            for migration in migrations:
+                if migration.version <= version:
+                    continue
+                step_start = time.perf_counter()
+                migration.apply(conn)
+                conn.execute(
+                    "INSERT INTO schema_version (version, name, checksum, applied_at, duration_ms) "
+                    "VALUES (?, ?, ?, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'), ?)",
+                    (migration.version, migration.name, migration.checksum,
+                     round((time.perf_counter() - step_start) * 1000, 3)),
+                )
+                applied.append(migration.version)
+                print(f"🧱 Applied migration {migration.version:04d}_{migration.name}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return MigrationResult(version, max([version] + applied), applied, time.perf_counter() - start)
+    finally:
+        conn.close()
+
+
+def status(db_path: str) -> List[dict]:
+    """Every known migration with whether it is applied and whether its file changed since"""
+    conn = sqlite3.connect(db_path)
+    try:
+        try:
+            applied = {row[0]: row for row in conn.execute(
+                "SELECT version, name, checksum, applied_at, duration_ms FROM schema_version")}
+        except sqlite3.OperationalError:
+            applied = {}
+    finally:
+        conn.close()
+
+    rows = []
+    for migration in discover():
+        record = applied.get(migration.version)
+        rows.append({
+            "version": migration.version,
+            "name": migration.name,
+            "applied_at": record[3] if record else None,
+            "duration_ms": record[4] if record else None,
+            "checksum_matches": record[2] == migration.checksum if record else None,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from db import DB_PATH
+
+    parser = argparse.ArgumentParser(description="FinTrust schema migrations")
+    parser.add_argument("command", choices=["migrate", "status"])
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        result = migrate(args.db)
+        print(f"✅ Schema at version {result.to_version} (applied {result.applied or 'nothing'}, "
+              f"{result.seconds * 1000:.1f}ms)")
+    else:
+        print(json.dumps(status(args.db), indent=2))
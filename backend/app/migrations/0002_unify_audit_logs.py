@@ -0,0 +1,19 @@
+"""
+Bring audit_logs tables created by audit-log/setup_audit_log.py (timestamp,
+user_id, action, details, encrypted) up to the gateway's column set, so both
+writers (db.log_audit_event and audit_log.logger.log_event) fit one schema.
+"""
+
+GATEWAY_COLUMNS = {
+    "resource": "TEXT",
+    "ip_address": "TEXT",
+    "user_agent": "TEXT",
+    "encrypted": "INTEGER DEFAULT 0",
+}
+
+
+def upgrade(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(audit_logs)")}
+    for column, definition in GATEWAY_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE audit_logs ADD COLUMN {column} {definition}")
@@ -0,0 +1,13 @@
+-- Indexes for the per-user list queries (WHERE user_id = ? ORDER BY ...)
+
+CREATE INDEX IF NOT EXISTS idx_user_accounts_user_created
+    ON user_accounts (user_id, created_at);
+
+CREATE INDEX IF NOT EXISTS idx_user_transactions_user_timestamp
+    ON user_transactions (user_id, timestamp);
+
+CREATE INDEX IF NOT EXISTS idx_user_transactions_account
+    ON user_transactions (account_id);
+
+CREATE INDEX IF NOT EXISTS idx_audit_logs_user_timestamp
+    ON audit_logs (user_id, timestamp);
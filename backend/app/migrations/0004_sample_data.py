@@ -0,0 +1,44 @@
+"""
+Development sample data, inserted only into an empty users table
+(databases seeded by the old init_database are left untouched).
+"""
+from datetime import datetime
+
+
+def upgrade(conn):
+    if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]:
+        return
+
+    now = datetime.utcnow().isoformat()
+    conn.executemany(
+        "INSERT INTO users (id, username, email, created_at) VALUES (?, ?, ?, ?)",
+        [
+            ("user-001", "john_doe", "john@example.com", now),
+            ("user-002", "jane_smith", "jane@example.com", now),
+            ("user-003", "bob_wilson", "bob@example.com", now),
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO user_accounts (user_id, account_type, balance, created_at) VALUES (?, ?, ?, ?)",
+        [
+            ("user-001", "checking", 2500.75, now),
+            ("user-001", "savings", 15000.00, now),
+            ("user-002", "checking", 1200.50, now),
+            ("user-002", "investment", 8500.25, now),
+            ("user-003", "checking", 750.00, now),
+        ],
+    )
+    conn.executemany(
+        """INSERT INTO user_transactions
+           (user_id, account_id, amount, transaction_type, merchant, description, timestamp)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        [
+            ("user-001", 1, -45.99, "debit", "Amazon", "Online purchase", "2025-08-21T09:30:00Z"),
+            ("user-001", 1, -12.50, "debit", "Starbucks", "Coffee", "2025-08-21T08:15:00Z"),
+            ("user-001", 1, 2000.00, "credit", "Employer", "Salary deposit", "2025-08-20T00:00:00Z"),
+            ("user-002", 3, -85.20, "debit", "Grocery Store", "Weekly shopping", "2025-08-21T10:45:00Z"),
+            ("user-002", 3, 500.00, "credit", "Freelance", "Project payment", "2025-08-19T14:30:00Z"),
+            ("user-003", 5, -25.00, "debit", "Gas Station", "Fuel", "2025-08-21T07:20:00Z"),
+        ],
+    )
+    print("✅ Sample data inserted successfully")
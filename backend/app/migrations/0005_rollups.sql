@@ -0,0 +1,128 @@
+-- Rollups maintained by triggers on every write, so summary reads touch
+-- O(groups) rows instead of scanning a user's accounts or transactions.
+-- rollups.py can check them against the base tables and rebuild them.
+
+CREATE TABLE IF NOT EXISTS account_balance_rollup (
+    user_id TEXT NOT NULL,
+    account_type TEXT NOT NULL,
+    account_count INTEGER NOT NULL DEFAULT 0,
+    total_balance REAL NOT NULL DEFAULT 0.0,
+    PRIMARY KEY (user_id, account_type)
+) WITHOUT ROWID;
+
+-- month is 'YYYY-MM' from the ISO timestamp; merchant '' stands for NULL
+CREATE TABLE IF NOT EXISTS monthly_merchant_spend (
+    user_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    merchant TEXT NOT NULL,
+    transaction_count INTEGER NOT NULL DEFAULT 0,
+    total_amount REAL NOT NULL DEFAULT 0.0,
+    debit_total REAL NOT NULL DEFAULT 0.0,
+    credit_total REAL NOT NULL DEFAULT 0.0,
+    PRIMARY KEY (user_id, month, merchant)
+) WITHOUT ROWID;
+
+-- Backfill from existing rows
+INSERT INTO account_balance_rollup (user_id, account_type, account_count, total_balance)
+SELECT user_id, account_type, COUNT(*), COALESCE(SUM(balance), 0.0)
+FROM user_accounts
+GROUP BY user_id, account_type;
+
+INSERT INTO monthly_merchant_spend (user_id, month, merchant, transaction_count, total_amount, debit_total, credit_total)
+SELECT user_id, substr(timestamp, 1, 7), COALESCE(merchant, ''), COUNT(*), SUM(amount),
+       SUM(CASE WHEN amount < 0 THEN -amount ELSE 0.0 END),
+       SUM(CASE WHEN amount > 0 THEN amount ELSE 0.0 END)
+FROM user_transactions
+GROUP BY user_id, substr(timestamp, 1, 7), COALESCE(merchant, '');
+
+-- user_accounts -> account_balance_rollup
+
+CREATE TRIGGER IF NOT EXISTS trg_account_rollup_insert
+AFTER INSERT ON user_accounts
+BEGIN
+    INSERT INTO account_balance_rollup (user_id, account_type, account_count, total_balance)
+    VALUES (NEW.user_id, NEW.account_type, 1, COALESCE(NEW.balance, 0.0))
+    ON CONFLICT (user_id, account_type) DO UPDATE SET
+        account_count = account_count + 1,
+        total_balance = total_balance + excluded.total_balance;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_account_rollup_delete
+AFTER DELETE ON user_accounts
+BEGIN
+    UPDATE account_balance_rollup
+    SET account_count = account_count - 1,
+        total_balance = total_balance - COALESCE(OLD.balance, 0.0)
+    WHERE user_id = OLD.user_id AND account_type = OLD.account_type;
+    DELETE FROM account_balance_rollup
+    WHERE user_id = OLD.user_id AND account_type = OLD.account_type AND account_count <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_account_rollup_update
+AFTER UPDATE OF user_id, account_type, balance ON user_accounts
+BEGIN
+    UPDATE account_balance_rollup
+    SET account_count = account_count - 1,
+        total_balance = total_balance - COALESCE(OLD.balance, 0.0)
+    WHERE user_id = OLD.user_id AND account_type = OLD.account_type;
+    DELETE FROM account_balance_rollup
+    WHERE user_id = OLD.user_id AND account_type = OLD.account_type AND account_count <= 0;
+    INSERT INTO account_balance_rollup (user_id, account_type, account_count, total_balance)
+    VALUES (NEW.user_id, NEW.account_type, 1, COALESCE(NEW.balance, 0.0))
+    ON CONFLICT (user_id, account_type) DO UPDATE SET
+        account_count = account_count + 1,
+        total_balance = total_balance + excluded.total_balance;
+END;
+
+-- user_transactions -> monthly_merchant_spend
+
+CREATE TRIGGER IF NOT EXISTS trg_spend_rollup_insert
+AFTER INSERT ON user_transactions
+BEGIN
+    INSERT INTO monthly_merchant_spend (user_id, month, merchant, transaction_count, total_amount, debit_total, credit_total)
+    VALUES (NEW.user_id, substr(NEW.timestamp, 1, 7), COALESCE(NEW.merchant, ''), 1, NEW.amount,
+            CASE WHEN NEW.amount < 0 THEN -NEW.amount ELSE 0.0 END,
+            CASE WHEN NEW.amount > 0 THEN NEW.amount ELSE 0.0 END)
+    ON CONFLICT (user_id, month, merchant) DO UPDATE SET
+        transaction_count = transaction_count + 1,
+        total_amount = total_amount + excluded.total_amount,
+        debit_total = debit_total + excluded.debit_total,
+        credit_total = credit_total + excluded.credit_total;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_spend_rollup_delete
+AFTER DELETE ON user_transactions
+BEGIN
+    UPDATE monthly_merchant_spend
+    SET transaction_count = transaction_count - 1,
+        total_amount = total_amount - OLD.amount,
+        debit_total = debit_total - CASE WHEN OLD.amount < 0 THEN -OLD.amount ELSE 0.0 END,
+        credit_total = credit_total - CASE WHEN OLD.amount > 0 THEN OLD.amount ELSE 0.0 END
+    WHERE user_id = OLD.user_id AND month = substr(OLD.timestamp, 1, 7) AND merchant = COALESCE(OLD.merchant, '');
+    DELETE FROM monthly_merchant_spend
+    WHERE user_id = OLD.user_id AND month = substr(OLD.timestamp, 1, 7) AND merchant = COALESCE(OLD.merchant, '')
+      AND transaction_count <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_spend_rollup_update
+AFTER UPDATE OF user_id, amount, merchant, timestamp ON user_transactions
+BEGIN
+    UPDATE monthly_merchant_spend
+    SET transaction_count = transaction_count - 1,
+        total_amount = total_amount - OLD.amount,
+        debit_total = debit_total - CASE WHEN OLD.amount < 0 THEN -OLD.amount ELSE 0.0 END,
+        credit_total = credit_total - CASE WHEN OLD.amount > 0 THEN OLD.amount ELSE 0.0 END
+    WHERE user_id = OLD.user_id AND month = substr(OLD.timestamp, 1, 7) AND merchant = COALESCE(OLD.merchant, '');
+    DELETE FROM monthly_merchant_spend
+    WHERE user_id = OLD.user_id AND month = substr(OLD.timestamp, 1, 7) AND merchant = COALESCE(OLD.merchant, '')
+      AND transaction_count <= 0;
+    INSERT INTO monthly_merchant_spend (user_id, month, merchant, transaction_count, total_amount, debit_total, credit_total)
+    VALUES (NEW.user_id, substr(NEW.timestamp, 1, 7), COALESCE(NEW.merchant, ''), 1, NEW.amount,
+            CASE WHEN NEW.amount < 0 THEN -NEW.amount ELSE 0.0 END,
+            CASE WHEN NEW.amount > 0 THEN NEW.amount ELSE 0.0 END)
+    ON CONFLICT (user_id, month, merchant) DO UPDATE SET
+        transaction_count = transaction_count + 1,
+        total_amount = total_amount + excluded.total_amount,
+        debit_total = debit_total + excluded.debit_total,
+        credit_total = credit_total + excluded.credit_total;
+END;
@@ -0,0 +1,43 @@
+-- Bulk transaction ingestion (ingest.py): batch bookkeeping and per-row
+-- idempotency keys so a re-submitted batch never inserts a row twice.
+
+ALTER TABLE user_transactions ADD COLUMN batch_id TEXT;
+ALTER TABLE user_transactions ADD COLUMN batch_row INTEGER;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_transactions_batch_row
+    ON user_transactions (batch_id, batch_row)
+    WHERE batch_id IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS ingest_batches (
+    batch_id TEXT PRIMARY KEY,
+    submitted_by TEXT NOT NULL,
+    format TEXT NOT NULL,
+    status TEXT NOT NULL,
+    rows_received INTEGER NOT NULL DEFAULT 0,
+    rows_inserted INTEGER NOT NULL DEFAULT 0,
+    rows_duplicate INTEGER NOT NULL DEFAULT 0,
+    rows_rejected INTEGER NOT NULL DEFAULT 0,
+    errors TEXT,
+    started_at TEXT NOT NULL,
+    completed_at TEXT,
+    duration_ms REAL
+);
+
+-- Bulk inserts apply their spend rollup deltas once per group and chunk,
+-- so the per-row insert trigger now only handles rows written elsewhere
+DROP TRIGGER IF EXISTS trg_spend_rollup_insert;
+
+CREATE TRIGGER trg_spend_rollup_insert
+AFTER INSERT ON user_transactions
+WHEN NEW.batch_id IS NULL
+BEGIN
+    INSERT INTO monthly_merchant_spend (user_id, month, merchant, transaction_count, total_amount, debit_total, credit_total)
+    VALUES (NEW.user_id, substr(NEW.timestamp, 1, 7), COALESCE(NEW.merchant, ''), 1, NEW.amount,
+            CASE WHEN NEW.amount < 0 THEN -NEW.amount ELSE 0.0 END,
+            CASE WHEN NEW.amount > 0 THEN NEW.amount ELSE 0.0 END)
+    ON CONFLICT (user_id, month, merchant) DO UPDATE SET
+        transaction_count = transaction_count + 1,
+        total_amount = total_amount + excluded.total_amount,
+        debit_total = debit_total + excluded.debit_total,
+        credit_total = credit_total + excluded.credit_total;
+END;
@@ -0,0 +1,9 @@
+-- External account numbers, encrypted at rest (db.ColumnCipher): AES-GCM
+-- ciphertext plus a keyed HMAC blind index that equality lookups use.
+
+ALTER TABLE user_accounts ADD COLUMN account_number_enc BLOB;
+ALTER TABLE user_accounts ADD COLUMN account_number_bidx BLOB;
+
+CREATE INDEX IF NOT EXISTS idx_user_accounts_account_number_bidx
+    ON user_accounts (account_number_bidx)
+    WHERE account_number_bidx IS NOT NULL;
@@ -0,0 +1,67 @@
+-- Per-user data versions for conditional GETs (response_cache.py): every
+-- write to a user's accounts or transactions bumps that user's version, so
+-- (epoch, version) identifies the exact state a cached read was built from.
+
+CREATE TABLE IF NOT EXISTS user_data_versions (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+-- Random per database, so ETags from a recreated database never match
+CREATE TABLE IF NOT EXISTS data_version_epoch (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    epoch TEXT NOT NULL
+);
+
+INSERT OR IGNORE INTO data_version_epoch (id, epoch) VALUES (1, lower(hex(randomblob(8))));
+
+-- user_accounts
+
+CREATE TRIGGER IF NOT EXISTS trg_user_version_account_insert
+AFTER INSERT ON user_accounts
+BEGIN
+    INSERT INTO user_data_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_version_account_update
+AFTER UPDATE ON user_accounts
+BEGIN
+    INSERT INTO user_data_versions (user_id, version) VALUES (OLD.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+    INSERT INTO user_data_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_version_account_delete
+AFTER DELETE ON user_accounts
+BEGIN
+    INSERT INTO user_data_versions (user_id, version) VALUES (OLD.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+-- user_transactions (bulk ingestion bumps once per user and chunk, see ingest.py)
+
+CREATE TRIGGER IF NOT EXISTS trg_user_version_transaction_insert
+AFTER INSERT ON user_transactions
+WHEN NEW.batch_id IS NULL
+BEGIN
+    INSERT INTO user_data_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_version_transaction_update
+AFTER UPDATE ON user_transactions
+BEGIN
+    INSERT INTO user_data_versions (user_id, version) VALUES (OLD.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+    INSERT INTO user_data_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_version_transaction_delete
+AFTER DELETE ON user_transactions
+BEGIN
+    INSERT INTO user_data_versions (user_id, version) VALUES (OLD.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
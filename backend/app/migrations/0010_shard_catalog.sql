@@ -0,0 +1,30 @@
+-- Shard catalog (shards.py), read from the primary database only: the shard
+-- count the consistent-hash ring is built for, and users routed to another
+-- shard than their ring position while the rebalancer moves them.
+
+CREATE TABLE IF NOT EXISTS shard_topology (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    shard_count INTEGER NOT NULL,
+    -- Bumped by every catalog change; routers reload the catalog when it moves
+    version INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+INSERT OR IGNORE INTO shard_topology (id, shard_count, version, updated_at)
+VALUES (1, 1, 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+
+-- moving = 1 while the user's rows are copied: reads still go to shard,
+-- writes are refused until the move completes
+CREATE TABLE IF NOT EXISTS shard_placements (
+    user_id TEXT PRIMARY KEY,
+    shard INTEGER NOT NULL,
+    moving INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+-- Written in the same transaction as a moved user's copied rows, in every
+-- shard: an interrupted rebalance finds the completed copies here
+CREATE TABLE IF NOT EXISTS shard_arrivals (
+    user_id TEXT PRIMARY KEY,
+    source_shard INTEGER NOT NULL,
+    copied_at TEXT NOT NULL
+) WITHOUT ROWID;
@@ -0,0 +1,10 @@
+-- Transaction id ranges a rebalance copied into this shard (shards.copy_users),
+-- written in the copy's transaction. Readers that tail user_transactions by
+-- id (risk.py) skip them: the rows are history they already saw on the
+-- source shard, not new transactions.
+
+CREATE TABLE IF NOT EXISTS shard_copied_rows (
+    first_id INTEGER PRIMARY KEY,
+    last_id INTEGER NOT NULL,
+    copied_at TEXT NOT NULL
+);
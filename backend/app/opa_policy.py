@@ -1,11 +1,22 @@
+import json
 import os
 import requests
 from fastapi import HTTPException
+from config import settings
+from metrics import registry, timed_stage
+from result_cache import content_key
+from shared_cache import build_cache, cache_metrics
 
 # Default OPA URL (adjust for Docker if needed)
 OPA_URL = os.getenv("OPA_URL", "http://localhost:8181")
 POLICY_PATH = "/v1/data/fintrust/allow"
 
+# Allow and deny decisions by input; failed OPA calls are not cached
+decision_cache = build_cache("policy", settings.policy_cache_max_entries, settings.policy_cache_ttl_seconds,
+                             settings.auth_cache_backend, settings.shared_cache_dir or None)
+registry.register_collector(cache_metrics("policy", decision_cache))
+
+@timed_stage("opa_check")
 def check_access(user_id: str, action: str, resource: str, roles: list = []):
     """
     Calls OPA to check whether the user is allowed to perform an action on a resource.
@@ -19,13 +30,18 @@ def check_access(user_id: str, action: str, resource: str, roles: list = []):
         }
     }
 
-    try:
-        response = requests.post(f"{OPA_URL}{POLICY_PATH}", json=input_payload)
-        if response.status_code != 200:
-            raise HTTPException(status_code=500, detail="OPA policy decision failed")
+    key = content_key(user_id, action, resource, json.dumps(sorted(roles)))
+    allowed = decision_cache.get(key)
+    if allowed is None:
+        try:
+            response = requests.post(f"{OPA_URL}{POLICY_PATH}", json=input_payload)
+            if response.status_code != 200:
+                raise HTTPException(status_code=500, detail="OPA policy decision failed")
+
+            allowed = bool(response.json().get("result", False))
+        except requests.exceptions.RequestException as e:
+            raise HTTPException(status_code=500, detail=f"OPA server error: {str(e)}")
+        decision_cache.set(key, allowed)
 
-        decision = response.json()
-        if not decision.get("result", False):
-            raise HTTPException(status_code=403, detail="Access denied by policy")
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=500, detail=f"OPA server error: {str(e)}")
+    if not allowed:
+        raise HTTPException(status_code=403, detail="Access denied by policy")
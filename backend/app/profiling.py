@@ -0,0 +1,482 @@
+"""
+On-demand profiling for FinTrust Gateway
+Admin-started sessions that run for a fixed number of seconds inside the
+serving process, under live load, without a restart or external tools:
+
+  * cpu     every thread's Python stack is read (sys._current_frames) every
+            interval_ms of process CPU time (SIGPROF) or, when the session is
+            started off the main thread, of wall time (a sampler thread), and
+            the distinct stacks are counted; results come back as folded stacks ("a;b;c 42", the input
+            of flamegraph.pl, inferno and speedscope) or as JSON with the top
+            functions. Threads waiting for work (an idle event loop, idle pool
+            threads) are left out unless include_idle is set.
+  * memory  tracemalloc traces allocations for the session; a snapshot at the
+            end is compared with one taken at the start, and the allocation
+            sites that grew are reported with the route whose handler they
+            were allocated under.
+
+Overhead is bounded by the session: at most one sample per millisecond (well
+under a percent of a core at the 10 ms default on the SIGPROF path), with a
+cap on distinct stacks. tracemalloc is far heavier, since every allocation
+records its stack: allocation-heavy code runs several times slower with one
+frame and over ten times slower with the frames needed to reach the handler
+(benchmarks/bench_profiling.py), so it is meant for sessions of seconds.
+Both kinds stop by themselves, after at most profile_max_seconds.
+Profiles cover the worker process that accepted the start request. Results
+are written to profile_dir, so whichever worker answers can serve them.
+"""
+import inspect
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi.routing import APIRoute
+
+from config import settings
+from metrics import current_route
+
+# Frames kept per sampled stack (from the root); deeper ones are cut off
+MAX_STACK_DEPTH = 128
+# Distinct stacks per CPU session; samples of further stacks are counted as truncated
+MAX_STACKS = 20000
+MIN_INTERVAL_MS = 1.0
+MAX_FRAMES = 64
+
+# Leaf frames of threads that are waiting for work rather than running; an
+# event loop implemented in C (uvloop) shows as the Python frame that started it
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("runners.py", "run"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+}
+
+
+# The sampler SIGPROF is delivered to; the handler stays installed between sessions
+_signal_sampler: Optional["CpuSampler"] = None
+
+
+def _on_sigprof(signum, frame):
+    sampler = _signal_sampler
+    if sampler is not None:
+        sampler.on_signal(frame)
+
+
+def can_sample_by_signal() -> bool:
+    """SIGPROF sampling needs a POSIX timer and its handler installed from the main thread"""
+    return hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+
+
+class ProfilerBusy(Exception):
+    """A session of the same kind is already running in this process"""
+
+
+class RouteMap:
+    """Finds the route whose handler a frame belongs to"""
+
+    def __init__(self, routes: Iterable[Tuple[str, Callable]] = ()):
+        # CPU samples hold code objects; tracemalloc frames only file and line
+        self.codes: Dict[object, str] = {}
+        self.lines: Dict[str, List[Tuple[int, int, str]]] = {}
+        for label, handler in routes:
+            code = getattr(inspect.unwrap(handler), "__code__", None)
+            if code is None:
+                continue
+            self.codes[code] = label
+            last = max((line for _, _, line in code.co_lines() if line), default=code.co_firstlineno)
+            self.lines.setdefault(code.co_filename, []).append((code.co_firstlineno, last, label))
+
+    def for_line(self, filename: str, lineno: int) -> Optional[str]:
+        for first, last, label in self.lines.get(filename, ()):
+            if first <= lineno <= last:
+                return label
+        return None
+
+
+def routes_of(app) -> List[Tuple[str, Callable]]:
+    """(label, handler) for every API route of a FastAPI app"""
+    return [(f"{','.join(sorted(route.methods))} {route.path}", route.endpoint)
+            for route in app.routes if isinstance(route, APIRoute)]
+
+
+def _short_path(filename: str) -> str:
+    """The path relative to the longest sys.path entry containing it"""
+    best = filename
+    for entry in sys.path:
+        if entry and filename.startswith(entry + os.sep) and len(filename) - len(entry) - 1 < len(best):
+            best = filename[len(entry) + 1:]
+    return best
+
+
+class CpuSampler:
+    """
+    Counts the Python stacks of the process's threads. Driven by SIGPROF
+    (started from the main thread), a sample is taken every interval of
+    process CPU time, wherever the main thread is running; driven by a
+    thread, every interval of wall time, but only when the sampler gets the
+    GIL, which favours moments when other threads are blocked.
+    """
+
+    def __init__(self, interval: float, include_idle: bool, route_map: RouteMap,
+                 current_route: Optional[Callable[[], Optional[str]]] = None):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.route_map = route_map
+        self.current_route = current_route
+        self.mode: Optional[str] = None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.truncated_samples = 0
+        self.ticks = 0
+        self.cpu_seconds = 0.0
+        self._idle: Dict[object, bool] = {}
+        self._thread_names: Dict[int, str] = {}
+        self._main = threading.main_thread().ident
+
+    def _is_idle(self, code) -> bool:
+        idle = self._idle.get(code)
+        if idle is None:
+            idle = self._idle[code] = (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+        return idle
+
+    def _thread_name(self, ident: int) -> str:
+        name = self._thread_names.get(ident)
+        if name is None:
+            self._thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            name = self._thread_names.setdefault(ident, f"thread-{ident}")
+        return name
+
+    def _record(self, ident: int, frame, running: bool, route: Optional[str] = None):
+        if not running and not self.include_idle and self._is_idle(frame.f_code):
+            self.idle_samples += 1
+            return
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        codes.reverse()
+        if route is None:
+            for code in codes:
+                route = self.route_map.codes.get(code)
+                if route is not None:
+                    break
+        key = (route or self._thread_name(ident), tuple(codes[:MAX_STACK_DEPTH]))
+        if key in self.stacks or len(self.stacks) < MAX_STACKS:
+            self.stacks[key] += 1
+        else:
+            self.truncated_samples += 1
+        self.samples += 1
+
+    def on_signal(self, frame):
+        started = time.perf_counter()
+        self.ticks += 1
+        for ident, current in sys._current_frames().items():
+            if ident == self._main:
+                # The interrupted frame, not the handler's; it was running. The
+                # handler runs in the interrupted task's context, so the request
+                # it was serving is known even outside the route handler
+                self._record(ident, frame, True, self.current_route() if self.current_route else None)
+            else:
+                self._record(ident, current, False)
+        self.cpu_seconds += time.perf_counter() - started
+
+    def run_signal(self, seconds: float, stop: threading.Event):
+        """Arm SIGPROF for `seconds` of wall time; the handler must have been installed from the main thread"""
+        global _signal_sampler
+        self.mode = "signal"
+        _signal_sampler = self
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        try:
+            stop.wait(seconds)
+        finally:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            _signal_sampler = None
+
+    def run_thread(self, seconds: float, stop: threading.Event):
+        self.mode = "thread"
+        me = threading.get_ident()
+        cpu_started = time.thread_time()
+        deadline = time.perf_counter() + seconds
+        next_at = time.perf_counter()
+        while not stop.is_set():
+            self.ticks += 1
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self._record(ident, frame, False)
+            next_at += self.interval
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            # Late ticks are dropped rather than bunched up
+            if next_at < now:
+                next_at = now + self.interval
+            stop.wait(min(next_at, deadline) - now)
+        self.cpu_seconds = time.thread_time() - cpu_started
+
+    def result(self, limit: int = 50) -> dict:
+        labels: Dict[object, str] = {}
+
+        def label(code) -> str:
+            text = labels.get(code)
+            if text is None:
+                text = labels[code] = f"{_short_path(code.co_filename)}:{code.co_qualname}"
+            return text
+
+        folded = []
+        own: Counter = Counter()
+        total: Counter = Counter()
+        routes: Counter = Counter()
+        for (root, codes), count in self.stacks.most_common():
+            names = [label(code) for code in codes]
+            folded.append([";".join([root] + names), count])
+            routes[root] += count
+            if names:
+                own[names[-1]] += count
+            for name in set(names):
+                total[name] += count
+        samples = max(self.samples, 1)
+        return {
+            "mode": self.mode,
+            "samples": self.samples,
+            "idle_samples_skipped": self.idle_samples,
+            "truncated_samples": self.truncated_samples,
+            "ticks": self.ticks,
+            "sampler_cpu_seconds": round(self.cpu_seconds, 4),
+            "routes": [{"route": root, "samples": count, "percent": round(100 * count / samples, 2)}
+                       for root, count in routes.most_common()],
+            "top_functions": [{"function": name, "self": count, "total": total[name],
+                               "self_percent": round(100 * count / samples, 2)}
+                              for name, count in own.most_common(limit)],
+            "folded": folded,
+        }
+
+
+def memory_report(baseline: tracemalloc.Snapshot, final: tracemalloc.Snapshot, route_map: RouteMap,
+                  limit: int = 50) -> dict:
+    """Allocation sites and routes that grew between two snapshots"""
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    diffs = final.filter_traces(ignore).compare_to(baseline.filter_traces(ignore), "traceback")
+
+    sites: Dict[Tuple[str, str], List[int]] = {}
+    routes: Dict[str, List[int]] = {}
+    for diff in diffs:
+        route = None
+        for frame in diff.traceback:
+            route = route_map.for_line(frame.filename, frame.lineno) or route
+        route = route or "(outside request handlers)"
+        site = diff.traceback[-1]
+        key = (f"{_short_path(site.filename)}:{site.lineno}", route)
+        for totals in (sites.setdefault(key, [0, 0, 0, 0]), routes.setdefault(route, [0, 0, 0, 0])):
+            totals[0] += diff.size_diff
+            totals[1] += diff.count_diff
+            totals[2] += diff.size
+            totals[3] += diff.count
+
+    def rows(items, keys, order):
+        return [dict(zip(keys, key), size_diff_bytes=v[0], count_diff=v[1], size_bytes=v[2], count=v[3])
+                for key, v in sorted(items, key=lambda item: item[1][order], reverse=True)[:limit]]
+
+    return {
+        "grown": rows(sites.items(), ("site", "route"), 0),
+        "largest": rows(sites.items(), ("site", "route"), 2),
+        "routes": rows((((key,), value) for key, value in routes.items()), ("route",), 0),
+    }
+
+
+class ProfileStore:
+    """Session markers and results as files, readable by every worker"""
+
+    def __init__(self, directory: Callable[[], str], keep: int):
+        self.directory = directory
+        self.keep = keep
+
+    def _path(self, session_id: str, suffix: str) -> str:
+        return os.path.join(self.directory(), f"{session_id}.{suffix}")
+
+    def _write(self, path: str, data: dict):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    def start(self, session: dict):
+        os.makedirs(self.directory(), exist_ok=True)
+        self._write(self._path(session["id"], "running"), session)
+
+    def finish(self, session_id: str, result: dict):
+        self._write(self._path(session_id, "json"), result)
+        try:
+            os.remove(self._path(session_id, "running"))
+        except FileNotFoundError:
+            pass
+        self._prune()
+
+    def get(self, session_id: str) -> Optional[dict]:
+        """The result, the running session's marker, or None for an unknown id"""
+        if not all(c.isalnum() for c in session_id):
+            return None
+        for suffix in ("json", "running"):
+            try:
+                with open(self._path(session_id, suffix)) as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                continue
+        return None
+
+    def _prune(self):
+        directory = self.directory()
+        results = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json")]
+        results.sort(key=os.path.getmtime)
+        for path in results[:-self.keep]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class Profiler:
+    """Starts CPU and allocation sessions in this process, one of each kind at a time"""
+
+    def __init__(self, store: ProfileStore, max_seconds: float,
+                 current_route: Optional[Callable[[], Optional[str]]] = None):
+        self.store = store
+        self.max_seconds = max_seconds
+        self.current_route = current_route
+        self._lock = threading.Lock()
+        self._running: Dict[str, dict] = {}
+        self._stop = threading.Event()
+
+    def _begin(self, kind: str, seconds: float, options: dict) -> dict:
+        seconds = min(max(float(seconds), 1.0), self.max_seconds)
+        now = time.time()
+        session = {"id": uuid.uuid4().hex, "kind": kind, "status": "running", "pid": os.getpid(),
+                   "started_at": now, "until": now + seconds, "seconds": seconds, **options}
+        with self._lock:
+            if kind in self._running:
+                raise ProfilerBusy(f"A {kind} profile is already running in this worker "
+                                   f"(session {self._running[kind]['id']})")
+            self._running[kind] = session
+        try:
+            self.store.start(session)
+        except OSError:
+            with self._lock:
+                del self._running[kind]
+            raise
+        return session
+
+    def _end(self, session: dict, result: dict, status: str = "complete"):
+        result = {**session, **result, "status": status, "finished_at": time.time()}
+        try:
+            self.store.finish(session["id"], result)
+        except OSError as e:
+            print(f"❌ Could not store profile {session['id']}: {e}")
+        with self._lock:
+            del self._running[session["kind"]]
+        print(f"🔬 {session['kind'].upper()} profile {session['id']} {status}")
+
+    def _fail(self, session: dict, error: Exception):
+        self._end(session, {"error": f"{type(error).__name__}: {error}"}, "failed")
+
+    def start_cpu(self, routes: Iterable[Tuple[str, Callable]], seconds: float = 10.0, interval_ms: float = 10.0,
+                  include_idle: bool = False, mode: str = "auto") -> dict:
+        """mode: "signal", "thread", or "auto" for signal whenever this is the main thread"""
+        if mode not in ("auto", "signal", "thread"):
+            raise ValueError(f"Unknown sampling mode {mode!r}")
+        if mode != "thread" and not can_sample_by_signal():
+            if mode == "signal":
+                raise ValueError("SIGPROF sampling must be started from the main thread")
+            mode = "thread"
+        if mode != "thread" and signal.getsignal(signal.SIGPROF) not in (signal.SIG_DFL, signal.SIG_IGN, _on_sigprof):
+            if mode == "signal":
+                raise ValueError("SIGPROF already has a handler in this process")
+            mode = "thread"
+        if mode == "auto":
+            mode = "signal"
+        interval_ms = max(float(interval_ms), MIN_INTERVAL_MS)
+        session = self._begin("cpu", seconds, {"mode": mode, "interval_ms": interval_ms,
+                                               "include_idle": include_idle})
+        sampler = CpuSampler(interval_ms / 1000, include_idle, RouteMap(routes), self.current_route)
+        if mode == "signal":
+            signal.signal(signal.SIGPROF, _on_sigprof)
+
+        def run():
+            try:
+                if mode == "signal":
+                    sampler.run_signal(session["seconds"], self._stop)
+                else:
+                    sampler.run_thread(session["seconds"], self._stop)
+                result = sampler.result()
+                result["sampler_cpu_percent"] = round(100 * sampler.cpu_seconds / session["seconds"], 3)
+            except Exception as e:
+                self._fail(session, e)
+                return
+            self._end(session, result)
+
+        threading.Thread(target=run, name="fintrust-cpu-profile", daemon=True).start()
+        return session
+
+    def start_memory(self, routes: Iterable[Tuple[str, Callable]], seconds: float = 10.0, frames: int = 16) -> dict:
+        frames = min(max(int(frames), 1), MAX_FRAMES)
+        session = self._begin("memory", seconds, {"frames": frames})
+        route_map = RouteMap(routes)
+        # Tracing switched on some other way (PYTHONTRACEMALLOC) is left on
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(frames)
+        baseline = tracemalloc.take_snapshot()
+
+        def run():
+            try:
+                self._stop.wait(session["seconds"])
+                final = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                overhead = tracemalloc.get_tracemalloc_memory()
+                if started_tracing:
+                    tracemalloc.stop()
+                result = memory_report(baseline, final, route_map)
+            except Exception as e:
+                if started_tracing and tracemalloc.is_tracing():
+                    tracemalloc.stop()
+                self._fail(session, e)
+                return
+            result.update(traced_bytes=current, traced_peak_bytes=peak, tracemalloc_overhead_bytes=overhead)
+            self._end(session, result)
+
+        threading.Thread(target=run, name="fintrust-memory-profile", daemon=True).start()
+        return session
+
+    def result(self, session_id: str) -> Optional[dict]:
+        """A session's result (status "complete" or "failed"), or its marker while it runs"""
+        found = self.store.get(session_id)
+        if found is not None and found["status"] == "running" and time.time() > found["until"] + 60:
+            # The worker that ran it went away before writing a result
+            found["status"] = "lost"
+        return found
+
+    def stop(self):
+        """End running sessions early (they still write their results)"""
+        self._stop.set()
+
+
+def render_folded(result: dict) -> str:
+    """A CPU result as folded stacks, one "frame;frame;frame samples" line per stack"""
+    return "".join(f"{stack} {count}\n" for stack, count in result.get("folded", []))
+
+
+def _profile_dir() -> str:
+    return settings.profile_dir or os.path.join(tempfile.gettempdir(), "fintrust-profiles")
+
+
+profiler = Profiler(ProfileStore(_profile_dir, settings.profile_keep_results), settings.profile_max_seconds,
+                    current_route)
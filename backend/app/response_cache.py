@@ -0,0 +1,270 @@
+"""
+Conditional GET cache for FinTrust Gateway
+Per-user list reads carry a strong ETag built from the user's data version,
+which triggers bump on every write to that user's accounts or transactions
+(migrations/0009_user_data_versions.sql).
+
+If-None-Match with the current ETag gets 304 Not Modified, and a repeat read
+at an unchanged version is served from a byte-bounded LRU of response bodies;
+neither runs a query against the tables. Versions are cached in-process,
+per shard, and dropped whenever PRAGMA data_version shows that another
+connection committed to that shard; each shard has its own epoch, so a
+user's ETags change when the user is moved to another shard.
+ETags also carry a keyed hash of the user, and responses vary on
+Authorization, so a shared browser cache never serves one login another's.
+Reads answered from the cache are still audited, through AuditBatcher.
+"""
+import hashlib
+import hmac
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from fastapi.responses import Response
+
+import db
+from config import settings
+from metrics import registry
+from serialization import FastJSONResponse
+
+CACHE_CONTROL = "private, no-cache"
+CACHE_HEADERS = {"Cache-Control": CACHE_CONTROL, "Vary": "Authorization"}
+
+READS = registry.counter(
+    "fintrust_read_cache_requests_total", "Cacheable reads by view and outcome (not_modified, hit, miss)",
+    ("view", "outcome"),
+)
+
+
+def read_version(conn, user_id: str) -> int:
+    row = conn.execute("SELECT version FROM user_data_versions WHERE user_id = ?", (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def read_epoch(conn) -> str:
+    row = conn.execute("SELECT epoch FROM data_version_epoch WHERE id = 1").fetchone()
+    return row[0] if row else "0"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses the weak comparison, so W/ prefixes are ignored"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class UserVersions:
+    """Per-user data versions, cached per shard until another connection commits to it"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Shard path -> [connection, data_version, epoch, {user_id: version}]
+        self._shards: Dict[str, list] = {}
+
+    def _shard(self, path: str) -> list:
+        state = self._shards.get(path)
+        if state is None:
+            conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            state = self._shards[path] = [conn, None, read_epoch(conn), {}]
+        return state
+
+    def get(self, user_id: str) -> Tuple[str, int]:
+        """(shard's epoch, user's version) as of the latest commit"""
+        path = db.shard_router.path_for(user_id)
+        with self._lock:
+            state = self._shard(path)
+            conn, versions = state[0], state[3]
+            # Changes whenever any other connection commits; no table is read
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != state[1]:
+                versions.clear()
+                state[1] = data_version
+            version = versions.get(user_id)
+            if version is None:
+                version = versions[user_id] = read_version(conn, user_id)
+            return state[2], version
+
+
+class BodyCache:
+    """LRU of encoded response bodies keyed by (view, user), bounded by total bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: Tuple[str, str], etag: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Tuple[str, str], etag: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[1])
+            self._entries[key] = (etag, body)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+@dataclass
+class CacheLookup:
+    view: str
+    etag: Optional[str]
+    body: Optional[bytes] = None
+    not_modified: bool = False
+
+    @property
+    def hit(self) -> bool:
+        return self.not_modified or self.body is not None
+
+    def response(self) -> Response:
+        headers = {"ETag": self.etag, **CACHE_HEADERS}
+        if self.not_modified:
+            return Response(status_code=304, headers=headers)
+        return FastJSONResponse(self.body, headers=headers)
+
+
+class ReadCache:
+    """ETags, 304s and cached bodies for per-user read views"""
+
+    def __init__(self, max_bytes: int, enabled: bool = True, secret: str = ""):
+        self.enabled = enabled
+        self.versions = UserVersions()
+        self.bodies = BodyCache(max_bytes)
+        key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"fintrust etag").derive(secret.encode("utf-8"))
+        self._user_mac = hmac.new(key, digestmod=hashlib.sha256)
+
+    def make_etag(self, view: str, user_id: str, epoch: str, version: int) -> str:
+        # Versions start at 0 for every user, so the user is part of the tag
+        mac = self._user_mac.copy()
+        mac.update(user_id.encode("utf-8"))
+        return f'"{view}-{mac.hexdigest()[:16]}-{epoch}-{version}"'
+
+    def lookup(self, view: str, user_id: str, if_none_match: Optional[str]) -> CacheLookup:
+        if not self.enabled:
+            return CacheLookup(view, None)
+        etag = self.make_etag(view, user_id, *self.versions.get(user_id))
+        if etag_matches(if_none_match, etag):
+            READS.inc(view, "not_modified")
+            return CacheLookup(view, etag, not_modified=True)
+        body = self.bodies.get((view, user_id), etag)
+        READS.inc(view, "miss" if body is None else "hit")
+        return CacheLookup(view, etag, body=body)
+
+    def etag_for(self, conn, view: str, user_id: str) -> str:
+        """ETag for a miss, read in the same transaction as the rows so the two agree"""
+        return self.make_etag(view, user_id, read_epoch(conn), read_version(conn, user_id))
+
+    def respond(self, view: str, user_id: str, etag: str, content: Any) -> Response:
+        response = FastJSONResponse(content, headers={"ETag": etag, **CACHE_HEADERS})
+        if self.enabled:
+            self.bodies.set((view, user_id), etag, response.body)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, **self.bodies.stats()}
+
+
+class AuditBatcher:
+    """
+    Collects audit rows and writes them with one write_many call per batch
+    from a background thread, for reads that never reach the database
+    """
+
+    instances: List["AuditBatcher"] = []
+
+    def __init__(self, name: str, write_many: Callable[[List[tuple]], None],
+                 max_batch: int = 200, flush_seconds: float = 1.0):
+        self.name = name
+        self.write_many = write_many
+        self.max_batch = max_batch
+        self.flush_seconds = flush_seconds
+        self._pending: List[tuple] = []
+        self._lock = threading.Lock()
+        # Held for a whole swap-and-write, so flush() returns only once rows are stored
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        AuditBatcher.instances.append(self)
+
+    def submit(self, row: tuple):
+        with self._lock:
+            self._pending.append(row)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"audit-batcher-{self.name}", daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.max_batch:
+                self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write everything submitted so far; also called on shutdown"""
+        with self._write_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if batch:
+                self.write_many(batch)
+                self.written += len(batch)
+
+    @classmethod
+    def flush_all(cls):
+        for batcher in cls.instances:
+            batcher.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "queued": len(self._pending), "written": self.written}
+
+
+read_cache = ReadCache(settings.read_cache_max_bytes, settings.read_cache_enabled, settings.column_encryption_secret)
+
+
+def _read_cache_metrics():
+    stats = read_cache.stats()
+    yield ("fintrust_read_cache_bytes", "gauge", "Bytes of response bodies in the read cache", {}, stats["bytes"])
+    yield ("fintrust_read_cache_entries", "gauge", "Response bodies in the read cache", {}, stats["entries"])
+    yield ("fintrust_read_cache_evictions_total", "counter", "Bodies evicted to stay under read_cache_max_bytes", {}, stats["evictions"])
+    for batcher in AuditBatcher.instances:
+        stats = batcher.stats()
+        yield ("fintrust_read_audit_queued", "gauge", "Cached-read audit events waiting to be written", {"sink": stats["name"]}, stats["queued"])
+
+
+registry.register_collector(_read_cache_metrics)
@@ -0,0 +1,169 @@
+"""
+Result cache for FinTrust Gateway
+TTL/LRU cache with single-flight deduplication for expensive downstream calls
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a TTL"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SingleFlight:
+    """Concurrent calls for the same key share one in-flight computation"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.shared = 0
+
+    async def do(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Returns (value, shared) where shared is True if another caller did the work"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.shared += 1
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+            future.set_result(value)
+            return value, False
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure does not warn at shutdown
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+class ResultCache:
+    """
+    Content-addressed result cache: entries remember how long they took to
+    compute so hits can report the downstream time they saved.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0):
+        self.cache = TTLCache(max_entries, ttl_seconds)
+        self.flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.compute_seconds = 0.0
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Returns (value, hit); hit is True for cached and deduplicated results"""
+        entry = self.cache.get(key, _MISSING)
+        if entry is not _MISSING:
+            value, elapsed = entry
+            self.hits += 1
+            self.saved_seconds += elapsed
+            return value, True
+
+        async def timed():
+            start = time.perf_counter()
+            value = await compute()
+            elapsed = time.perf_counter() - start
+            self.compute_seconds += elapsed
+            self.cache.set(key, (value, elapsed))
+            return value, elapsed
+
+        (value, elapsed), shared = await self.flight.do(key, timed)
+        if shared:
+            self.hits += 1
+            self.saved_seconds += elapsed
+        else:
+            self.misses += 1
+        return value, shared
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            **self.cache.stats(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "inflight": len(self.flight),
+            "deduplicated": self.flight.shared,
+            "saved_compute_seconds": round(self.saved_seconds, 6),
+            "compute_seconds": round(self.compute_seconds, 6),
+        }
+
+
+def content_key(*parts: str) -> str:
+    """SHA-256 over length-prefixed parts, so ("ab", "c") != ("a", "bc")"""
+    digest = hashlib.sha256()
+    for part in parts:
+        encoded = (part or "").encode()
+        digest.update(len(encoded).to_bytes(8, "big"))
+        digest.update(encoded)
+    return digest.hexdigest()
@@ -0,0 +1,472 @@
+"""
+Streaming transaction risk for FinTrust Gateway
+RiskEngine tails user_transactions on every shard by id and folds each new
+row into its user's state in constant time:
+
+  * spend velocity: debit count and total over the last hour (12 five-minute
+    buckets) and the last day (24 hourly buckets), kept in rings whose slots
+    are reused once their bucket has left the window
+  * merchant novelty: whether a debit's merchant is among the user's last 32
+    distinct merchants (a ring of CRC32s), counted per hourly bucket
+  * amount z-score: how far a debit is from an exponentially weighted mean
+    and variance of the user's debit amounts (roughly the last 50)
+
+Each user's state is three typed arrays and a few scalars (about 1 KB). It
+is snapshotted to a file together with the per-shard tail positions, so a
+restart replays only the rows written since the last snapshot; without one
+the engine rebuilds from the full history. Rows a rebalance copies between
+shards are history the engine already has, and are skipped
+(migrations/0011_shard_copied_rows.sql).
+
+Scores are read from the windows as of the moment they are asked for
+(GET /api/v1/risk/score, loan evaluation). Every worker process tails and
+scores on its own; they converge on the same state.
+"""
+import asyncio
+import json
+import math
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from array import array
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+import db
+import ingest
+from config import settings
+from metrics import registry
+from shards import ShardRouter
+
+FETCH_ROWS = 5000
+
+# (bucket seconds, buckets) per velocity window
+SHORT_WINDOW = (300, 12)
+LONG_WINDOW = (3600, 24)
+MERCHANT_RING = 32
+EWM_EVENTS = 50
+EWM_ALPHA = 2 / (EWM_EVENTS + 1)
+# Debits seen before z-scores are reported
+MIN_HISTORY = 5
+# Debits in an hour that count as a full burst
+BURST_COUNT = 10
+# risk_score is the weighted sum of its components, each in [0, 1]
+WEIGHTS = {"amount": 0.5, "novelty": 0.25, "velocity": 0.25}
+
+# values: per short slot (count, spend), then per long slot (count, spend, novel, max z)
+_SHORT_FIELDS = 2
+_LONG_FIELDS = 4
+_LONG_BASE = SHORT_WINDOW[1] * _SHORT_FIELDS
+_VALUES = _LONG_BASE + LONG_WINDOW[1] * _LONG_FIELDS
+# buckets: the bucket number each short, then each long slot holds
+_BUCKETS = SHORT_WINDOW[1] + LONG_WINDOW[1]
+
+_SNAPSHOT_MAGIC = b"FTRISK1\n"
+_LAYOUT = [SHORT_WINDOW, LONG_WINDOW, MERCHANT_RING, EWM_EVENTS]
+# merchant_next, events, debits, mean, var, last_at, last_z (NaN for none)
+_SCALARS = struct.Struct("<IIIdddd")
+
+
+class UserState:
+    __slots__ = ("buckets", "values", "merchants", "merchant_next", "events", "debits", "mean", "var",
+                 "last_at", "last_z")
+
+    def __init__(self):
+        self.buckets = array("i", [-1]) * _BUCKETS
+        self.values = array("f", bytes(4 * _VALUES))
+        self.merchants = array("I", bytes(4 * MERCHANT_RING))
+        self.merchant_next = 0
+        self.events = 0
+        self.debits = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.last_at = 0.0
+        self.last_z: Optional[float] = None
+
+
+def parse_time(timestamp: str) -> float:
+    """Epoch seconds for an ISO 8601 timestamp; naive ones are UTC"""
+    moment = datetime.fromisoformat(timestamp)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def _slot(buckets: array, offset: int, window: Tuple[int, int], at: float) -> Tuple[Optional[int], bool]:
+    """(slot for this time, whether the slot was just recycled); None if it is outside the window"""
+    width, count = window
+    bucket = int(at // width)
+    index = bucket % count
+    held = buckets[offset + index]
+    if held == bucket:
+        return index, False
+    if held > bucket:
+        # The slot already holds a bucket at least a full window later
+        return None, False
+    buckets[offset + index] = bucket
+    return index, True
+
+
+def _zscore(state: UserState, spend: float) -> float:
+    # Floors keep users with near-constant amounts from scoring every cent of change
+    std = math.sqrt(max(state.var, (0.1 * state.mean) ** 2, 1.0))
+    return (spend - state.mean) / std
+
+
+def observe(state: UserState, at: float, amount: float, merchant: Optional[str]):
+    """Fold one transaction into a user's state; constant time"""
+    state.events += 1
+    if at > state.last_at:
+        state.last_at = at
+    if amount >= 0:
+        # Credits count as activity only: the windows and amounts are about spend
+        return
+
+    spend = -amount
+    state.debits += 1
+    z = _zscore(state, spend) if state.debits > MIN_HISTORY else None
+    if state.debits == 1:
+        state.mean = spend
+    else:
+        diff = spend - state.mean
+        increment = EWM_ALPHA * diff
+        state.mean += increment
+        state.var = (1 - EWM_ALPHA) * (state.var + diff * increment)
+    state.last_z = z
+
+    novel = 0
+    if merchant:
+        key = zlib.crc32(merchant.encode("utf-8")) or 1
+        if key not in state.merchants:
+            novel = 1
+            state.merchants[state.merchant_next] = key
+            state.merchant_next = (state.merchant_next + 1) % MERCHANT_RING
+
+    values = state.values
+    index, recycled = _slot(state.buckets, 0, SHORT_WINDOW, at)
+    if index is not None:
+        base = index * _SHORT_FIELDS
+        if recycled:
+            values[base] = values[base + 1] = 0.0
+        values[base] += 1
+        values[base + 1] += spend
+
+    index, recycled = _slot(state.buckets, SHORT_WINDOW[1], LONG_WINDOW, at)
+    if index is not None:
+        base = _LONG_BASE + index * _LONG_FIELDS
+        if recycled:
+            values[base] = values[base + 1] = values[base + 2] = values[base + 3] = 0.0
+        values[base] += 1
+        values[base + 1] += spend
+        values[base + 2] += novel
+        if z is not None and z > values[base + 3]:
+            values[base + 3] = z
+
+
+def _window(state: UserState, offset: int, base: int, fields: int, window: Tuple[int, int], now: float) -> list:
+    """Per-field totals (the last long field, max z, as a maximum) of the slots inside the window"""
+    width, count = window
+    current = int(now // width)
+    totals = [0.0] * fields
+    for index in range(count):
+        if current - count < state.buckets[offset + index] <= current:
+            start = base + index * fields
+            for field in range(fields):
+                value = state.values[start + field]
+                if field == 3:
+                    totals[3] = max(totals[3], value)
+                else:
+                    totals[field] += value
+    return totals
+
+
+def features(state: Optional[UserState], now: float) -> dict:
+    """Risk features of one user as of `now`, and the combined score"""
+    if state is None:
+        state = UserState()
+    count_1h, spend_1h = _window(state, 0, 0, _SHORT_FIELDS, SHORT_WINDOW, now)
+    count_24h, spend_24h, novel_24h, max_z_24h = _window(state, SHORT_WINDOW[1], _LONG_BASE, _LONG_FIELDS,
+                                                         LONG_WINDOW, now)
+    novelty = novel_24h / count_24h if count_24h else 0.0
+    components = {
+        "amount": min(1.0, max_z_24h / 4),
+        "novelty": novelty,
+        "velocity": min(1.0, count_1h / BURST_COUNT),
+    }
+    return {
+        "events": state.events,
+        "debits": state.debits,
+        "last_event_at": datetime.fromtimestamp(state.last_at, timezone.utc).isoformat() if state.events else None,
+        "velocity": {
+            "1h": {"count": int(count_1h), "spend": round(spend_1h, 2)},
+            "24h": {"count": int(count_24h), "spend": round(spend_24h, 2)},
+        },
+        "merchant_novelty_24h": round(novelty, 4),
+        "amount": {
+            "ewm_mean": round(state.mean, 2),
+            "ewm_std": round(math.sqrt(state.var), 2),
+            "last_zscore": round(state.last_z, 3) if state.last_z is not None else None,
+            "max_zscore_24h": round(max_z_24h, 3),
+        },
+        "components": {name: round(value, 4) for name, value in components.items()},
+        "risk_score": round(sum(WEIGHTS[name] * value for name, value in components.items()), 4),
+    }
+
+
+class RiskEngine:
+    """Per-user sliding-window risk state, fed by tailing every shard's user_transactions"""
+
+    def __init__(self, router: ShardRouter, snapshot_path: Callable[[], str],
+                 poll_seconds: float = 1.0, snapshot_seconds: float = 60.0):
+        self.router = router
+        self.snapshot_path = snapshot_path
+        self.poll_seconds = poll_seconds
+        self.snapshot_seconds = snapshot_seconds
+        self.users: Dict[str, UserState] = {}
+        # Last user_transactions id folded in, per shard
+        self.positions: Dict[int, int] = {}
+        # _lock guards users and positions and is held only while a fetched
+        # page is folded in; _tail_lock serializes catch-up passes and their reads
+        self._lock = threading.Lock()
+        self._tail_lock = threading.Lock()
+        self._connections: Dict[int, sqlite3.Connection] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.events = 0
+        self.skipped_copies = 0
+        self.caught_up = False
+        self.snapshot_at: Optional[float] = None
+        self._dirty = False
+
+    # ------------------------------
+    # State
+    # ------------------------------
+
+    def observe(self, user_id: str, timestamp: str, amount: float, merchant: Optional[str]):
+        state = self.users.get(user_id)
+        if state is None:
+            state = self.users[user_id] = UserState()
+        observe(state, parse_time(timestamp), amount, merchant)
+        self.events += 1
+
+    def score(self, user_id: str, now: Optional[float] = None) -> dict:
+        with self._lock:
+            result = features(self.users.get(user_id), time.time() if now is None else now)
+        return {"user_id": user_id, "caught_up": self.caught_up, **result}
+
+    # ------------------------------
+    # Tailing
+    # ------------------------------
+
+    def _connection(self, shard: int) -> sqlite3.Connection:
+        conn = self._connections.get(shard)
+        if conn is None:
+            conn = self._connections[shard] = sqlite3.connect(
+                self.router.path(shard), timeout=30, check_same_thread=False, isolation_level=None)
+        return conn
+
+    def catch_up(self) -> int:
+        """Fold in every row committed since the last call; returns how many"""
+        applied = 0
+        with self._tail_lock:
+            for shard in self.router.shards():
+                conn = self._connection(shard)
+                while True:
+                    after = self.positions.get(shard, 0)
+                    rows = conn.execute(
+                        "SELECT id, user_id, amount, merchant, timestamp FROM user_transactions "
+                        "WHERE id > ? ORDER BY id LIMIT ?", (after, FETCH_ROWS)).fetchall()
+                    if not rows:
+                        break
+                    copied = conn.execute(
+                        "SELECT first_id, last_id FROM shard_copied_rows WHERE last_id > ? AND first_id <= ?",
+                        (after, rows[-1][0])).fetchall()
+                    with self._lock:
+                        for row_id, user_id, amount, merchant, timestamp in rows:
+                            if copied and any(first <= row_id <= last for first, last in copied):
+                                self.skipped_copies += 1
+                                continue
+                            try:
+                                self.observe(user_id, timestamp, amount, merchant)
+                            except (TypeError, ValueError):
+                                # Rows from before ingest validated timestamps
+                                continue
+                            applied += 1
+                        self.positions[shard] = rows[-1][0]
+                    if len(rows) < FETCH_ROWS:
+                        break
+            with self._lock:
+                self.caught_up = True
+                self._dirty = self._dirty or bool(applied)
+        return applied
+
+    # ------------------------------
+    # Snapshots
+    # ------------------------------
+
+    def _snapshot_bytes(self) -> bytes:
+        header = json.dumps({"layout": _LAYOUT, "positions": self.positions, "users": len(self.users),
+                             "events": self.events}).encode("utf-8")
+        parts = [_SNAPSHOT_MAGIC, struct.pack("<I", len(header)), header]
+        for user_id, state in self.users.items():
+            encoded = user_id.encode("utf-8")
+            parts.append(struct.pack("<H", len(encoded)))
+            parts.append(encoded)
+            parts.append(_SCALARS.pack(state.merchant_next, state.events, state.debits, state.mean, state.var,
+                                       state.last_at, math.nan if state.last_z is None else state.last_z))
+            parts.append(state.buckets.tobytes())
+            parts.append(state.values.tobytes())
+            parts.append(state.merchants.tobytes())
+        return b"".join(parts)
+
+    def save_snapshot(self) -> int:
+        """Write the state atomically; returns the bytes written"""
+        with self._lock:
+            data = self._snapshot_bytes()
+            self._dirty = False
+        path = self.snapshot_path()
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        self.snapshot_at = time.time()
+        return len(data)
+
+    def load_snapshot(self) -> bool:
+        """Restore a snapshot that matches this layout and database; False to rebuild from the tables"""
+        path = self.snapshot_path()
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        try:
+            if not data.startswith(_SNAPSHOT_MAGIC):
+                raise ValueError("not a risk snapshot")
+            offset = len(_SNAPSHOT_MAGIC)
+            (length,) = struct.unpack_from("<I", data, offset)
+            offset += 4
+            header = json.loads(data[offset:offset + length])
+            offset += length
+            if header["layout"] != json.loads(json.dumps(_LAYOUT)):
+                raise ValueError("state layout changed")
+            positions = {int(shard): position for shard, position in header["positions"].items()}
+            for shard, position in positions.items():
+                # The AUTOINCREMENT high-water mark: unlike MAX(id), purges do not lower it
+                newest = self._connection(shard).execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'user_transactions'"
+                ).fetchone()[0]
+                if newest < position:
+                    raise ValueError(f"shard {shard} is behind the snapshot (a different or restored database)")
+
+            users = {}
+            sizes = (4 * _BUCKETS, 4 * _VALUES, 4 * MERCHANT_RING)
+            for _ in range(header["users"]):
+                (length,) = struct.unpack_from("<H", data, offset)
+                offset += 2
+                user_id = data[offset:offset + length].decode("utf-8")
+                offset += length
+                state = UserState()
+                (state.merchant_next, state.events, state.debits, state.mean, state.var, state.last_at,
+                 last_z) = _SCALARS.unpack_from(data, offset)
+                state.last_z = None if math.isnan(last_z) else last_z
+                offset += _SCALARS.size
+                for target, size in zip((state.buckets, state.values, state.merchants), sizes):
+                    target[:] = array(target.typecode, data[offset:offset + size])
+                    offset += size
+                users[user_id] = state
+        except (ValueError, KeyError, struct.error, UnicodeDecodeError) as e:
+            print(f"⚠️ Ignoring risk snapshot {path}: {e}")
+            return False
+
+        with self._lock:
+            self.users, self.positions, self.events = users, positions, header["events"]
+        self.snapshot_at = os.path.getmtime(path)
+        return True
+
+    # ------------------------------
+    # Lifecycle
+    # ------------------------------
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        restored = await run_in_threadpool(self.load_snapshot)
+        print(f"🎯 Risk engine {'restored ' + str(len(self.users)) + ' users from snapshot' if restored else 'rebuilding from transactions'}")
+        ingest.listeners.append(self.notify)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.notify in ingest.listeners:
+            ingest.listeners.remove(self.notify)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._dirty:
+            await run_in_threadpool(self.save_snapshot)
+        with self._tail_lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+
+    def notify(self):
+        """Wake the tailer; called from ingest threads after commit"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self):
+        last_snapshot = time.monotonic()
+        while True:
+            try:
+                await run_in_threadpool(self.catch_up)
+                if self._dirty and time.monotonic() - last_snapshot >= self.snapshot_seconds:
+                    await run_in_threadpool(self.save_snapshot)
+                    last_snapshot = time.monotonic()
+            except (sqlite3.Error, OSError) as e:
+                print(f"❌ Risk engine error: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self.users),
+            "events": self.events,
+            "skipped_copies": self.skipped_copies,
+            "positions": dict(self.positions),
+            "caught_up": self.caught_up,
+            "snapshot_path": self.snapshot_path(),
+            "snapshot_age_seconds": round(time.time() - self.snapshot_at, 1) if self.snapshot_at else None,
+        }
+
+
+def _snapshot_path() -> str:
+    return settings.risk_snapshot_path or os.path.splitext(db.DB_PATH)[0] + ".risk"
+
+
+risk_engine = RiskEngine(db.shard_router, _snapshot_path, settings.risk_poll_seconds, settings.risk_snapshot_seconds)
+
+
+def _risk_metrics():
+    stats = risk_engine.stats()
+    yield ("fintrust_risk_users", "gauge", "Users with risk state in this worker", {}, stats["users"])
+    yield ("fintrust_risk_events_total", "counter", "Transactions folded into risk state", {}, stats["events"])
+    yield ("fintrust_risk_skipped_copies_total", "counter", "Rebalance-copied rows skipped by the risk tailer", {},
+           stats["skipped_copies"])
+
+
+registry.register_collector(_risk_metrics)
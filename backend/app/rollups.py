@@ -0,0 +1,164 @@
+"""
+Rollups for FinTrust Gateway
+Trigger-maintained aggregate tables (see migrations/0005_rollups.sql), with a
+consistency checker that recomputes them from the base tables and can
+rebuild a rollup from scratch.
+"""
+import sqlite3
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Incremental float sums drift from a fresh SUM() in the last bits
+TOLERANCE = 1e-6
+
+
+@dataclass(frozen=True)
+class Rollup:
+    table: str
+    keys: Tuple[str, ...]
+    values: Tuple[str, ...]
+    # Recomputes the rollup from the base table, yielding keys then values
+    source_sql: str
+
+
+ROLLUPS: Dict[str, Rollup] = {
+    "account_balance": Rollup(
+        table="account_balance_rollup",
+        keys=("user_id", "account_type"),
+        values=("account_count", "total_balance"),
+        source_sql="""
+            SELECT user_id, account_type, COUNT(*), COALESCE(SUM(balance), 0.0)
+            FROM user_accounts
+            GROUP BY user_id, account_type
+        """,
+    ),
+    "monthly_merchant_spend": Rollup(
+        table="monthly_merchant_spend",
+        keys=("user_id", "month", "merchant"),
+        values=("transaction_count", "total_amount", "debit_total", "credit_total"),
+        source_sql="""
+            SELECT user_id, substr(timestamp, 1, 7), COALESCE(merchant, ''), COUNT(*), SUM(amount),
+                   SUM(CASE WHEN amount < 0 THEN -amount ELSE 0.0 END),
+                   SUM(CASE WHEN amount > 0 THEN amount ELSE 0.0 END)
+            FROM user_transactions
+            GROUP BY user_id, substr(timestamp, 1, 7), COALESCE(merchant, '')
+        """,
+    ),
+}
+
+
+def _differs(a, b) -> bool:
+    if isinstance(a, float) or isinstance(b, float):
+        return abs((a or 0.0) - (b or 0.0)) > TOLERANCE * max(1.0, abs(a or 0.0), abs(b or 0.0))
+    return a != b
+
+
+def check(conn: sqlite3.Connection, name: str, max_mismatches: int = 50) -> dict:
+    """Compare a rollup with a fresh aggregate of its base table"""
+    rollup = ROLLUPS[name]
+    width = len(rollup.keys)
+    columns = ", ".join(rollup.keys + rollup.values)
+    stored = {tuple(row[:width]): tuple(row[width:]) for row in conn.execute(f"SELECT {columns} FROM {rollup.table}")}
+    expected = {tuple(row[:width]): tuple(row[width:]) for row in conn.execute(rollup.source_sql)}
+
+    mismatches = []
+    for key in stored.keys() | expected.keys():
+        have, want = stored.get(key), expected.get(key)
+        if have is None or want is None or any(_differs(a, b) for a, b in zip(have, want)):
+            mismatches.append({
+                "key": dict(zip(rollup.keys, key)),
+                "stored": dict(zip(rollup.values, have)) if have else None,
+                "expected": dict(zip(rollup.values, want)) if want else None,
+            })
+
+    return {
+        "rollup": name,
+        "table": rollup.table,
+        "groups": len(expected),
+        "consistent": not mismatches,
+        "mismatch_count": len(mismatches),
+        "mismatches": mismatches[:max_mismatches],
+    }
+
+
+def rebuild(conn: sqlite3.Connection, name: str) -> int:
+    """
+    Replace a rollup with a fresh aggregate under the write lock, so no insert
+    can slip in between the delete and the recompute. Returns the group count.
+    """
+    rollup = ROLLUPS[name]
+    columns = ", ".join(rollup.keys + rollup.values)
+    in_transaction = conn.in_transaction
+    if not in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(f"DELETE FROM {rollup.table}")
+        cursor = conn.execute(f"INSERT INTO {rollup.table} ({columns}) {rollup.source_sql}")
+        if not in_transaction:
+            conn.execute("COMMIT")
+    except BaseException:
+        if not in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    print(f"🔁 Rebuilt rollup {name} ({cursor.rowcount} groups)")
+    return cursor.rowcount
+
+
+def rebuild_users(conn: sqlite3.Connection, user_ids: Sequence[str]):
+    """
+    Recompute every rollup's groups for these users only (used when users'
+    rows are copied or deleted in bulk); runs in the caller's write transaction
+    """
+    marks = ",".join("?" * len(user_ids))
+    for rollup in ROLLUPS.values():
+        columns = ", ".join(rollup.keys + rollup.values)
+        conn.execute(f"DELETE FROM {rollup.table} WHERE user_id IN ({marks})", user_ids)
+        conn.execute(f"INSERT INTO {rollup.table} ({columns}) "
+                     f"SELECT * FROM ({rollup.source_sql}) WHERE user_id IN ({marks})", user_ids)
+
+
+def check_all(conn: sqlite3.Connection, repair: bool = False, names: Optional[List[str]] = None) -> List[dict]:
+    """Check every rollup (or the named ones), rebuilding inconsistent ones if repair is set"""
+    reports = []
+    for name in names or list(ROLLUPS):
+        report = check(conn, name)
+        if repair and not report["consistent"]:
+            report["rebuilt_groups"] = rebuild(conn, name)
+            report["consistent_after_rebuild"] = check(conn, name)["consistent"]
+        reports.append(report)
+    return reports
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from db import DB_PATH
+    from shards import read_topology, shard_path
+
+    parser = argparse.ArgumentParser(description="Check or rebuild FinTrust rollup tables on every shard")
+    parser.add_argument("command", choices=["check", "repair", "rebuild"])
+    parser.add_argument("--db", default=DB_PATH, help="Primary database; its shards are found from the catalog")
+    parser.add_argument("--rollup", choices=list(ROLLUPS), action="append")
+    args = parser.parse_args()
+
+    primary = sqlite3.connect(args.db, timeout=30)
+    try:
+        shards = read_topology(primary).shards()
+    finally:
+        primary.close()
+
+    reports = []
+    for shard in shards:
+        connection = sqlite3.connect(shard_path(args.db, shard), timeout=30, isolation_level=None)
+        try:
+            if args.command == "rebuild":
+                for rollup_name in args.rollup or list(ROLLUPS):
+                    reports.append({"shard": shard, "rollup": rollup_name,
+                                    "rebuilt_groups": rebuild(connection, rollup_name)})
+            else:
+                reports.extend(dict(report, shard=shard) for report in
+                               check_all(connection, repair=args.command == "repair", names=args.rollup))
+        finally:
+            connection.close()
+    print(json.dumps(reports, indent=2))
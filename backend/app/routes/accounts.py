@@ -4,9 +4,15 @@ Fixed version with proper error handling
 """
 from fastapi import APIRouter, Depends, HTTPException, Request
 from auth import get_current_user, TokenPayload
-from db import get_db_connection, log_audit_event  # FIXED: removed _fixed
+from db import ENCRYPTED_COLUMNS, get_column_cipher, get_db_connection, log_audit_event, log_audit_events  # FIXED: removed _fixed
+from shards import ShardMovingError
+from config import settings
+from metrics import stage
+from response_cache import AuditBatcher, read_cache
+from serialization import FastJSONResponse, RowMapper, fetch_tuples
 from typing import List, Dict, Any
-from pydantic import BaseModel
+from datetime import datetime
+from pydantic import BaseModel, Field
 
 router = APIRouter()
 
@@ -22,6 +28,54 @@ class AccountSummary(BaseModel):
     total_balance: float
     accounts: List[Account]
 
+class AccountNumberRequest(BaseModel):
+    account_number: str = Field(..., min_length=4, max_length=64)
+
+class AccountNumberMatch(Account):
+    account_number_masked: str
+
+# Column order of the SELECT in get_user_accounts
+account_rows = RowMapper("id", "user_id", "account_type", "balance", "created_at")
+account_number_rows = RowMapper("id", "user_id", "account_type", "balance", "created_at", "account_number")
+
+# Reads answered without a query are audited in batches
+read_audit = AuditBatcher("accounts", log_audit_events, settings.read_audit_batch_size, settings.read_audit_flush_seconds)
+
+# Shared with the dashboard route, which runs both in one read transaction
+ACCOUNTS_SQL = """
+    SELECT id, user_id, account_type, balance, created_at 
+    FROM user_accounts 
+    WHERE user_id = ?
+    ORDER BY created_at DESC
+"""
+BALANCE_ROLLUP_SQL = """
+    SELECT account_type, account_count, total_balance
+    FROM account_balance_rollup
+    WHERE user_id = ?
+    ORDER BY account_type
+"""
+
+ACCOUNT_NUMBER = ENCRYPTED_COLUMNS["user_accounts.account_number"]
+
+def mask_account_number(account_number: str) -> str:
+    return "****" + ACCOUNT_NUMBER.normalize(account_number)[-4:]
+
+def summarize_balances(rows) -> Dict[str, Any]:
+    """GET /accounts/summary body from BALANCE_ROLLUP_SQL rows"""
+    return {
+        "by_type": [
+            {
+                "account_type": account_type,
+                "count": count,
+                "total_balance": total_balance,
+                "average_balance": total_balance / count
+            }
+            for account_type, count, total_balance in rows
+        ],
+        "total_balance": sum(row[2] for row in rows),
+        "total_accounts": sum(row[1] for row in rows)
+    }
+
 def check_account_access(user_id: str, action: str, resource: str = "accounts"):
     """Simple policy check for development"""
     # In development, allow all authenticated users to access their own data
@@ -31,7 +85,7 @@ def check_account_access(user_id: str, action: str, resource: str = "accounts"):
 async def get_user_accounts(
     request: Request,
     current_user: TokenPayload = Depends(get_current_user)
-) -> AccountSummary:
+):
     """
     Get all accounts for the authenticated user
     """
@@ -40,33 +94,30 @@ async def get_user_accounts(
         if not check_account_access(current_user.sub, "read", "accounts"):
             raise HTTPException(status_code=403, detail="Access denied")
 
-        # Get accounts from database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT id, user_id, account_type, balance, created_at 
-            FROM user_accounts 
-            WHERE user_id = ?
-            ORDER BY created_at DESC
-        """, (current_user.sub,))
-
-        rows = cursor.fetchall()
-        conn.close()
-
-        # Convert to Account objects
-        accounts = [
-            Account(
-                id=row["id"],
-                user_id=row["user_id"],
-                account_type=row["account_type"],
-                balance=row["balance"],
-                created_at=row["created_at"]
-            )
-            for row in rows
-        ]
-
-        total_balance = sum(account.balance for account in accounts)
+        # Unchanged since the client's copy (304) or our cached body: no query, audit batched
+        cached = read_cache.lookup("accounts", current_user.sub, request.headers.get("if-none-match"))
+        if cached.hit:
+            outcome = "not modified" if cached.not_modified else "cached"
+            read_audit.submit((datetime.utcnow().isoformat(), current_user.sub, "read_accounts", "accounts",
+                               f"Retrieved accounts ({outcome})", getattr(request.client, 'host', None),
+                               request.headers.get("user-agent")))
+            return cached.response()
+
+        # Get accounts from database; the version is read in the same snapshot
+        with stage("sqlite"):
+            conn = get_db_connection(current_user.sub)
+            cursor = conn.cursor()
+            cursor.execute("BEGIN")
+            etag = read_cache.etag_for(cursor, "accounts", current_user.sub)
+
+            rows = fetch_tuples(cursor, ACCOUNTS_SQL, (current_user.sub,))
+
+            conn.commit()
+            conn.close()
+
+        # Rows go straight to JSON; AccountSummary only documents the schema
+        accounts = account_rows(rows)
+        total_balance = float(sum(row[3] for row in rows))
 
         # Audit log
         log_audit_event(
@@ -78,11 +129,11 @@ async def get_user_accounts(
             user_agent=request.headers.get("user-agent")
         )
 
-        return AccountSummary(
-            total_accounts=len(accounts),
-            total_balance=total_balance,
-            accounts=accounts
-        )
+        return read_cache.respond("accounts", current_user.sub, etag, {
+            "total_accounts": len(accounts),
+            "total_balance": total_balance,
+            "accounts": accounts
+        })
 
     except HTTPException:
         raise
@@ -92,6 +143,126 @@ async def get_user_accounts(
             detail=f"Error retrieving accounts: {str(e)}"
         )
 
+# Registered before /accounts/{account_id}, which would otherwise capture "summary"
+@router.get("/accounts/summary")
+async def get_accounts_summary(
+    current_user: TokenPayload = Depends(get_current_user)
+):
+    """
+    Get a quick summary of all accounts
+    """
+    try:
+        # One row per account type, kept current by triggers (see rollups.py)
+        with stage("sqlite"):
+            conn = get_db_connection(current_user.sub)
+            cursor = conn.cursor()
+
+            rows = fetch_tuples(cursor, BALANCE_ROLLUP_SQL, (current_user.sub,))
+
+            conn.close()
+
+        return summarize_balances(rows)
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error generating summary: {str(e)}"
+        )
+
+# POST so the account number travels in the body, not in URLs and access logs
+@router.post("/accounts/lookup", response_model=List[AccountNumberMatch])
+async def lookup_account_by_number(
+    body: AccountNumberRequest,
+    request: Request,
+    current_user: TokenPayload = Depends(get_current_user)
+):
+    """
+    Find the user's accounts with this account number. The match runs on the
+    blind index; only matching rows are decrypted.
+    """
+    try:
+        cipher = get_column_cipher()
+        with stage("sqlite"):
+            conn = get_db_connection(current_user.sub)
+            cursor = conn.cursor()
+            rows = fetch_tuples(cursor, """
+                SELECT id, user_id, account_type, balance, created_at, account_number_enc
+                FROM user_accounts
+                WHERE account_number_bidx = ? AND user_id = ?
+                ORDER BY created_at DESC
+            """, (cipher.blind_index(ACCOUNT_NUMBER, body.account_number), current_user.sub))
+            conn.close()
+
+        matches = account_number_rows(cipher.decrypt_rows(rows, {5: ACCOUNT_NUMBER}))
+        for match in matches:
+            match["account_number_masked"] = mask_account_number(match.pop("account_number"))
+
+        log_audit_event(
+            user_id=current_user.sub,
+            action="lookup_account_number",
+            resource="accounts",
+            details=f"Account number lookup matched {len(matches)} accounts",
+            ip_address=getattr(request.client, 'host', None),
+            user_agent=request.headers.get("user-agent")
+        )
+
+        return FastJSONResponse(matches)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error looking up account: {str(e)}"
+        )
+
+@router.put("/accounts/{account_id}/account-number")
+async def set_account_number(
+    account_id: int,
+    body: AccountNumberRequest,
+    request: Request,
+    current_user: TokenPayload = Depends(get_current_user)
+):
+    """
+    Store the external account number for one of the user's accounts,
+    encrypted, with its blind index
+    """
+    try:
+        ciphertext, blind_index = get_column_cipher().seal(ACCOUNT_NUMBER, body.account_number)
+        with stage("sqlite"):
+            conn = get_db_connection(current_user.sub, write=True)
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE user_accounts
+                SET account_number_enc = ?, account_number_bidx = ?
+                WHERE id = ? AND user_id = ?
+            """, (ciphertext, blind_index, account_id, current_user.sub))
+            updated = cursor.rowcount
+            conn.commit()
+            conn.close()
+
+        if not updated:
+            raise HTTPException(status_code=404, detail="Account not found")
+
+        log_audit_event(
+            user_id=current_user.sub,
+            action="set_account_number",
+            resource=f"account:{account_id}",
+            details=f"Account number set for account {account_id}",
+            ip_address=getattr(request.client, 'host', None),
+            user_agent=request.headers.get("user-agent")
+        )
+
+        return {"id": account_id, "account_number_masked": mask_account_number(body.account_number)}
+
+    except (HTTPException, ShardMovingError):
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error updating account: {str(e)}"
+        )
+
 @router.get("/accounts/{account_id}")
 async def get_account_details(
     account_id: int,
@@ -102,18 +273,19 @@ async def get_account_details(
     Get details for a specific account
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with stage("sqlite"):
+            conn = get_db_connection(current_user.sub)
+            cursor = conn.cursor()
 
-        # Verify account belongs to user
-        cursor.execute("""
-            SELECT id, user_id, account_type, balance, created_at 
-            FROM user_accounts 
-            WHERE id = ? AND user_id = ?
-        """, (account_id, current_user.sub))
+            # Verify account belongs to user
+            cursor.execute("""
+                SELECT id, user_id, account_type, balance, created_at 
+                FROM user_accounts 
+                WHERE id = ? AND user_id = ?
+            """, (account_id, current_user.sub))
 
-        row = cursor.fetchone()
-        conn.close()
+            row = cursor.fetchone()
+            conn.close()
 
         if not row:
             raise HTTPException(status_code=404, detail="Account not found")
@@ -145,50 +317,3 @@ async def get_account_details(
             status_code=500,
             detail=f"Error retrieving account: {str(e)}"
         )
-
-@router.get("/accounts/summary")
-async def get_accounts_summary(
-    current_user: TokenPayload = Depends(get_current_user)
-):
-    """
-    Get a quick summary of all accounts
-    """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT 
-                account_type,
-                COUNT(*) as count,
-                SUM(balance) as total_balance,
-                AVG(balance) as avg_balance
-            FROM user_accounts 
-            WHERE user_id = ?
-            GROUP BY account_type
-        """, (current_user.sub,))
-
-        rows = cursor.fetchall()
-        conn.close()
-
-        summary = {
-            "by_type": [
-                {
-                    "account_type": row["account_type"],
-                    "count": row["count"],
-                    "total_balance": row["total_balance"],
-                    "average_balance": row["avg_balance"]
-                }
-                for row in rows
-            ],
-            "total_balance": sum(row["total_balance"] for row in rows),
-            "total_accounts": sum(row["count"] for row in rows)
-        }
-
-        return summary
-
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error generating summary: {str(e)}"
-        )
@@ -0,0 +1,249 @@
+"""
+Admin API routes for FinTrust Gateway
+Operational state for administrators
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import asyncio
+import sqlite3
+import threading
+import time
+from auth import require_roles, TokenPayload, token_cache
+from admission import admission_controller
+from config import settings
+from db import shard_router
+from metrics import slow_request_log
+from opa_policy import decision_cache
+from profiling import ProfilerBusy, profiler, render_folded, routes_of
+from shards import Rebalancer, shard_stats
+import rollups
+
+router = APIRouter()
+
+# The rebalance started from this worker, if any
+_rebalance = {"lock": threading.Lock(), "thread": None, "rebalancer": None}
+
+@router.get("/admin/admission")
+async def get_admission_state(
+    user_id: Optional[str] = None,
+    current_user: TokenPayload = Depends(require_roles(["admin"]))
+):
+    """
+    Admission controller state: in-flight requests, queue depth and per-class
+    counters; pass user_id to inspect that user's remaining tokens
+    """
+    state = admission_controller.snapshot()
+    if user_id:
+        state["user"] = {"user_id": user_id, "tokens": admission_controller.user_buckets(user_id)}
+    return state
+
+@router.get("/admin/slow-requests")
+async def get_slow_requests(
+    limit: int = 50,
+    current_user: TokenPayload = Depends(require_roles(["admin"]))
+):
+    """
+    Most recent sampled slow requests with their per-stage latency breakdown
+    """
+    return {
+        "threshold_ms": slow_request_log.threshold * 1000,
+        "sample_rate": slow_request_log.sample_rate,
+        "requests": slow_request_log.recent(limit)
+    }
+
+@router.get("/admin/auth-caches")
+async def get_auth_caches(
+    current_user: TokenPayload = Depends(require_roles(["admin"]))
+):
+    """
+    Verified-token and policy-decision caches; hit counts are this worker's
+    """
+    return {"tokens": token_cache.stats(), "policy": decision_cache.stats()}
+
+@router.post("/admin/auth-caches/invalidate")
+async def invalidate_auth_caches(
+    current_user: TokenPayload = Depends(require_roles(["admin"]))
+):
+    """
+    Drop every cached token and policy decision; with the shared backend this
+    bumps the generation and applies to all workers at once
+    """
+    token_cache.clear()
+    decision_cache.clear()
+    print(f"🧹 Auth caches invalidated by {current_user.sub}")
+    return {"tokens": token_cache.stats(), "policy": decision_cache.stats()}
+
+@router.get("/admin/rollups")
+async def check_rollups(
+    repair: bool = False,
+    current_user: TokenPayload = Depends(require_roles(["admin"]))
+):
+    """
+    Compare each rollup table with a fresh aggregate of its base table, on
+    every shard concurrently; repair=true rebuilds the inconsistent ones
+    """
+    def check_shard(shard: int, path: str):
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        try:
+            return [dict(report, shard=shard) for report in rollups.check_all(conn, repair=repair)]
+        finally:
+            conn.close()
+
+    reports = await shard_router.scatter(check_shard)
+    return {"rollups": [report for shard_reports in reports for report in shard_reports]}
+
+@router.post("/admin/rollups/{name}/rebuild")
+async def rebuild_rollup(
+    name: str,
+    current_user: TokenPayload = Depends(require_roles(["admin"]))
+):
+    """
+    Rebuild one rollup table from scratch on every shard
+    """
+    if name not in rollups.ROLLUPS:
+        raise HTTPException(status_code=404, detail=f"Unknown rollup: {name}")
+
+    def rebuild_shard(shard: int, path: str):
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        try:
+            return {"shard": shard, "rebuilt_groups": rollups.rebuild(conn, name), **rollups.check(conn, name)}
+        finally:
+            conn.close()
+
+    return {"shards": await shard_router.scatter(rebuild_shard)}
+
+@router.get("/admin/shards")
+async def get_shards(
+    current_user: TokenPayload = Depends(require_roles(["admin"]))
+):
+    """
+    Shard layout and per-shard row counts and balances, gathered from all
+    shards concurrently, plus the progress of a rebalance started here
+    """
+    topology = shard_router.topology()
+    stats = await shard_router.scatter(shard_stats)
+    return {
+        "shard_count": topology.shard_count,
+        "configured_shard_count": settings.shard_count,
+        "catalog_version": topology.version,
+        "pinned_users": len(topology.placements),
+        "moving_users": sum(1 for _, moving in topology.placements.values() if moving),
+        "totals": {key: sum(shard[key] for shard in stats)
+                   for key in ("users_with_accounts", "accounts", "transactions", "total_balance")},
+        "shards": stats,
+        "rebalance": _rebalance["rebalancer"].progress if _rebalance["rebalancer"] else None,
+    }
+
+@router.post("/admin/shards/rebalance", status_code=202)
+async def start_rebalance(
+    shards: int = Query(default=None, ge=1, le=256, description="Target shard count (default: shard_count setting)"),
+    current_user: TokenPayload = Depends(require_roles(["admin"]))
+):
+    """
+    Start moving users to match a ring of `shards` shards, in the background;
+    requests keep being served, writes of users being moved get 503
+    """
+    with _rebalance["lock"]:
+        running = _rebalance["thread"]
+        if running is not None and running.is_alive():
+            raise HTTPException(status_code=409, detail="A rebalance is already running")
+        rebalancer = Rebalancer(shard_router.primary_path, shards or settings.shard_count,
+                                settings.shard_rebalance_batch_users, settings.shard_rebalance_drain_seconds)
+
+        def run():
+            try:
+                rebalancer.run()
+            except Exception as e:
+                rebalancer.progress["error"] = str(e)
+                print(f"❌ Shard rebalance failed: {e}")
+
+        _rebalance["rebalancer"] = rebalancer
+        _rebalance["thread"] = threading.Thread(target=run, name="shard-rebalance", daemon=True)
+        _rebalance["thread"].start()
+    print(f"🔀 Shard rebalance to {rebalancer.target} started by {current_user.sub}")
+    return rebalancer.progress
+
+async def _profile_response(session: dict, wait: bool, output: str, response: Response):
+    """The session marker (202), or with wait=true its result once the session is over"""
+    if not wait:
+        return session
+    await asyncio.sleep(max(session["until"] - time.time(), 0))
+    result = profiler.result(session["id"])
+    while result is not None and result["status"] == "running":
+        await asyncio.sleep(0.1)
+        result = profiler.result(session["id"])
+    return _profile_result(result, output, response)
+
+def _profile_result(result: Optional[dict], output: str, response: Response):
+    if result is None:
+        raise HTTPException(status_code=404, detail="Unknown profile session")
+    if result["status"] == "running":
+        response.status_code = 202
+        return result
+    if output == "folded":
+        if result["kind"] != "cpu":
+            raise HTTPException(status_code=400, detail="Folded output is for CPU profiles")
+        return PlainTextResponse(render_folded(result))
+    response.status_code = 200
+    return result
+
+@router.post("/admin/profile/cpu", status_code=202)
+async def start_cpu_profile(
+    request: Request,
+    response: Response,
+    seconds: float = Query(default=10.0, gt=0, description="Session length (capped at profile_max_seconds)"),
+    interval_ms: float = Query(default=10.0, ge=1, le=1000, description="Time between stack samples"),
+    include_idle: bool = Query(default=False, description="Keep samples of threads waiting for work"),
+    mode: str = Query(default="auto", pattern="^(auto|signal|thread)$",
+                      description="Sample on process CPU time (signal) or wall time (thread)"),
+    wait: bool = Query(default=False, description="Answer with the result once the session is over"),
+    format: str = Query(default="json", pattern="^(json|folded)$", description="Result format with wait=true"),
+    current_user: TokenPayload = Depends(require_roles(["admin"]))
+):
+    """
+    Sample this worker's Python stacks for `seconds`; fetch the result from
+    GET /admin/profile/{id} (format=folded for flame graph tools)
+    """
+    try:
+        session = profiler.start_cpu(routes_of(request.app), seconds, interval_ms, include_idle, mode)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    print(f"🔬 CPU profile {session['id']} ({session['seconds']}s) started by {current_user.sub}")
+    return await _profile_response(session, wait, format, response)
+
+@router.post("/admin/profile/memory", status_code=202)
+async def start_memory_profile(
+    request: Request,
+    response: Response,
+    seconds: float = Query(default=10.0, gt=0, description="Session length (capped at profile_max_seconds)"),
+    frames: int = Query(default=16, ge=1, le=64,
+                        description="Stack frames kept per allocation; more reach the route handler but cost more"),
+    wait: bool = Query(default=False, description="Answer with the result once the session is over"),
+    current_user: TokenPayload = Depends(require_roles(["admin"]))
+):
+    """
+    Trace this worker's allocations for `seconds` and report the call sites
+    and routes whose memory grew, from GET /admin/profile/{id}; every
+    allocation is slowed while it runs, so keep sessions short
+    """
+    try:
+        session = profiler.start_memory(routes_of(request.app), seconds, frames)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    print(f"🔬 Memory profile {session['id']} ({session['seconds']}s) started by {current_user.sub}")
+    return await _profile_response(session, wait, "json", response)
+
+@router.get("/admin/profile/{session_id}")
+async def get_profile(
+    session_id: str,
+    response: Response,
+    format: str = Query(default="json", pattern="^(json|folded)$"),
+    current_user: TokenPayload = Depends(require_roles(["admin"]))
+):
+    """
+    A profile session's result, or 202 with its marker while it is running
+    """
+    return _profile_result(profiler.result(session_id), format, response)
@@ -1,5 +1,9 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from typing import Optional
+from auth import require_roles, TokenPayload
+from audit_stream import CursorError, audit_hub, parse_cursor
 
 router = APIRouter()
 
@@ -12,3 +16,37 @@ async def log_audit(log: AuditLog):
     # For now, just log to console
     print(f"[AUDIT] Action: {log.action}, Status: {log.status}")
     return {"message": "Audit log received"}
+
+
+def _split(values: Optional[str]):
+    return frozenset(v.strip() for v in values.split(",") if v.strip()) if values else None
+
+@router.get("/audit/stream", tags=["Audit"])
+async def stream_audit_events(
+    request: Request,
+    action: Optional[str] = Query(default=None, description="Comma-separated actions to include"),
+    user_id: Optional[str] = Query(default=None, description="Comma-separated user ids to include"),
+    overflow: str = Query(default="disconnect", pattern="^(disconnect|drop)$",
+                          description="What happens when this client falls behind by more than the buffer"),
+    last_event_id: Optional[str] = Query(default=None, max_length=200,
+                                         description="Resume after this event id (the Last-Event-ID header wins)"),
+    current_user: TokenPayload = Depends(require_roles(["admin", "auditor"]))
+):
+    """
+    Server-Sent Events stream of audit log rows as they are written
+    """
+    cursor = request.headers.get("last-event-id") or last_event_id
+    try:
+        resume = parse_cursor(cursor, [source.key for source in audit_hub.sources]) if cursor else None
+    except CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        subscriber = audit_hub.subscribe(_split(action), _split(user_id), overflow)
+    except OverflowError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    print(f"📡 Audit stream opened by {current_user.sub} ({len(audit_hub.subscribers)} subscribers)")
+    return StreamingResponse(
+        audit_hub.stream(subscriber, resume),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
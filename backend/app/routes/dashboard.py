@@ -0,0 +1,104 @@
+"""
+Dashboard API route for FinTrust Gateway
+One request for what the dashboard otherwise loads from /accounts,
+/accounts/summary and /transactions: authenticated and authorized once, the
+sections read in one SQLite transaction, one audit record.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, Optional, Tuple
+from datetime import datetime
+import asyncio
+from auth import get_current_user, TokenPayload
+from opa_policy import check_access
+from db import get_db_connection, log_audit_event
+from metrics import stage
+from response_cache import read_cache
+from routes.accounts import (ACCOUNTS_SQL, BALANCE_ROLLUP_SQL, account_rows, check_account_access,
+                             read_audit, summarize_balances)
+from routes.transactions import TRANSACTIONS_SQL, transaction_rows
+from serialization import fetch_tuples
+
+router = APIRouter()
+
+SECTIONS = ("accounts", "summary", "transactions")
+FIELDS_PATTERN = r"^(accounts|summary|transactions)(,(accounts|summary|transactions))*$"
+
+
+def authorize(user: TokenPayload, sections: Tuple[str, ...]):
+    """The checks the separate endpoints make, run once for the sections requested"""
+    if ("accounts" in sections or "summary" in sections) and not check_account_access(user.sub, "read", "accounts"):
+        raise HTTPException(status_code=403, detail="Access denied")
+    if "transactions" in sections:
+        check_access(user_id=user.sub, action="read", resource="transactions", roles=user.roles)
+
+
+def read_sections(user_id: str, sections: Tuple[str, ...], view: str,
+                  transactions_limit: Optional[int]) -> Tuple[str, Dict[str, Any]]:
+    """(etag, payload) read inside one transaction, so every section shows the same snapshot"""
+    with stage("sqlite"):
+        conn = get_db_connection(user_id)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            etag = read_cache.etag_for(cursor, view, user_id)
+            payload: Dict[str, Any] = {}
+            if "accounts" in sections:
+                rows = fetch_tuples(cursor, ACCOUNTS_SQL, (user_id,))
+                payload["accounts"] = {
+                    "total_accounts": len(rows),
+                    "total_balance": float(sum(row[3] for row in rows)),
+                    "accounts": account_rows(rows),
+                }
+            if "summary" in sections:
+                payload["summary"] = summarize_balances(fetch_tuples(cursor, BALANCE_ROLLUP_SQL, (user_id,)))
+            if "transactions" in sections:
+                # LIMIT -1 is no limit
+                rows = fetch_tuples(cursor, TRANSACTIONS_SQL + " LIMIT ?",
+                                    (user_id, -1 if transactions_limit is None else transactions_limit))
+                payload["transactions"] = transaction_rows(rows)
+            conn.commit()
+        finally:
+            conn.close()
+    return etag, payload
+
+
+@router.get("/dashboard")
+async def get_dashboard(
+    request: Request,
+    fields: Optional[str] = Query(default=None, pattern=FIELDS_PATTERN,
+                                  description="Comma-separated sections: accounts, summary, transactions (default all)"),
+    transactions_limit: Optional[int] = Query(default=None, ge=1, le=10000, description="Newest transactions to include"),
+    user: TokenPayload = Depends(get_current_user)
+):
+    sections = tuple(s for s in SECTIONS if fields is None or s in fields.split(","))
+    view = "dashboard:" + "+".join(sections) + (f":{transactions_limit}" if transactions_limit else "")
+    client_ip = getattr(request.client, 'host', None)
+    user_agent = request.headers.get("user-agent")
+
+    cached = read_cache.lookup(view, user.sub, request.headers.get("if-none-match"))
+    if cached.hit:
+        await run_in_threadpool(authorize, user, sections)
+        outcome = "not modified" if cached.not_modified else "cached"
+        read_audit.submit((datetime.utcnow().isoformat(), user.sub, "read_dashboard", "dashboard",
+                           f"Dashboard {'+'.join(sections)} ({outcome})", client_ip, user_agent))
+        return cached.response()
+
+    # The policy call and the reads run concurrently; gather raises, and
+    # nothing is returned, unless authorize() succeeds
+    _, (etag, payload) = await asyncio.gather(
+        run_in_threadpool(authorize, user, sections),
+        run_in_threadpool(read_sections, user.sub, sections, view, transactions_limit),
+    )
+
+    counts = []
+    if "accounts" in payload:
+        counts.append(f"{payload['accounts']['total_accounts']} accounts")
+    if "transactions" in payload:
+        counts.append(f"{len(payload['transactions'])} transactions")
+    details = f"Dashboard {'+'.join(sections)}: {', '.join(counts) or 'summary only'}"
+    with stage("audit_write"):
+        await run_in_threadpool(log_audit_event, user_id=user.sub, action="read_dashboard", resource="dashboard",
+                                details=details, ip_address=client_ip, user_agent=user_agent)
+
+    return read_cache.respond(view, user.sub, etag, payload)
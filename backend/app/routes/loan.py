@@ -1,17 +1,73 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, Depends, Header
 import httpx
+from starlette.concurrency import run_in_threadpool
 import os
-from auth import get_current_user, TokenPayload
+from typing import Optional
+from auth import get_current_user, require_roles, TokenPayload
 from opa_policy import check_access
 from audit_log.logger import log_event
+from config import settings
+from result_cache import ResultCache, TTLCache, content_key
+from metrics import registry, stage, timed_stage
+from risk import risk_engine
 
 router = APIRouter()
 
 # URL of the encryption service (from .env or default Docker host)
 ENCRYPTION_API = os.getenv("ENCRYPTION_API", "http://encryption-service:5000")
 
+# Client retries of the same encrypted payload share one HE evaluation
+result_cache = ResultCache(settings.evaluate_cache_max_entries, settings.evaluate_cache_ttl_seconds)
+idempotency_keys = TTLCache(settings.evaluate_cache_max_entries, settings.evaluate_cache_ttl_seconds)
+
+# Latest model version reported by the encryption service (part of the cache key)
+model_version = settings.loan_model_version
+
+
+@timed_stage("encryption_service")
+async def call_encryption_service(encrypted_payload: str) -> str:
+    global model_version
+
+    async with httpx.AsyncClient() as client:
+        response = await client.post(f"{ENCRYPTION_API}/loan/evaluate", json={"encrypted_payload": encrypted_payload})
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=502, detail="Encryption service error")
+
+    body = response.json()
+    encrypted_result = body.get("encrypted_loan_result")
+    if not encrypted_result:
+        raise HTTPException(status_code=500, detail="Missing encrypted loan result from HE service")
+
+    reported_version = body.get("model_version")
+    if reported_version and reported_version != model_version:
+        # New model deployed: results computed by the old one must not be served
+        print(f"🔄 Loan model changed {model_version} -> {reported_version}, clearing result cache")
+        model_version = reported_version
+        result_cache.cache.clear()
+
+    return encrypted_result
+
+
+def _cache_metrics():
+    stats = result_cache.stats()
+    yield ("fintrust_evaluate_cache_hits_total", "counter", "Evaluate requests served from cache or a shared in-flight call", {}, stats["hits"])
+    yield ("fintrust_evaluate_cache_misses_total", "counter", "Evaluate requests that called the encryption service", {}, stats["misses"])
+    yield ("fintrust_evaluate_cache_hit_ratio", "gauge", "Evaluate cache hit ratio", {}, stats["hit_ratio"])
+    yield ("fintrust_evaluate_cache_saved_seconds_total", "counter", "Encryption service time saved by cache hits", {}, stats["saved_compute_seconds"])
+    yield ("fintrust_evaluate_cache_entries", "gauge", "Entries in the evaluate result cache", {}, stats["entries"])
+
+
+registry.register_collector(_cache_metrics)
+
+
 @router.post("/evaluate")
-async def evaluate_loan(request: Request, user: TokenPayload = Depends(get_current_user)):
+async def evaluate_loan(
+    request: Request,
+    response: Response,
+    user: TokenPayload = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+):
     # ✅ Step 1: Check policy via OPA
     check_access(
         user_id=user.sub,
@@ -24,33 +80,65 @@ async def evaluate_loan(request: Request, user: TokenPayload = Depends(get_curre
     try:
         payload = await request.json()
         encrypted_payload = payload.get("encrypted_payload")
-        if not encrypted_payload:
-            raise HTTPException(status_code=400, detail="Missing encrypted_payload in request body.")
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid JSON request")
+    if not encrypted_payload:
+        raise HTTPException(status_code=400, detail="Missing encrypted_payload in request body.")
 
-    # ✅ Step 3: Call Flask HE service
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(f"{ENCRYPTION_API}/loan/evaluate", json={"encrypted_payload": encrypted_payload})
+    # ✅ Step 3: Replay a completed request with the same Idempotency-Key
+    request_key = content_key(user.sub, model_version, encrypted_payload)
+    idempotency_slot = content_key("idempotency", user.sub, idempotency_key) if idempotency_key else None
+    stored = idempotency_keys.get(idempotency_slot) if idempotency_slot else None
+    if stored is not None:
+        stored_request_key, encrypted_result = stored
+        if stored_request_key != request_key:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used with a different request body"
+            )
+        response.headers["Idempotent-Replayed"] = "true"
+        cached = True
+    else:
+        # ✅ Step 4: Call Flask HE service (cached and deduplicated by content)
+        try:
+            encrypted_result, cached = await result_cache.get_or_compute(
+                request_key, lambda: call_encryption_service(encrypted_payload)
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Loan evaluation failed: {str(e)}")
 
-        if response.status_code != 200:
-            raise HTTPException(status_code=502, detail="Encryption service error")
+    if idempotency_slot:
+        idempotency_keys.set(idempotency_slot, (request_key, encrypted_result))
+    response.headers["X-Cache"] = "HIT" if cached else "MISS"
 
-        encrypted_result = response.json().get("encrypted_loan_result")
-        if not encrypted_result:
-            raise HTTPException(status_code=500, detail="Missing encrypted loan result from HE service")
+    # ✅ Step 5: Plaintext transaction-risk features to weigh alongside the HE result
+    risk = await run_in_threadpool(risk_engine.score, user.sub) if settings.risk_enabled else None
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Loan evaluation failed: {str(e)}")
+    # ✅ Step 6: Log the event
+    with stage("audit_write"):
+        log_event(
+            user_id=user.sub,
+            action="loan_evaluation",
+            details=f"Loan evaluated for user {user.preferred_username} using homomorphic encryption"
+                    + (" (cached result)" if cached else "")
+                    + (f", transaction risk {risk['risk_score']}" if risk else ""),
+            encrypted=True
+        )
+
+    # ✅ Step 7: Return result
+    result = {"encrypted_loan_result": encrypted_result}
+    if risk:
+        result["risk"] = risk
+    return result
 
-    # ✅ Step 4: Log the event
-    log_event(
-        user_id=user.sub,
-        action="loan_evaluation",
-        details=f"Loan evaluated for user {user.preferred_username} using homomorphic encryption",
-        encrypted=True
-    )
 
-    # ✅ Step 5: Return result
-    return {"encrypted_loan_result": encrypted_result}
+@router.get("/evaluate/cache")
+async def evaluate_cache_stats(user: TokenPayload = Depends(require_roles(["admin"]))):
+    """Hit ratio and saved HE compute time for the evaluate result cache (admin only)"""
+    return {
+        "model_version": model_version,
+        "result_cache": result_cache.stats(),
+        "idempotency_keys": idempotency_keys.stats(),
+    }
@@ -0,0 +1,38 @@
+"""
+Risk API routes for FinTrust Gateway
+Sliding-window transaction risk features (risk.py) for the current user, and
+for any user or the engine itself for admins
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
+from auth import get_current_user, require_roles, TokenPayload
+from config import settings
+from risk import risk_engine
+
+router = APIRouter()
+
+
+def _require_enabled():
+    if not settings.risk_enabled:
+        raise HTTPException(status_code=404, detail="Risk scoring is disabled")
+
+
+@router.get("/risk/score")
+async def get_my_risk_score(user: TokenPayload = Depends(get_current_user)):
+    """Velocity, merchant novelty and amount z-score features for the current user"""
+    _require_enabled()
+    return await run_in_threadpool(risk_engine.score, user.sub)
+
+
+@router.get("/risk/score/{user_id}")
+async def get_risk_score(user_id: str, user: TokenPayload = Depends(require_roles(["admin"]))):
+    """Risk features for any user (admin only)"""
+    _require_enabled()
+    return await run_in_threadpool(risk_engine.score, user_id)
+
+
+@router.get("/admin/risk")
+async def get_risk_engine_stats(user: TokenPayload = Depends(require_roles(["admin"]))):
+    """Tracked users, events folded in, tail positions and snapshot age of this worker's risk engine"""
+    _require_enabled()
+    return risk_engine.stats()
@@ -1,13 +1,45 @@
-from fastapi import APIRouter, Depends
-from auth import get_current_user, TokenPayload
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+from datetime import datetime
+import asyncio
+import contextlib
+import io
+import queue
+import threading
+import uuid
+from auth import get_current_user, require_roles, TokenPayload
 from opa_policy import check_access
-from audit_log.logger import log_event
+from audit_log.logger import log_event, log_events
+from config import settings
+import db
 from db import get_db_connection
+from ingest import BatchConflict, QueueReader, StreamAborted, detect_format, ingest_stream
+from metrics import stage
+from response_cache import AuditBatcher, read_cache
+from search import SearchQueryError, search
+from serialization import FastJSONResponse, RowMapper, fetch_tuples
 
 router = APIRouter()
 
+transaction_rows = RowMapper("id", "amount", "merchant", "timestamp")
+spending_rows = RowMapper("month", "merchant", "transaction_count", "total_amount", "debit_total", "credit_total")
+
+# Shared with the dashboard route
+TRANSACTIONS_SQL = """
+    SELECT id, amount, merchant, timestamp 
+    FROM user_transactions 
+    WHERE user_id = ?
+    ORDER BY timestamp DESC
+"""
+
+# Reads answered without a query are audited in batches
+read_audit = AuditBatcher("transactions", log_events, settings.read_audit_batch_size, settings.read_audit_flush_seconds)
+
+# /api/v1/transactions is what the dashboard polls; "/" kept for existing clients
+@router.get("/transactions")
 @router.get("/")
-def get_transactions(user: TokenPayload = Depends(get_current_user)):
+def get_transactions(request: Request, user: TokenPayload = Depends(get_current_user)):
     # ✅ Step 1: Enforce Zero Trust with OPA
     check_access(
         user_id=user.sub,
@@ -16,34 +48,214 @@ def get_transactions(user: TokenPayload = Depends(get_current_user)):
         roles=user.roles
     )
 
-    # ✅ Step 2: Query transactions from DB
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT id, amount, merchant, timestamp 
-        FROM user_transactions 
-        WHERE user_id = ?
-        ORDER BY timestamp DESC
-    """, (user.sub,))
-    rows = cursor.fetchall()
-    conn.close()
-
-    transactions = [
-        {
-            "id": row["id"],
-            "amount": row["amount"],
-            "merchant": row["merchant"],
-            "timestamp": row["timestamp"]
-        }
-        for row in rows
-    ]
-
-    # ✅ Step 3: Audit log
-    log_event(
+    # ✅ Step 2: Unchanged since the client's copy (304) or our cached body: no query, audit batched
+    cached = read_cache.lookup("transactions", user.sub, request.headers.get("if-none-match"))
+    if cached.hit:
+        outcome = "not modified" if cached.not_modified else "cached"
+        read_audit.submit((datetime.utcnow().isoformat(), user.sub, "read_transactions",
+                           f"User {user.preferred_username} accessed transactions ({outcome})", 0))
+        return cached.response()
+
+    # ✅ Step 3: Query transactions from DB; the version is read in the same snapshot
+    with stage("sqlite"):
+        conn = get_db_connection(user.sub)
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        etag = read_cache.etag_for(cursor, "transactions", user.sub)
+        rows = fetch_tuples(cursor, TRANSACTIONS_SQL, (user.sub,))
+        conn.commit()
+        conn.close()
+
+    transactions = transaction_rows(rows)
+
+    # ✅ Step 4: Audit log
+    with stage("audit_write"):
+        log_event(
+            user_id=user.sub,
+            action="read_transactions",
+            details=f"User {user.preferred_username} accessed {len(transactions)} transactions",
+            encrypted=False
+        )
+
+    return read_cache.respond("transactions", user.sub, etag, {"transactions": transactions})
+
+
+@router.get("/transactions/spending")
+def get_monthly_spending(
+    month: Optional[str] = Query(default=None, pattern=r"^\d{4}-\d{2}$", description="YYYY-MM; all months if omitted"),
+    user: TokenPayload = Depends(get_current_user)
+):
+    check_access(
         user_id=user.sub,
-        action="read_transactions",
-        details=f"User {user.preferred_username} accessed {len(transactions)} transactions",
-        encrypted=False
+        action="read",
+        resource="transactions",
+        roles=user.roles
     )
 
-    return {"transactions": transactions}
+    # Reads the monthly_merchant_spend rollup: one row per month and merchant
+    with stage("sqlite"):
+        conn = get_db_connection(user.sub)
+        cursor = conn.cursor()
+        if month:
+            rows = fetch_tuples(cursor, """
+                SELECT month, merchant, transaction_count, total_amount, debit_total, credit_total
+                FROM monthly_merchant_spend
+                WHERE user_id = ? AND month = ?
+                ORDER BY debit_total DESC
+            """, (user.sub, month))
+        else:
+            rows = fetch_tuples(cursor, """
+                SELECT month, merchant, transaction_count, total_amount, debit_total, credit_total
+                FROM monthly_merchant_spend
+                WHERE user_id = ?
+                ORDER BY month DESC, debit_total DESC
+            """, (user.sub,))
+        conn.close()
+
+    with stage("audit_write"):
+        log_event(
+            user_id=user.sub,
+            action="read_spending",
+            details=f"User {user.preferred_username} viewed spending for {month or 'all months'}",
+            encrypted=False
+        )
+
+    return FastJSONResponse({"month": month, "spending": spending_rows(rows)})
+
+
+@router.get("/transactions/search")
+def search_transactions(
+    q: str = Query(..., min_length=1, max_length=200,
+                   description="Words matched against merchant and description; end a word with * to match a prefix"),
+    sort: str = Query(default="relevance", pattern="^(relevance|recent)$"),
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, max_length=512, description="next_cursor from the previous page"),
+    user: TokenPayload = Depends(get_current_user)
+):
+    check_access(
+        user_id=user.sub,
+        action="read",
+        resource="transactions",
+        roles=user.roles
+    )
+
+    with stage("sqlite"):
+        conn = get_db_connection(user.sub)
+        try:
+            page = search(conn, user.sub, q, sort=sort, limit=limit, cursor=cursor)
+        except SearchQueryError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        finally:
+            conn.close()
+
+    with stage("audit_write"):
+        log_event(
+            user_id=user.sub,
+            action="search_transactions",
+            details=f"User {user.preferred_username} searched transactions ({len(page['results'])} results)",
+            encrypted=False
+        )
+
+    return FastJSONResponse({"query": q, "sort": sort, **page})
+
+
+@router.post("/transactions/bulk")
+async def bulk_ingest_transactions(
+    request: Request,
+    batch_id: Optional[str] = Query(default=None, max_length=200,
+                                    description="Re-submitting the same batch_id never inserts a row twice"),
+    format: Optional[str] = Query(default=None, pattern="^(ndjson|csv)$",
+                                  description="Defaults to the Content-Type (application/x-ndjson or text/csv)"),
+    user: TokenPayload = Depends(require_roles(["admin", "ingest"]))
+):
+    """
+    Stream NDJSON or CSV transactions into the database. Invalid rows are
+    reported individually and do not abort the batch.
+    """
+    check_access(
+        user_id=user.sub,
+        action="bulk_ingest",
+        resource="transactions",
+        roles=user.roles
+    )
+
+    fmt = format or detect_format(content_type=request.headers.get("content-type", ""))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Send application/x-ndjson or text/csv, or pass ?format=")
+    batch_id = batch_id or str(uuid.uuid4())
+
+    # The body is parsed and written on a worker thread while it is still
+    # arriving; the bounded queue applies backpressure to the upload
+    chunks = queue.Queue(maxsize=16)
+    stream = io.TextIOWrapper(io.BufferedReader(QueueReader(chunks)), encoding="utf-8", newline="")
+
+    ingest_done = threading.Event()
+
+    def put_blocking(chunk) -> bool:
+        # Waits for room off the event loop; gives up once the ingestor has
+        # stopped reading (a replayed or conflicting batch, or an error)
+        while not ingest_done.is_set():
+            try:
+                chunks.put(chunk, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def stop_feeding(_):
+        ingest_done.set()
+        # Room for a put already waiting, so it returns without its timeout
+        with contextlib.suppress(queue.Empty):
+            while True:
+                chunks.get_nowait()
+
+    async def feed(chunk) -> bool:
+        if ingest_done.is_set():
+            return False
+        try:
+            chunks.put_nowait(chunk)
+            return True
+        except queue.Full:
+            return await run_in_threadpool(put_blocking, chunk)
+
+    with stage("bulk_ingest"):
+        ingest = asyncio.ensure_future(run_in_threadpool(
+            ingest_stream, db.DB_PATH, stream, fmt, batch_id, user.sub,
+            settings.bulk_ingest_chunk_rows, settings.bulk_ingest_max_errors
+        ))
+        ingest.add_done_callback(stop_feeding)
+        try:
+            async for chunk in request.stream():
+                # Stops early when the batch is answered without reading it (replay, conflict)
+                if chunk and not await feed(chunk):
+                    break
+        except BaseException:
+            # Cut off (ClientDisconnect or any other error): the ingestor stops
+            # before finish(), so the batch stays running for a re-submission and
+            # its unwritten chunk, half-received last row included, is dropped
+            await feed(StreamAborted(f"Upload of batch {batch_id} ended early"))
+            try:
+                await ingest
+            except Exception:
+                pass
+            raise
+        await feed(None)
+
+        try:
+            summary = await ingest
+        except BatchConflict as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="Request body must be UTF-8")
+
+    if not summary["replayed"]:
+        with stage("audit_write"):
+            log_event(
+                user_id=user.sub,
+                action="bulk_ingest_transactions",
+                details=f"Batch {batch_id}: {summary['rows_inserted']} inserted, "
+                        f"{summary['rows_duplicate']} duplicate, {summary['rows_rejected']} rejected",
+                encrypted=False
+            )
+
+    return FastJSONResponse(summary)
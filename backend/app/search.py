@@ -0,0 +1,204 @@
+"""
+Transaction search for FinTrust Gateway
+Builds FTS5 queries and keyset-paginated searches over the transaction_search
+index (see migrations/0007_transaction_search.sql), indexes rows written in
+bulk, and can check or rebuild the index against user_transactions.
+"""
+import base64
+import json
+import re
+import sqlite3
+from typing import List, Optional
+
+from serialization import RowMapper, fetch_tuples
+
+SORTS = ("relevance", "recent")
+MAX_TERMS = 8
+MIN_PREFIX_CHARS = 2
+
+# Tokens as unicode61 splits them (letters and digits; "_" separates), so each
+# quoted term is a single token rather than an accidental phrase
+_TERM = re.compile(r"([^\W_]+)(\*?)")
+
+_RELEVANCE_SQL = """
+    SELECT t.id, t.amount, t.merchant, t.description, t.timestamp, -s.rank
+    FROM transaction_search s
+    JOIN user_transactions t ON t.id = s.rowid
+    WHERE s.transaction_search MATCH ? {after}
+    ORDER BY s.rank, s.rowid
+    LIMIT ?
+"""
+
+_RECENT_SQL = """
+    SELECT t.id, t.amount, t.merchant, t.description, t.timestamp, NULL
+    FROM transaction_search s
+    JOIN user_transactions t ON t.id = s.rowid
+    WHERE s.transaction_search MATCH ? {after}
+    ORDER BY t.timestamp DESC, t.id DESC
+    LIMIT ?
+"""
+
+# score is the bm25 relevance (higher is better), null when sorting by recency
+result_rows = RowMapper("id", "amount", "merchant", "description", "timestamp", "score")
+
+
+class SearchQueryError(ValueError):
+    """The search text or cursor cannot be used"""
+
+
+def owner_token(user_id: str) -> str:
+    """The owner column value the index stores for user_id ('u' || hex(user_id) in SQL)"""
+    return "u" + user_id.encode("utf-8").hex().upper()
+
+
+def build_match(user_id: str, query: str) -> str:
+    """
+    FTS5 MATCH expression for a user's search text: every term must match
+    merchant or description, and a trailing * makes a term a prefix.
+    """
+    terms = []
+    for word, star in _TERM.findall(query)[:MAX_TERMS]:
+        if star and len(word) < MIN_PREFIX_CHARS:
+            raise SearchQueryError(f"Prefix terms need at least {MIN_PREFIX_CHARS} characters")
+        terms.append(f'"{word}"{star}')
+    if not terms:
+        raise SearchQueryError("Search text has no searchable terms")
+    return f'owner : "{owner_token(user_id)}" AND {{merchant description}} : ({" AND ".join(terms)})'
+
+
+def encode_cursor(sort: str, key, row_id: int) -> str:
+    raw = json.dumps([sort, key, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, key, row_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise SearchQueryError("Invalid cursor")
+    valid_key = isinstance(key, (int, float)) if sort == "relevance" else isinstance(key, str)
+    if cursor_sort != sort or not valid_key or not isinstance(row_id, int):
+        raise SearchQueryError("Cursor does not belong to this search")
+    return key, row_id
+
+
+def search(conn: sqlite3.Connection, user_id: str, query: str, sort: str = "relevance",
+           limit: int = 20, cursor: Optional[str] = None) -> dict:
+    """
+    One page of a user's matching transactions. Pages are keyset-paginated on
+    (rank, id) or (timestamp, id); relevance pages follow the ranking as it
+    was when each page was read, so concurrent writes can shift later pages.
+    """
+    if sort not in SORTS:
+        raise SearchQueryError(f"sort must be one of {', '.join(SORTS)}")
+    params: List = [build_match(user_id, query)]
+    after = ""
+    if cursor:
+        key, row_id = decode_cursor(cursor, sort)
+        if sort == "relevance":
+            after = "AND (s.rank > ? OR (s.rank = ? AND s.rowid > ?))"
+            params += [key, key, row_id]
+        else:
+            after = "AND (t.timestamp, t.id) < (?, ?)"
+            params += [key, row_id]
+    sql = (_RELEVANCE_SQL if sort == "relevance" else _RECENT_SQL).format(after=after)
+
+    # One extra row says whether there is a next page
+    rows = fetch_tuples(conn.cursor(), sql, params + [limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, -last[5] if sort == "relevance" else last[4], last[0])
+    return {"results": result_rows(rows), "next_cursor": next_cursor}
+
+
+def index_rows(conn: sqlite3.Connection, after_id: int) -> int:
+    """
+    Index every transaction with id > after_id in one statement. Bulk writers
+    call this after their executemany, in the same transaction.
+    """
+    cursor = conn.execute("""
+        INSERT INTO transaction_search (rowid, owner, merchant, description)
+        SELECT id, 'u' || hex(user_id), merchant, description
+        FROM user_transactions
+        WHERE id > ?
+    """, (after_id,))
+    return cursor.rowcount
+
+
+def check(conn: sqlite3.Connection) -> dict:
+    """Compare the indexed rowids with user_transactions and run the FTS5 integrity check"""
+    missing = conn.execute(
+        "SELECT COUNT(*) FROM (SELECT id FROM user_transactions EXCEPT SELECT rowid FROM transaction_search)"
+    ).fetchone()[0]
+    orphaned = conn.execute(
+        "SELECT COUNT(*) FROM (SELECT rowid FROM transaction_search EXCEPT SELECT id FROM user_transactions)"
+    ).fetchone()[0]
+    try:
+        conn.execute("INSERT INTO transaction_search (transaction_search) VALUES ('integrity-check')")
+        integrity_error = None
+    except sqlite3.DatabaseError as e:
+        integrity_error = str(e)
+    return {
+        "index": "transaction_search",
+        "missing_rows": missing,
+        "orphaned_rows": orphaned,
+        "integrity_error": integrity_error,
+        "consistent": not missing and not orphaned and integrity_error is None,
+    }
+
+
+def rebuild(conn: sqlite3.Connection) -> int:
+    """Re-index every transaction under the write lock. Returns the row count."""
+    in_transaction = conn.in_transaction
+    if not in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("INSERT INTO transaction_search (transaction_search) VALUES ('delete-all')")
+        count = index_rows(conn, 0)
+        conn.execute("INSERT INTO transaction_search (transaction_search) VALUES ('optimize')")
+        if not in_transaction:
+            conn.execute("COMMIT")
+    except BaseException:
+        if not in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    print(f"🔁 Rebuilt transaction search index ({count} rows)")
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from db import DB_PATH
+    from shards import read_topology, shard_path
+
+    parser = argparse.ArgumentParser(description="Check, rebuild or optimize the transaction search index on every shard")
+    parser.add_argument("command", choices=["check", "rebuild", "optimize"])
+    parser.add_argument("--db", default=DB_PATH, help="Primary database; its shards are found from the catalog")
+    args = parser.parse_args()
+
+    primary = sqlite3.connect(args.db, timeout=30)
+    try:
+        shards = read_topology(primary).shards()
+    finally:
+        primary.close()
+
+    reports = []
+    for shard in shards:
+        connection = sqlite3.connect(shard_path(args.db, shard), timeout=30, isolation_level=None)
+        try:
+            if args.command == "rebuild":
+                rebuild(connection)
+            elif args.command == "optimize":
+                # Merges all index segments into one; worth running after large loads
+                connection.execute("INSERT INTO transaction_search (transaction_search) VALUES ('optimize')")
+                print(f"✅ Transaction search index optimized on shard {shard}")
+            else:
+                reports.append(dict(check(connection), shard=shard))
+        finally:
+            connection.close()
+    if reports:
+        print(json.dumps(reports, indent=2))
@@ -0,0 +1,70 @@
+"""
+Response serialization for FinTrust Gateway
+Fast path for list endpoints: SQLite row tuples go straight to JSON bytes
+through a per-query compiled row mapper, skipping per-row pydantic models
+and response_model re-validation. Uses orjson when installed, else json.
+"""
+import json
+from typing import Any, Callable, Iterable, List, Sequence
+
+from fastapi.responses import Response
+
+from metrics import stage
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+if orjson is not None:
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content)
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+
+    def dumps(content: Any) -> bytes:
+        return _encoder.encode(content).encode("utf-8")
+
+
+class RowMapper:
+    """
+    Maps rows of one query (tuples in SELECT column order) to JSON-ready dicts.
+    The mapping is compiled once into a single list comprehension, e.g.
+    [{"id": _0, "amount": _1} for (_0, _1) in rows].
+    """
+
+    def __init__(self, *keys: str):
+        if not keys or len(set(keys)) != len(keys):
+            raise ValueError("RowMapper needs distinct output keys")
+        self.keys = keys
+        names = [f"_{i}" for i in range(len(keys))]
+        fields = ", ".join(f"{key!r}: {name}" for key, name in zip(keys, names))
+        source = f"lambda rows: [{{{fields}}} for ({', '.join(names)},) in rows]"
+        self._map: Callable[[Iterable[Sequence]], List[dict]] = eval(compile(source, f"<RowMapper {keys}>", "eval"))
+
+    def __call__(self, rows: Iterable[Sequence]) -> List[dict]:
+        return self._map(rows)
+
+
+def fetch_tuples(cursor, sql: str, params: Sequence = ()) -> list:
+    """Run a query returning plain tuples, bypassing the connection's sqlite3.Row factory"""
+    cursor.row_factory = None
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response for content that is already JSON-ready (plain dicts, lists,
+    str/int/float/bool/None), or already-encoded bytes. Returning it from a
+    route bypasses response_model validation; the model still documents the
+    schema in OpenAPI.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        with stage("serialize"):
+            return dumps(content)
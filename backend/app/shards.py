@@ -0,0 +1,523 @@
+"""
+Shard routing for FinTrust Gateway
+Per-user rows (accounts, transactions and the rollups, search index and data
+versions derived from them) live in one of N SQLite files, chosen by a
+consistent-hash ring over user_id, so writes for different users do not queue
+on one database lock. Shard 0 is the primary database (db.DB_PATH): it also
+keeps what is not per user (users, audit_logs, ingest_batches) and the shard
+catalog (migrations/0010_shard_catalog.sql), which holds the shard count the
+ring is built for and the users pinned elsewhere while they are moved.
+
+Routers cache the catalog and only re-read it when PRAGMA data_version shows
+a commit to the primary and the catalog's version has changed, so routing a
+request is one pragma and an in-memory ring lookup.
+
+Rebalancing to a new shard count (Rebalancer, `python shards.py rebalance`)
+runs against live databases:
+  1. users whose ring position changes are pinned to the shard holding their
+     rows and the catalog switches to the new count; routing is unchanged
+  2. per batch: the users are marked moving (their writes fail with
+     ShardMovingError, a 503 the client retries), in-flight writes drain, the
+     rows are copied to the new shard, the pins are dropped so requests go to
+     the new shard, in-flight reads drain, and the old rows are deleted
+Account and transaction ids are per shard, so a moved user's rows get new ids.
+"""
+import asyncio
+import bisect
+import fcntl
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+import rollups
+from migrate import MigrationResult, discover, migrate
+from search import index_rows
+
+RING_POINTS = 64
+# Development sample users belong to the primary only
+PRIMARY_ONLY_MIGRATIONS = ("sample_data",)
+
+_VERSION_SQL = """
+    INSERT INTO user_data_versions (user_id, version) VALUES (?, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+"""
+
+
+class ShardMovingError(Exception):
+    """The user's rows are being moved to another shard; retry the write shortly"""
+
+
+class RebalanceInProgress(Exception):
+    """Another rebalance holds the lock for this database"""
+
+
+def shard_path(primary: str, shard: int) -> str:
+    """Shard 0 is the primary file; shard 3 of ./fintrust.db is ./fintrust.shard3.db"""
+    if shard == 0:
+        return primary
+    root, ext = os.path.splitext(primary)
+    return f"{root}.shard{shard}{ext}"
+
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent-hash ring over shard indexes, with `points` virtual nodes per
+    shard; going from N to N+1 shards moves about 1/(N+1) of the users
+    """
+
+    def __init__(self, shard_count: int, points: int = RING_POINTS):
+        ring = sorted((_point(f"shard-{shard}:{point}"), shard)
+                      for shard in range(shard_count) for point in range(points))
+        self.shard_count = shard_count
+        self.points = points
+        self._points = [point for point, _ in ring]
+        self._shards = [shard for _, shard in ring]
+
+    def shard_for(self, user_id: str) -> int:
+        return self._shards[bisect.bisect(self._points, _point(user_id)) % len(self._points)]
+
+
+@dataclass(frozen=True)
+class Topology:
+    version: int
+    shard_count: int
+    # Users routed somewhere other than their ring position: user_id -> (shard, moving)
+    placements: Dict[str, Tuple[int, bool]] = field(default_factory=dict)
+
+    def shards(self) -> List[int]:
+        """Every shard that may hold rows: the ring's, and any a user is pinned to"""
+        return sorted(set(range(self.shard_count)) | {shard for shard, _ in self.placements.values()})
+
+
+def catalog_version(conn: sqlite3.Connection) -> Optional[int]:
+    """None for a primary that predates the shard catalog"""
+    try:
+        row = conn.execute("SELECT version FROM shard_topology WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def read_topology(conn: sqlite3.Connection) -> Topology:
+    if catalog_version(conn) is None:
+        return Topology(0, 1)
+    version, shard_count = conn.execute("SELECT version, shard_count FROM shard_topology WHERE id = 1").fetchone()
+    placements = {user_id: (shard, bool(moving)) for user_id, shard, moving in
+                  conn.execute("SELECT user_id, shard, moving FROM shard_placements")}
+    return Topology(version, shard_count, placements)
+
+
+def migrate_shard(path: str, shard: int) -> MigrationResult:
+    migrations = discover()
+    if shard:
+        migrations = [m for m in migrations if m.name not in PRIMARY_ONLY_MIGRATIONS]
+    return migrate(path, migrations)
+
+
+def migrate_all(primary: str) -> MigrationResult:
+    """Migrate the primary, then every other shard in its catalog; returns the primary's result"""
+    result = migrate_shard(primary, 0)
+    conn = sqlite3.connect(primary)
+    try:
+        topology = read_topology(conn)
+    finally:
+        conn.close()
+    for shard in topology.shards():
+        if shard:
+            migrate_shard(shard_path(primary, shard), shard)
+    return result
+
+
+class ShardRouter:
+    """Maps user_id to the shard database holding that user's rows; one per process"""
+
+    def __init__(self, primary: Callable[[], str], points: int = RING_POINTS):
+        self._primary = primary
+        self.points = points
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._path: Optional[str] = None
+        self._data_version: Optional[int] = None
+        self._topology = Topology(0, 1)
+        self._ring = HashRing(1, points)
+
+    @property
+    def primary_path(self) -> str:
+        return self._primary()
+
+    def _current(self) -> Tuple[Topology, HashRing]:
+        with self._lock:
+            path = self._primary()
+            if self._conn is None or self._path != path:
+                if self._conn is not None:
+                    self._conn.close()
+                self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+                self._path, self._data_version, self._topology = path, None, Topology(-1, 1)
+            # Changes whenever another connection commits to the primary; no table is read
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self._data_version:
+                version = catalog_version(self._conn)
+                if version != self._topology.version:
+                    self._topology = read_topology(self._conn)
+                    if self._ring.shard_count != self._topology.shard_count:
+                        self._ring = HashRing(self._topology.shard_count, self.points)
+                # An unmigrated primary is re-checked on every call until the catalog exists
+                self._data_version = data_version if version is not None else None
+            return self._topology, self._ring
+
+    def topology(self) -> Topology:
+        return self._current()[0]
+
+    def shard_for(self, user_id: str, write: bool = False) -> int:
+        """write=True raises ShardMovingError while the user's rows are being copied"""
+        topology, ring = self._current()
+        placed = topology.placements.get(user_id)
+        if placed is None:
+            return ring.shard_for(user_id)
+        if write and placed[1]:
+            raise ShardMovingError(f"User {user_id} is being moved to another shard")
+        return placed[0]
+
+    def path(self, shard: int) -> str:
+        return shard_path(self._primary(), shard)
+
+    def path_for(self, user_id: str, write: bool = False) -> str:
+        return self.path(self.shard_for(user_id, write))
+
+    def shards(self) -> List[int]:
+        return self.topology().shards()
+
+    def connect(self, user_id: Optional[str] = None, write: bool = False) -> sqlite3.Connection:
+        """Connection to user_id's shard, or to the primary without a user"""
+        conn = sqlite3.connect(self.primary_path if user_id is None else self.path_for(user_id, write))
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    async def scatter(self, fn: Callable[[int, str], Any]) -> List[Any]:
+        """fn(shard, path) for every shard, concurrently on the threadpool; results in shard order"""
+        return list(await asyncio.gather(*(run_in_threadpool(fn, shard, self.path(shard))
+                                           for shard in self.shards())))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# ------------------------------
+# Moving users
+# ------------------------------
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})") if row[1] != "id"]
+
+
+def _insert_sql(table: str, columns: Sequence[str]) -> str:
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+
+def user_ids(conn: sqlite3.Connection) -> Set[str]:
+    return {row[0] for row in conn.execute(
+        "SELECT user_id FROM user_accounts UNION SELECT user_id FROM user_transactions")}
+
+
+def copy_users(source: sqlite3.Connection, target: sqlite3.Connection, users: Sequence[str]) -> int:
+    """
+    Append the users' accounts and transactions to target, with new ids, and
+    bring target's rollups, search index and data versions up to date; runs in
+    the callers' transactions. Returns the rows copied.
+    """
+    first_id = target.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM user_transactions").fetchone()[0]
+    marks = ",".join("?" * len(users))
+    account_columns = _columns(source, "user_accounts")
+    insert_account = _insert_sql("user_accounts", account_columns)
+    account_ids: Dict[int, int] = {}
+    for row in source.execute(f"SELECT id, {', '.join(account_columns)} FROM user_accounts "
+                              f"WHERE user_id IN ({marks}) ORDER BY id", users):
+        account_ids[row[0]] = target.execute(insert_account, row[1:]).lastrowid
+
+    columns = _columns(source, "user_transactions")
+    account_at, batch_at = columns.index("account_id"), columns.index("batch_id")
+    loose, batched = [], []
+    for row in source.execute(f"SELECT {', '.join(columns)} FROM user_transactions "
+                              f"WHERE user_id IN ({marks}) ORDER BY id", users):
+        row = list(row)
+        if row[account_at] is not None:
+            row[account_at] = account_ids.get(row[account_at])
+        (loose if row[batch_at] is None else batched).append(row)
+
+    # Rows from bulk batches keep (batch_id, batch_row), so re-submitted
+    # batches still skip them, and are indexed the way ingest.py does it
+    insert = _insert_sql("user_transactions", columns)
+    target.executemany(insert, loose)
+    last_id = target.execute("SELECT COALESCE(MAX(id), 0) FROM user_transactions").fetchone()[0]
+    target.executemany(insert, batched)
+    if loose or batched:
+        # The copy holds the target's write lock, so its new ids are one range
+        target.execute("INSERT INTO shard_copied_rows (first_id, last_id, copied_at) "
+                       "SELECT ?, MAX(id), strftime('%Y-%m-%dT%H:%M:%fZ', 'now') FROM user_transactions",
+                       (first_id,))
+    index_rows(target, last_id)
+    rollups.rebuild_users(target, users)
+    target.executemany(_VERSION_SQL, [(user_id,) for user_id in users])
+    return len(account_ids) + len(loose) + len(batched)
+
+
+def purge_users(conn: sqlite3.Connection, users: Sequence[str]):
+    """Delete the users' rows and everything derived from them; runs in the caller's transaction"""
+    marks = ",".join("?" * len(users))
+    conn.execute(f"DELETE FROM user_transactions WHERE user_id IN ({marks})", users)
+    conn.execute(f"DELETE FROM user_accounts WHERE user_id IN ({marks})", users)
+    conn.execute(f"DELETE FROM user_data_versions WHERE user_id IN ({marks})", users)
+    rollups.rebuild_users(conn, users)
+
+
+class Rebalancer:
+    """Moves users between shards until the layout matches a ring of `target` shards"""
+
+    def __init__(self, primary: str, target: int, batch_users: int = 100, drain_seconds: float = 0.5,
+                 points: int = RING_POINTS):
+        if target < 1:
+            raise ValueError("A database needs at least one shard")
+        self.primary = primary
+        self.target = target
+        self.batch_users = max(1, batch_users)
+        self.drain_seconds = drain_seconds
+        self.ring = HashRing(target, points)
+        self.progress: Dict[str, Any] = {"state": "pending", "target": target, "users_to_move": 0,
+                                         "users_moved": 0, "rows_moved": 0, "batches": 0}
+
+    def _connect(self, shard: int) -> sqlite3.Connection:
+        return sqlite3.connect(shard_path(self.primary, shard), timeout=30, isolation_level=None)
+
+    def run(self) -> dict:
+        fd = os.open(self.primary + ".rebalance.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            try:
+                fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                raise RebalanceInProgress(f"A rebalance of {self.primary} is already running")
+            try:
+                return self._run()
+            except BaseException:
+                self.progress["state"] = "failed"
+                raise
+        finally:
+            os.close(fd)
+
+    def _run(self) -> dict:
+        started = time.perf_counter()
+        self.progress["state"] = "running"
+        catalog = self._connect(0)
+        try:
+            topology = read_topology(catalog)
+            self.progress["from"] = topology.shard_count
+            shards = sorted(set(topology.shards()) | set(range(self.target)))
+            for shard in shards:
+                migrate_shard(shard_path(self.primary, shard), shard)
+            self._finish_copied(catalog, shards)
+
+            # Pin everyone whose rows are not where the new ring puts them,
+            # then switch; routing is the same before and after
+            moves, pins = self._plan(shards)
+            self._write_catalog(catalog, pins, shard_count=self.target)
+            # Users first written between the scan and the switch went where the old ring put them
+            time.sleep(self.drain_seconds)
+            late_moves, late_pins = self._plan(shards)
+            moves.update(late_moves)
+            if late_pins:
+                self._write_catalog(catalog, {**pins, **late_pins})
+
+            self.progress["users_to_move"] = len({user for user, _ in moves})
+            groups: Dict[Tuple[int, int], List[str]] = {}
+            for user, source in sorted(moves):
+                groups.setdefault((source, self.ring.shard_for(user)), []).append(user)
+            for (source, target), users in sorted(groups.items()):
+                for start in range(0, len(users), self.batch_users):
+                    self._move(catalog, source, target, users[start:start + self.batch_users])
+        finally:
+            catalog.close()
+
+        self.progress.update(state="completed", seconds=round(time.perf_counter() - started, 3))
+        print(f"🔀 Rebalanced to {self.target} shards: {self.progress['users_moved']} users, "
+              f"{self.progress['rows_moved']} rows moved in {self.progress['seconds']}s")
+        return dict(self.progress)
+
+    def _plan(self, shards: Sequence[int]) -> Tuple[Set[Tuple[str, int]], Dict[str, int]]:
+        """
+        (user, shard) pairs whose rows must move to the user's ring shard, and
+        the pins keeping each user routed to their rows until then
+        """
+        locations: Dict[str, List[int]] = {}
+        for shard in shards:
+            conn = self._connect(shard)
+            try:
+                for user in user_ids(conn):
+                    locations.setdefault(user, []).append(shard)
+            finally:
+                conn.close()
+        moves, pins = set(), {}
+        for user, found in locations.items():
+            home = self.ring.shard_for(user)
+            moves.update((user, shard) for shard in found if shard != home)
+            if home not in found:
+                pins[user] = min(found)
+        return moves, pins
+
+    def _write_catalog(self, catalog: sqlite3.Connection, pins: Dict[str, int],
+                       shard_count: Optional[int] = None):
+        catalog.execute("BEGIN IMMEDIATE")
+        try:
+            catalog.execute("DELETE FROM shard_placements")
+            catalog.executemany("INSERT INTO shard_placements (user_id, shard, moving) VALUES (?, ?, 0)",
+                                pins.items())
+            catalog.execute("UPDATE shard_topology SET shard_count = COALESCE(?, shard_count), version = version + 1, "
+                            "updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') WHERE id = 1", (shard_count,))
+            catalog.execute("COMMIT")
+        except BaseException:
+            catalog.execute("ROLLBACK")
+            raise
+
+    def _update_pins(self, catalog: sqlite3.Connection, statement: str, params: List[tuple]):
+        catalog.execute("BEGIN IMMEDIATE")
+        try:
+            catalog.executemany(statement, params)
+            catalog.execute("UPDATE shard_topology SET version = version + 1, "
+                            "updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') WHERE id = 1")
+            catalog.execute("COMMIT")
+        except BaseException:
+            catalog.execute("ROLLBACK")
+            raise
+
+    def _move(self, catalog: sqlite3.Connection, source: int, target: int, users: List[str]):
+        # Users already routed to target (rows left on two shards) keep reading there
+        self._update_pins(catalog, "INSERT INTO shard_placements (user_id, shard, moving) VALUES (?, ?, 1) "
+                                   "ON CONFLICT (user_id) DO UPDATE SET moving = 1",
+                          [(user, target) for user in users])
+        time.sleep(self.drain_seconds)
+
+        source_conn, target_conn = self._connect(source), self._connect(target)
+        try:
+            # The source's write lock keeps the copy consistent with any write that got in before the drain
+            source_conn.execute("BEGIN IMMEDIATE")
+            target_conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = copy_users(source_conn, target_conn, users)
+                target_conn.executemany(
+                    "INSERT OR REPLACE INTO shard_arrivals (user_id, source_shard, copied_at) "
+                    "VALUES (?, ?, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))", [(user, source) for user in users])
+                target_conn.execute("COMMIT")
+            except BaseException:
+                target_conn.execute("ROLLBACK")
+                raise
+            finally:
+                source_conn.execute("ROLLBACK")
+
+            self._update_pins(catalog, "DELETE FROM shard_placements WHERE user_id = ?", [(user,) for user in users])
+            time.sleep(self.drain_seconds)
+            self._purge(source_conn, target_conn, users)
+        finally:
+            source_conn.close()
+            target_conn.close()
+
+        self.progress["users_moved"] += len(users)
+        self.progress["rows_moved"] += rows
+        self.progress["batches"] += 1
+
+    def _purge(self, source_conn: sqlite3.Connection, target_conn: sqlite3.Connection, users: Sequence[str]):
+        source_conn.execute("BEGIN IMMEDIATE")
+        try:
+            purge_users(source_conn, users)
+            source_conn.execute("COMMIT")
+        except BaseException:
+            source_conn.execute("ROLLBACK")
+            raise
+        marks = ",".join("?" * len(users))
+        target_conn.execute(f"DELETE FROM shard_arrivals WHERE user_id IN ({marks})", users)
+
+    def _finish_copied(self, catalog: sqlite3.Connection, shards: Sequence[int]):
+        """Complete moves an earlier run copied but did not finish: unpin, then delete the old rows"""
+        for target in shards:
+            target_conn = self._connect(target)
+            try:
+                arrivals: Dict[int, List[str]] = {}
+                for user, source in target_conn.execute("SELECT user_id, source_shard FROM shard_arrivals"):
+                    arrivals.setdefault(source, []).append(user)
+                for source, users in arrivals.items():
+                    self._update_pins(catalog, "DELETE FROM shard_placements WHERE user_id = ?",
+                                      [(user,) for user in users])
+                    source_conn = self._connect(source)
+                    try:
+                        self._purge(source_conn, target_conn, users)
+                    finally:
+                        source_conn.close()
+                    print(f"🔀 Finished {len(users)} interrupted moves from shard {source} to {target}")
+            finally:
+                target_conn.close()
+
+
+def shard_stats(shard: int, path: str) -> dict:
+    """Row counts and totals for one shard (admin aggregates scatter this across shards)"""
+    conn = sqlite3.connect(path)
+    try:
+        users, accounts, balance = conn.execute(
+            "SELECT COUNT(DISTINCT user_id), COUNT(*), COALESCE(SUM(balance), 0.0) FROM user_accounts").fetchone()
+        transactions = conn.execute("SELECT COUNT(*) FROM user_transactions").fetchone()[0]
+    finally:
+        conn.close()
+    return {
+        "shard": shard,
+        "path": path,
+        "bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+        "users_with_accounts": users,
+        "accounts": accounts,
+        "total_balance": round(balance, 2),
+        "transactions": transactions,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from config import settings
+    from db import DB_PATH
+
+    parser = argparse.ArgumentParser(description="Inspect or rebalance FinTrust database shards")
+    parser.add_argument("command", choices=["status", "rebalance"])
+    parser.add_argument("--db", default=DB_PATH, help="Primary database (shard 0)")
+    parser.add_argument("--shards", type=int, default=settings.shard_count, help="Target shard count")
+    parser.add_argument("--batch-users", type=int, default=settings.shard_rebalance_batch_users)
+    parser.add_argument("--drain-seconds", type=float, default=settings.shard_rebalance_drain_seconds)
+    args = parser.parse_args()
+
+    migrate_all(args.db)
+    if args.command == "rebalance":
+        rebalancer = Rebalancer(args.db, args.shards, args.batch_users, args.drain_seconds)
+        try:
+            print(json.dumps(rebalancer.run(), indent=2))
+        except RebalanceInProgress as e:
+            raise SystemExit(f"❌ {e}")
+    else:
+        connection = sqlite3.connect(args.db)
+        try:
+            topology = read_topology(connection)
+        finally:
+            connection.close()
+        print(json.dumps({
+            "shard_count": topology.shard_count,
+            "catalog_version": topology.version,
+            "pinned_users": len(topology.placements),
+            "shards": [shard_stats(shard, shard_path(args.db, shard)) for shard in topology.shards()],
+        }, indent=2))
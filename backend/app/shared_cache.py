@@ -0,0 +1,288 @@
+"""
+Shared-memory cache for FinTrust Gateway
+A fixed-size hash table in a memory-mapped file that every worker process on
+the host opens, with the same get/set/delete/clear interface as
+result_cache.TTLCache, so a value cached by one uvicorn worker is a hit in all
+of them.
+
+Layout: a 64-byte header (magic, geometry, generation) followed by sets of
+WAYS fixed-size slots. A key's 16-byte BLAKE2b digest picks its set; within
+the set the slot holding that digest wins, otherwise set() reuses an empty,
+stale or expired slot, otherwise it evicts the entry closest to expiry.
+
+Reads take no lock. Each slot starts with a sequence number that writers make
+odd while they change the slot and even again afterwards (a seqlock), and a
+CRC over the rest of the slot; a reader that sees an odd or changed sequence
+number, or a bad CRC, treats the lookup as a miss. Writers lock the set they
+change, with a threading lock per stripe of sets inside the process and an
+fcntl range lock on the set's bytes across processes.
+
+clear() bumps the generation in the header, which invalidates every entry in
+every process at once. Expiry uses time.monotonic(), CLOCK_MONOTONIC on
+Linux, which is the same clock for all processes on a host.
+"""
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+MAGIC = b"FTSHMC01"
+HEADER = struct.Struct("<8sIII4xQ")  # magic, sets, ways, slot_size, generation
+HEADER_SIZE = 64
+GENERATION_OFFSET = 24
+# seq, crc, generation, expires_at (monotonic), key digest, value length
+SLOT = struct.Struct("<IIQd16sI")
+DIGEST_OFFSET = 24
+DIGEST_SIZE = 16
+EMPTY_DIGEST = bytes(DIGEST_SIZE)
+WAYS = 8
+LOCK_STRIPES = 64
+
+
+if orjson is not None:
+    _encode_json, _decode_json = orjson.dumps, orjson.loads
+else:
+    def _encode_json(value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+    _decode_json = json.loads
+
+
+def default_directory() -> str:
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+class SharedMemoryCache:
+    """TTLCache-compatible cache shared by all processes that open the same name"""
+
+    def __init__(self, name: str, max_entries: int = 4096, ttl_seconds: float = 60.0, slot_size: int = 512,
+                 directory: Optional[str] = None, encode: Callable[[Any], bytes] = _encode_json,
+                 decode: Callable[[bytes], Any] = _decode_json):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.slot_size = slot_size
+        self.sets = max(1, -(-max_entries // WAYS))
+        self.max_entries = self.sets * WAYS
+        self.max_value_bytes = slot_size - SLOT.size
+        self.encode = encode
+        self.decode = decode
+        self._set_bytes = WAYS * slot_size
+        self._stripes = [threading.Lock() for _ in range(min(LOCK_STRIPES, self.sets))]
+        self._header_lock = threading.Lock()
+        # Geometry is part of the file name, so processes never disagree on the layout
+        self.path = os.path.join(directory or default_directory(),
+                                 f"fintrust-{name}-{self.sets}x{WAYS}x{slot_size}.cache")
+        self._fd, self._mm = self._open()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _open(self):
+        size = HEADER_SIZE + self.sets * self._set_bytes
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            st = os.fstat(fd)
+            # Anyone who can write the file can plant entries, so refuse files we do not own exclusively
+            if st.st_uid != os.getuid() or st.st_mode & 0o077:
+                raise PermissionError(f"{self.path} must be owned by uid {os.getuid()} with mode 0600")
+            fcntl.lockf(fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+            try:
+                # Re-checked under the lock: another worker may have just initialized it
+                if os.fstat(fd).st_size != size or os.pread(fd, len(MAGIC), 0) != MAGIC:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, HEADER.pack(MAGIC, self.sets, WAYS, self.slot_size, 1), 0)
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+            return fd, mmap.mmap(fd, size)
+        except BaseException:
+            os.close(fd)
+            raise
+
+    def _digest(self, key: str) -> bytes:
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=DIGEST_SIZE).digest()
+
+    def _set_offset(self, digest: bytes) -> int:
+        return HEADER_SIZE + (int.from_bytes(digest[:8], "little") % self.sets) * self._set_bytes
+
+    @property
+    def generation(self) -> int:
+        return struct.unpack_from("<Q", self._mm, GENERATION_OFFSET)[0]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        digest = self._digest(key)
+        base = self._set_offset(digest)
+        block = self._mm[base:base + self._set_bytes]
+        position = block.find(digest)
+        while position != -1 and (position - DIGEST_OFFSET) % self.slot_size:
+            position = block.find(digest, position + 1)
+        if position == -1:
+            self.misses += 1
+            return default
+
+        start = position - DIGEST_OFFSET
+        seq, crc, generation, expires_at, _, length = SLOT.unpack_from(block, start)
+        data = block[start + SLOT.size:start + SLOT.size + min(length, self.max_value_bytes)]
+        # The copy is only good if no writer was in the slot before or during it
+        consistent = (not seq & 1 and struct.unpack_from("<I", self._mm, base + start)[0] == seq
+                      and zlib.crc32(data, zlib.crc32(block[start + 8:start + SLOT.size])) == crc)
+        if not consistent or generation != self.generation:
+            self.misses += 1
+            return default
+        if expires_at < time.monotonic():
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self.hits += 1
+        return self.decode(data)
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None):
+        data = self.encode(value)
+        if len(data) > self.max_value_bytes:
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        digest = self._digest(key)
+        base = self._set_offset(digest)
+        with self._lock_set(base):
+            generation = self.generation
+            now = time.monotonic()
+            chosen, chosen_rank = None, None
+            for way in range(WAYS):
+                offset = base + way * self.slot_size
+                _, _, slot_generation, expires_at, slot_digest, _ = SLOT.unpack_from(self._mm, offset)
+                if slot_digest == digest:
+                    chosen, chosen_rank = offset, (0, 0)
+                    break
+                # Free slots first, then the live entry that expires soonest
+                free = slot_digest == EMPTY_DIGEST or slot_generation != generation or expires_at < now
+                rank = (1, 0) if free else (2, expires_at)
+                if chosen_rank is None or rank < chosen_rank:
+                    chosen, chosen_rank = offset, rank
+            if chosen_rank[0] == 2:
+                self.evictions += 1
+            self._write_slot(chosen, generation, now + ttl, digest, data)
+
+    def delete(self, key: str):
+        digest = self._digest(key)
+        base = self._set_offset(digest)
+        with self._lock_set(base):
+            for way in range(WAYS):
+                offset = base + way * self.slot_size
+                if self._mm[offset + DIGEST_OFFSET:offset + DIGEST_OFFSET + DIGEST_SIZE] == digest:
+                    self._write_slot(offset, 0, 0.0, EMPTY_DIGEST, b"")
+
+    def clear(self):
+        """Invalidate every entry, in every process sharing the cache"""
+        with self._header_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+            try:
+                struct.pack_into("<Q", self._mm, GENERATION_OFFSET, self.generation + 1)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+
+    def _write_slot(self, offset: int, generation: int, expires_at: float, digest: bytes, data: bytes):
+        # Odd while writing; a slot left odd by a crashed writer stays unreadable until rewritten
+        writing = struct.unpack_from("<I", self._mm, offset)[0] | 1
+        head = SLOT.pack(0, 0, generation, expires_at, digest, len(data))[8:]
+        crc = zlib.crc32(data, zlib.crc32(head))
+        struct.pack_into("<I", self._mm, offset, writing)
+        self._mm[offset + 4:offset + SLOT.size + len(data)] = struct.pack("<I", crc) + head + data
+        struct.pack_into("<I", self._mm, offset, (writing + 1) & 0xFFFFFFFF)
+
+    def _lock_set(self, base: int):
+        return _SetLock(self, base)
+
+    def __len__(self) -> int:
+        generation, now, count = self.generation, time.monotonic(), 0
+        for offset in range(HEADER_SIZE, len(self._mm), self.slot_size):
+            _, _, slot_generation, expires_at, digest, _ = SLOT.unpack_from(self._mm, offset)
+            if digest != EMPTY_DIGEST and slot_generation == generation and expires_at >= now:
+                count += 1
+        return count
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "shared",
+            "path": self.path,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class _SetLock:
+    """Thread lock for the set's stripe plus an fcntl lock on the set's bytes"""
+
+    __slots__ = ("cache", "base", "lock")
+
+    def __init__(self, cache: SharedMemoryCache, base: int):
+        self.cache = cache
+        self.base = base
+        self.lock = cache._stripes[(base - HEADER_SIZE) // cache._set_bytes % len(cache._stripes)]
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            fcntl.lockf(self.cache._fd, fcntl.LOCK_EX, self.cache._set_bytes, self.base)
+        except BaseException:
+            self.lock.release()
+            raise
+
+    def __exit__(self, *exc):
+        try:
+            fcntl.lockf(self.cache._fd, fcntl.LOCK_UN, self.cache._set_bytes, self.base)
+        finally:
+            self.lock.release()
+
+
+def build_cache(name: str, max_entries: int, ttl_seconds: float, backend: str = "memory",
+                directory: Optional[str] = None):
+    """
+    The cache for one use (tokens, policy decisions): "shared" for a
+    SharedMemoryCache, "memory" for a per-process TTLCache, "off" for one that
+    keeps nothing. Falls back to memory if the shared file cannot be used.
+    """
+    from result_cache import TTLCache
+
+    if backend == "off":
+        return TTLCache(0, ttl_seconds)
+    if backend == "shared":
+        try:
+            return SharedMemoryCache(name, max_entries, ttl_seconds, directory=directory)
+        except OSError as e:
+            print(f"⚠️ Shared cache '{name}' unavailable ({e}), using a per-process cache")
+    return TTLCache(max_entries, ttl_seconds)
+
+
+def cache_metrics(name: str, cache):
+    """Metrics collector for a cache made by build_cache"""
+    def collect():
+        stats = cache.stats()
+        labels = {"cache": name, "backend": stats["backend"]}
+        yield ("fintrust_auth_cache_hits_total", "counter", "Token and policy cache hits in this process", labels, stats["hits"])
+        yield ("fintrust_auth_cache_misses_total", "counter", "Token and policy cache misses in this process", labels, stats["misses"])
+        yield ("fintrust_auth_cache_evictions_total", "counter", "Live entries evicted to make room", labels, stats["evictions"])
+        yield ("fintrust_auth_cache_entries", "gauge", "Live entries in the cache", labels, stats["entries"])
+    return collect
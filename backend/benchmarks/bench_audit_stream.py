@@ -0,0 +1,145 @@
+"""
+Benchmark for the live audit stream
+
+Runs audit_stream.AuditHub against a scratch database with --subscribers
+concurrent streams (default 1000) consuming AuditHub.stream() in-process,
+while a writer thread calls db.log_audit_event at --rate events/s for
+--seconds. A --slow-share of the subscribers sleep --slow-ms per event and
+should be disconnected on overflow without delaying anyone else.
+
+Reports, for the fast subscribers, delivery latency from the audit write to
+the subscriber's read (p50/p99/max) and events received, plus slow-subscriber
+disconnects and the largest per-subscriber buffer seen.
+
+Usage (from backend/):
+    python benchmarks/bench_audit_stream.py --subscribers 1000 --rate 50 --output audit_stream.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import harness  # noqa: F401  (puts backend/app on sys.path)
+
+import db
+from audit_log import logger as audit_logger
+
+
+async def consume(hub, subscriber, base: int, written: list, latencies, received, slow_ms: float,
+                  stop: asyncio.Event):
+    # Kept cheap, like a real stream that only copies bytes to its socket:
+    # the event id ("g<row id>") indexes the writer's commit times
+    async for frame in hub.stream(subscriber):
+        if frame.startswith(b"event: overflow"):
+            return
+        if not frame.startswith(b"id: g"):
+            continue
+        row_id = int(frame[5:frame.index(b"\n")])
+        latencies.append((time.perf_counter() - written[row_id - base - 1]) * 1000)
+        received[0] += 1
+        if slow_ms:
+            await asyncio.sleep(slow_ms / 1000)
+        if stop.is_set():
+            return
+
+
+def write_events(rate: float, seconds: float, written: list):
+    interval = 1 / rate
+    deadline = time.perf_counter() + seconds
+    next_at = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        while time.perf_counter() < deadline:
+            # Stamped before the write, so a subscriber never sees a row without its time
+            written.append(time.perf_counter())
+            db.log_audit_event(f"user-{len(written) % 50:03d}", "read_accounts", "accounts", "benchmark")
+            next_at += interval
+            time.sleep(max(0.0, next_at - time.perf_counter()))
+
+
+async def run(args) -> dict:
+    from audit_stream import AuditHub
+
+    hub = AuditHub(buffer_events=args.buffer, max_subscribers=args.subscribers + 1, poll_seconds=1.0)
+    await hub.start()
+    # One source: the audit-log package writes to the same scratch database
+    base = hub.positions["g"]
+    stop = asyncio.Event()
+    slow_count = int(args.subscribers * args.slow_share)
+    fast_latencies, fast_received, slow_received, tasks = [], [], [], []
+    peak_buffer = 0
+    written = []
+    for n in range(args.subscribers):
+        slow = n < slow_count
+        received = [0]
+        (slow_received if slow else fast_received).append(received)
+        subscriber = hub.subscribe(overflow="disconnect")
+        latencies = [] if slow else fast_latencies
+        tasks.append(asyncio.create_task(consume(hub, subscriber, base, written, latencies, received,
+                                                 args.slow_ms if slow else 0.0, stop)))
+
+    writer = threading.Thread(target=write_events, args=(args.rate, args.seconds, written))
+    started = time.perf_counter()
+    writer.start()
+    while writer.is_alive():
+        peak_buffer = max([peak_buffer] + [s.queue.qsize() for s in hub.subscribers])
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.5)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    stats = hub.stats()
+    await hub.stop()
+
+    fast_latencies.sort()
+    return {
+        "subscribers": args.subscribers,
+        "slow_subscribers": slow_count,
+        "events_written": len(written),
+        "write_rate": round(len(written) / args.seconds, 1),
+        "deliveries_per_sec": round(sum(r[0] for r in fast_received + slow_received) / elapsed),
+        "fast_min_received": min((r[0] for r in fast_received), default=0),
+        "latency_p50_ms": round(statistics.median(fast_latencies), 2) if fast_latencies else None,
+        "latency_p99_ms": round(fast_latencies[int(len(fast_latencies) * 0.99)], 2) if fast_latencies else None,
+        "latency_max_ms": round(fast_latencies[-1], 2) if fast_latencies else None,
+        "slow_disconnected": stats["disconnected"],
+        "buffer_events": args.buffer,
+        "peak_buffer_events": peak_buffer,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit SSE hub fan-out benchmark")
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=50.0, help="Audit writes per second")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--buffer", type=int, default=256, help="Per-subscriber buffer (events)")
+    parser.add_argument("--slow-share", type=float, default=0.05)
+    parser.add_argument("--slow-ms", type=float, default=100.0)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db.DB_PATH = audit_logger.DB_PATH = os.path.join(directory, "audit_stream.db")
+        with contextlib.redirect_stdout(io.StringIO()):
+            db.init_database()
+        result = asyncio.run(run(args))
+
+    for key, value in result.items():
+        print(f"{key:<22} {value}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "audit_stream", **result}, f, indent=2)
+        print(f"📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark for the dashboard composite endpoint
+
+Loads a dashboard the way the frontend used to, with three sequential requests
+(/accounts, /accounts/summary, /transactions), and with one
+GET /dashboard. Both run in-process against an OPA stub with --opa-latency-ms
+of injected latency. The read cache is off, so every request does its full
+work. Reports p50/p95 page-load time and requests per page load.
+
+Usage (from backend/):
+    python benchmarks/bench_dashboard.py --rows 1000 --opa-latency-ms 5 --output dashboard.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import harness  # noqa: F401  (puts backend/app on sys.path)
+from bench_read_cache import USER, load_transactions
+from loadtest import load_app
+from stubs import start_opa_stub
+
+SEPARATE = ("/api/v1/accounts", "/api/v1/accounts/summary", "/api/v1/transactions")
+COMPOSITE = ("/api/v1/dashboard",)
+
+
+def time_page(client, headers, paths, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            response = client.get(path, headers=headers)
+            assert response.status_code == 200, (path, response.status_code)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "requests_per_page": len(paths),
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard composite endpoint benchmark")
+    parser.add_argument("--rows", type=int, default=1000, help="Transactions for the benchmark user")
+    parser.add_argument("--opa-latency-ms", type=float, default=5.0)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    opa = start_opa_stub(latency_ms=args.opa_latency_ms)
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "dashboard.db")
+        app = load_app(opa.url, "http://127.0.0.1:9", db_path, admission=False)
+        load_transactions(db_path, args.rows)
+
+        from fastapi.testclient import TestClient
+
+        from auth import create_access_token
+        from response_cache import AuditBatcher, read_cache
+
+        read_cache.enabled = False
+        headers = {"Authorization": "Bearer " + create_access_token(USER)}
+        results = []
+        # The routes print an audit line per request; keep them out of the output
+        with TestClient(app) as client, contextlib.redirect_stdout(io.StringIO()):
+            for label, paths in (("separate", SEPARATE), ("dashboard", COMPOSITE)):
+                results.append({"path": label, **time_page(client, headers, paths, args.repeat)})
+            AuditBatcher.flush_all()
+    opa.stop()
+
+    print(f"{'page load':<10} {'requests':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    for row in results:
+        print(f"{row['path']:<10} {row['requests_per_page']:>8} {row['p50_ms']:>9} {row['p95_ms']:>9}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "dashboard", "rows": args.rows, "opa_latency_ms": args.opa_latency_ms,
+                       "results": results}, f, indent=2)
+        print(f"📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
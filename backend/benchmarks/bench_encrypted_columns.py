@@ -0,0 +1,187 @@
+"""
+Benchmark for encrypted columns
+
+Compares account-number storage as plaintext with db.ColumnCipher storage
+(AES-GCM ciphertext + HMAC blind index), at --rows accounts and as many
+transfers that reference a counterparty account number:
+  insert       - rows/s into each schema, encryption and HMAC included
+  lookup       - equality filter on one account number, returned rows decrypted
+  join         - transfers joined to one user's accounts on the account number
+  decrypt-all  - the alternative without a blind index: decrypt every row and filter
+
+Usage (from backend/):
+    python benchmarks/bench_encrypted_columns.py --rows 100000 --output encrypted_columns.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import harness  # noqa: F401  (puts backend/app on sys.path)
+
+from db import ColumnCipher, EncryptedColumn, normalize_identifier
+
+ACCOUNT_NUMBER = EncryptedColumn("accounts", "account_number", "account_number", normalize_identifier)
+COUNTERPARTY = EncryptedColumn("transfers", "counterparty", "account_number", normalize_identifier)
+
+PLAIN_SCHEMA = """
+    CREATE TABLE accounts (id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, account_number TEXT);
+    CREATE INDEX idx_accounts_number ON accounts (account_number);
+    CREATE INDEX idx_accounts_user ON accounts (user_id);
+    CREATE TABLE transfers (id INTEGER PRIMARY KEY, amount REAL NOT NULL, counterparty TEXT);
+    CREATE INDEX idx_transfers_counterparty ON transfers (counterparty);
+"""
+
+ENCRYPTED_SCHEMA = """
+    CREATE TABLE accounts (id INTEGER PRIMARY KEY, user_id TEXT NOT NULL,
+                           account_number_enc BLOB, account_number_bidx BLOB);
+    CREATE INDEX idx_accounts_number ON accounts (account_number_bidx);
+    CREATE INDEX idx_accounts_user ON accounts (user_id);
+    CREATE TABLE transfers (id INTEGER PRIMARY KEY, amount REAL NOT NULL, counterparty_enc BLOB, counterparty_bidx BLOB);
+    CREATE INDEX idx_transfers_counterparty ON transfers (counterparty_bidx);
+"""
+
+
+def account_number(i: int) -> str:
+    return f"DE{(i * 7919) % 97:02d} 3704 {i:012d}"
+
+
+def user_of(i: int) -> str:
+    return f"user-{i // 5:06d}"
+
+
+def open_database(directory: str, name: str, schema: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(os.path.join(directory, f"{name}.db"), isolation_level=None)
+    conn.executescript(schema)
+    return conn
+
+
+def insert_plain(conn, rows: int, chunk_rows: int) -> float:
+    start = time.perf_counter()
+    for offset in range(0, rows, chunk_rows):
+        ids = range(offset, min(rows, offset + chunk_rows))
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO accounts (id, user_id, account_number) VALUES (?, ?, ?)",
+                         [(i, user_of(i), account_number(i)) for i in ids])
+        conn.executemany("INSERT INTO transfers (id, amount, counterparty) VALUES (?, ?, ?)",
+                         [(i, 10.0, account_number((i * 31) % rows)) for i in ids])
+        conn.execute("COMMIT")
+    return time.perf_counter() - start
+
+
+def insert_encrypted(conn, cipher: ColumnCipher, rows: int, chunk_rows: int) -> float:
+    start = time.perf_counter()
+    for offset in range(0, rows, chunk_rows):
+        ids = range(offset, min(rows, offset + chunk_rows))
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO accounts (id, user_id, account_number_enc, account_number_bidx) VALUES (?, ?, ?, ?)",
+                         [(i, user_of(i)) + cipher.seal(ACCOUNT_NUMBER, account_number(i)) for i in ids])
+        conn.executemany("INSERT INTO transfers (id, amount, counterparty_enc, counterparty_bidx) VALUES (?, ?, ?, ?)",
+                         [(i, 10.0) + cipher.seal(COUNTERPARTY, account_number((i * 31) % rows)) for i in ids])
+        conn.execute("COMMIT")
+    return time.perf_counter() - start
+
+
+def time_case(fn, repeat: int) -> dict:
+    result = fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "results": len(result),
+        "p50_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encrypted column (AES-GCM + blind index) benchmark")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--chunk-rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--scan-repeat", type=int, default=3, help="Iterations of the decrypt-all case")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    cipher = ColumnCipher("benchmark-secret")
+    target = args.rows // 2
+    number, user_id = account_number(target), user_of(target)
+    # Same number as a user would type it, so normalization is part of the lookup
+    typed_number = number.replace(" ", "").lower()
+
+    with tempfile.TemporaryDirectory() as directory:
+        plain = open_database(directory, "plain", PLAIN_SCHEMA)
+        encrypted = open_database(directory, "encrypted", ENCRYPTED_SCHEMA)
+        inserts = {
+            "plaintext": insert_plain(plain, args.rows, args.chunk_rows),
+            "encrypted": insert_encrypted(encrypted, cipher, args.rows, args.chunk_rows),
+        }
+
+        def plain_lookup():
+            return plain.execute("SELECT id, user_id, account_number FROM accounts WHERE account_number = ?",
+                                 (number,)).fetchall()
+
+        def encrypted_lookup():
+            rows = encrypted.execute(
+                "SELECT id, user_id, account_number_enc FROM accounts WHERE account_number_bidx = ?",
+                (cipher.blind_index(ACCOUNT_NUMBER, typed_number),)).fetchall()
+            return cipher.decrypt_rows(rows, {2: ACCOUNT_NUMBER})
+
+        def plain_join():
+            return plain.execute("""
+                SELECT t.id, t.amount, a.account_number FROM accounts a
+                JOIN transfers t ON t.counterparty = a.account_number
+                WHERE a.user_id = ?
+            """, (user_id,)).fetchall()
+
+        def encrypted_join():
+            rows = encrypted.execute("""
+                SELECT t.id, t.amount, a.account_number_enc FROM accounts a
+                JOIN transfers t ON t.counterparty_bidx = a.account_number_bidx
+                WHERE a.user_id = ?
+            """, (user_id,)).fetchall()
+            return cipher.decrypt_rows(rows, {2: ACCOUNT_NUMBER})
+
+        def decrypt_all():
+            wanted = normalize_identifier(typed_number)
+            return [row for row in cipher.decrypt_rows(
+                encrypted.execute("SELECT id, user_id, account_number_enc FROM accounts").fetchall(), {2: ACCOUNT_NUMBER})
+                if normalize_identifier(row[2]) == wanted]
+
+        cases = [
+            ("lookup", "plaintext", plain_lookup, args.repeat),
+            ("lookup", "blind index", encrypted_lookup, args.repeat),
+            ("lookup", "decrypt-all", decrypt_all, args.scan_repeat),
+            ("join", "plaintext", plain_join, args.repeat),
+            ("join", "blind index", encrypted_join, args.repeat),
+        ]
+        results = []
+        for operation, path, fn, repeat in cases:
+            results.append({"operation": operation, "path": path, "rows": args.rows, **time_case(fn, repeat)})
+        plain.close()
+        encrypted.close()
+
+    insert_results = [{"schema": schema, "rows": args.rows * 2, "seconds": round(seconds, 3),
+                       "rows_per_sec": round(args.rows * 2 / seconds)} for schema, seconds in inserts.items()]
+
+    print(f"{'insert':<10} {'rows':>9} {'seconds':>9} {'rows/s':>10}")
+    for row in insert_results:
+        print(f"{row['schema']:<10} {row['rows']:>9} {row['seconds']:>9} {row['rows_per_sec']:>10}")
+    print(f"\n{'operation':<10} {'path':<12} {'results':>8} {'p50 ms':>10} {'p95 ms':>10}")
+    for row in results:
+        print(f"{row['operation']:<10} {row['path']:<12} {row['results']:>8} {row['p50_ms']:>10} {row['p95_ms']:>10}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "encrypted_columns", "inserts": insert_results, "queries": results}, f, indent=2)
+        print(f"📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
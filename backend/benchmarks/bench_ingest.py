@@ -0,0 +1,140 @@
+"""
+Benchmark for bulk transaction ingestion
+
+Generates NDJSON and CSV feeds and loads them into a freshly migrated database
+with ingest.ingest_stream, reporting rows/s per format and chunk size:
+  naive  - one INSERT + COMMIT per row, rollup maintained by the insert trigger
+  bulk   - ingest_stream (chunk validation, executemany, grouped rollup deltas)
+
+Every run ends with a rollup consistency check, so a faster path that leaves
+monthly_merchant_spend wrong shows up as a failure rather than a speedup.
+
+Usage (from backend/):
+    python benchmarks/bench_ingest.py --rows 100000 --chunk-rows 1000,5000,10000 --output ingest.json
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+import harness  # noqa: F401  (puts backend/app on sys.path)
+
+import rollups
+from ingest import ingest_stream
+from migrate import migrate
+
+USERS = (("user-001", (1, 2)), ("user-002", (3, 4)), ("user-003", (5,)))
+FIELDS = ("user_id", "account_id", "amount", "transaction_type", "merchant", "description", "timestamp")
+
+
+def generate_records(rows: int):
+    for i in range(rows):
+        user_id, accounts = USERS[i % len(USERS)]
+        amount = round((i % 400) - 250.5, 2)
+        yield {
+            "user_id": user_id,
+            "account_id": accounts[i % len(accounts)],
+            "amount": amount,
+            "transaction_type": "debit" if amount < 0 else "credit",
+            "merchant": f"Merchant {i % 97}",
+            "description": f"Card feed row {i}",
+            "timestamp": f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00Z",
+        }
+
+
+def build_feed(rows: int, fmt: str) -> str:
+    if fmt == "ndjson":
+        return "".join(json.dumps(record) + "\n" for record in generate_records(rows))
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+    writer.writeheader()
+    writer.writerows(generate_records(rows))
+    return buffer.getvalue()
+
+
+def fresh_database(directory: str, name: str) -> str:
+    path = os.path.join(directory, f"{name}.db")
+    if os.path.exists(path):
+        os.remove(path)
+    migrate(path)
+    return path
+
+
+def run_naive(db_path: str, rows: int) -> float:
+    conn = sqlite3.connect(db_path)
+    start = time.perf_counter()
+    for record in generate_records(rows):
+        conn.execute(
+            "INSERT INTO user_transactions (user_id, account_id, amount, transaction_type, merchant, description, timestamp) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            tuple(record[field] for field in FIELDS),
+        )
+        conn.commit()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed
+
+
+def run_bulk(db_path: str, feed: str, fmt: str, chunk_rows: int) -> tuple:
+    start = time.perf_counter()
+    summary = ingest_stream(db_path, io.StringIO(feed, newline=""), fmt, f"bench-{fmt}-{chunk_rows}",
+                            "benchmark", chunk_rows=chunk_rows)
+    return time.perf_counter() - start, summary
+
+
+def rollups_consistent(db_path: str) -> bool:
+    conn = sqlite3.connect(db_path)
+    try:
+        return all(report["consistent"] for report in rollups.check_all(conn))
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk transaction ingestion throughput benchmark")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--formats", default="ndjson,csv")
+    parser.add_argument("--chunk-rows", default="500,5000,10000")
+    parser.add_argument("--naive-rows", type=int, default=5000,
+                        help="Rows for the row-at-a-time baseline (0 to skip; it is slow)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'path':<6} {'format':<7} {'chunk':>6} {'rows':>9} {'seconds':>9} {'rows/s':>10} {'rollups':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        if args.naive_rows:
+            db_path = fresh_database(directory, "naive")
+            elapsed = run_naive(db_path, args.naive_rows)
+            results.append({"path": "naive", "format": None, "chunk_rows": 1, "rows": args.naive_rows,
+                            "seconds": round(elapsed, 3), "rows_per_sec": round(args.naive_rows / elapsed),
+                            "rollups_consistent": rollups_consistent(db_path)})
+
+        for fmt in [f for f in args.formats.split(",") if f]:
+            feed = build_feed(args.rows, fmt)
+            for chunk_rows in [int(c) for c in args.chunk_rows.split(",") if c]:
+                db_path = fresh_database(directory, f"{fmt}-{chunk_rows}")
+                elapsed, summary = run_bulk(db_path, feed, fmt, chunk_rows)
+                results.append({"path": "bulk", "format": fmt, "chunk_rows": chunk_rows, "rows": args.rows,
+                                "feed_bytes": len(feed), "seconds": round(elapsed, 3),
+                                "rows_per_sec": round(summary["rows_inserted"] / elapsed),
+                                "rows_inserted": summary["rows_inserted"],
+                                "rows_rejected": summary["rows_rejected"],
+                                "rollups_consistent": rollups_consistent(db_path)})
+
+    for row in results:
+        print(f"{row['path']:<6} {row['format'] or '-':<7} {row['chunk_rows']:>6} {row['rows']:>9} "
+              f"{row['seconds']:>9} {row['rows_per_sec']:>10} {str(row['rollups_consistent']):>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "ingest", "results": results}, f, indent=2)
+        print(f"📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
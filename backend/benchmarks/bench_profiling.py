@@ -0,0 +1,108 @@
+"""
+Benchmark for the on-demand profilers
+
+Runs a fixed request-like workload (JSON decode, a SQLite query, pydantic
+validation, JSON encode) on the main thread for --seconds at a time, with no
+profiling, under a CPU session in each sampling mode, and under memory
+sessions at each --frames value. Reports the workload's ops/s and its
+slowdown against no profiling, plus what each session collected.
+
+Usage (from backend/):
+    python benchmarks/bench_profiling.py --seconds 5 --frames 1 16 --output profiling.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import harness  # noqa: F401  (puts backend/app on sys.path)
+
+from pydantic import BaseModel
+
+from profiling import Profiler, ProfileStore
+
+
+class Row(BaseModel):
+    id: int
+    user_id: str
+    amount: float
+    merchant: str
+
+
+def workload(seconds: float) -> float:
+    """ops/s of a small decode-query-validate-encode loop"""
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, user_id TEXT, amount REAL, merchant TEXT)")
+    conn.executemany("INSERT INTO t (user_id, amount, merchant) VALUES (?, ?, ?)",
+                     [(f"user-{i % 50}", i / 10, f"Merchant {i % 7}") for i in range(2000)])
+    body = json.dumps({"user_id": "user-7", "limit": 20})
+    ops = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        query = json.loads(body)
+        rows = conn.execute("SELECT id, user_id, amount, merchant FROM t WHERE user_id = ? LIMIT ?",
+                            (query["user_id"], query["limit"])).fetchall()
+        models = [Row(id=r[0], user_id=r[1], amount=r[2], merchant=r[3]) for r in rows]
+        json.dumps([model.model_dump() for model in models])
+        ops += 1
+    conn.close()
+    return ops / seconds
+
+
+def wait_result(profiler: Profiler, session: dict) -> dict:
+    while True:
+        result = profiler.result(session["id"])
+        if result["status"] != "running":
+            return result
+        time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Workload slowdown under CPU and memory profiling sessions")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--interval-ms", type=float, default=10.0)
+    parser.add_argument("--frames", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="fintrust-profiles-") as directory:
+        profiler = Profiler(ProfileStore(lambda: directory, 50), 600)
+        # The route map would come from the app; the workload function stands in for a handler
+        routes = [("GET /workload", workload)]
+        baseline = workload(args.seconds)
+        rows = [{"session": "none", "ops_per_sec": round(baseline)}]
+
+        for mode in ("signal", "thread"):
+            session = profiler.start_cpu(routes, args.seconds, args.interval_ms, mode=mode)
+            ops = workload(args.seconds)
+            result = wait_result(profiler, session)
+            on_workload = next((route["percent"] for route in result["routes"] if route["route"] == "GET /workload"), 0)
+            rows.append({"session": f"cpu/{mode}", "ops_per_sec": round(ops), "samples": result["samples"],
+                         "workload_sample_percent": on_workload,
+                         "sampler_cpu_percent": result["sampler_cpu_percent"]})
+
+        for frames in args.frames:
+            session = profiler.start_memory(routes, args.seconds, frames)
+            ops = workload(args.seconds)
+            result = wait_result(profiler, session)
+            rows.append({"session": f"memory/frames={frames}", "ops_per_sec": round(ops),
+                         "tracemalloc_overhead_bytes": result["tracemalloc_overhead_bytes"],
+                         "top_route": result["routes"][0]["route"] if result["routes"] else None})
+
+    for row in rows:
+        row["slowdown"] = round(baseline / row["ops_per_sec"], 2) if row["ops_per_sec"] else None
+        extra = {key: value for key, value in row.items() if key not in ("session", "ops_per_sec", "slowdown")}
+        print(f"{row['session']:<18} {row['ops_per_sec']:>8} ops/s  x{row['slowdown']:<5} {extra}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "profiling", "cpu_count": os.cpu_count(), "threads": threading.active_count(),
+                       "results": rows}, f, indent=2)
+        print(f"📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark for the conditional GET read cache
+
+Calls the account and transaction list endpoints in-process (TestClient, OPA
+stub) for a user with --rows transactions, p50/p95 over --repeat requests:
+  uncached      - read cache disabled: query, serialize, audit write
+  miss          - a write bumped the user's version before every request
+  cached body   - unchanged version, no If-None-Match: body from the LRU
+  not modified  - If-None-Match with the current ETag: 304, no body
+
+Usage (from backend/):
+    python benchmarks/bench_read_cache.py --rows 1000 --output read_cache.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import harness  # noqa: F401  (puts backend/app on sys.path)
+from loadtest import load_app
+from stubs import start_opa_stub
+
+USER = "user-001"
+ENDPOINTS = ("/api/v1/accounts", "/api/v1/transactions")
+
+
+def load_transactions(db_path: str, rows: int):
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO user_transactions (user_id, account_id, amount, transaction_type, merchant, timestamp) "
+        "VALUES (?, 1, ?, 'debit', ?, ?)",
+        ((USER, -round(i % 400 + 0.5, 2), f"Merchant {i % 97}", f"2025-07-{1 + i % 28:02d}T{i % 24:02d}:00:00Z")
+         for i in range(rows)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def time_requests(send, repeat: int, before=None) -> dict:
+    samples, status = [], None
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        response = send()
+        samples.append((time.perf_counter() - start) * 1000)
+        status = response.status_code
+    samples.sort()
+    return {
+        "status": status,
+        "bytes": len(response.content),
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conditional GET read cache benchmark")
+    parser.add_argument("--rows", type=int, default=1000, help="Transactions for the benchmark user")
+    parser.add_argument("--repeat", type=int, default=300)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    opa = start_opa_stub()
+    directory = tempfile.mkdtemp()
+    db_path = os.path.join(directory, "read_cache.db")
+    app = load_app(opa.url, "http://127.0.0.1:9", db_path, admission=False)
+    load_transactions(db_path, args.rows)
+
+    from fastapi.testclient import TestClient
+
+    from auth import create_access_token
+    from response_cache import AuditBatcher, read_cache
+
+    headers = {"Authorization": "Bearer " + create_access_token(USER)}
+    writer = sqlite3.connect(db_path, isolation_level=None)
+
+    def bump():
+        writer.execute("UPDATE user_data_versions SET version = version + 1 WHERE user_id = ?", (USER,))
+
+    results = []
+    # The routes print an audit line per request; keep them out of the timings' output
+    with TestClient(app) as client, contextlib.redirect_stdout(io.StringIO()):
+        for endpoint in ENDPOINTS:
+            def send(extra=None):
+                return client.get(endpoint, headers={**headers, **(extra or {})})
+
+            etag = None
+            cases = [
+                ("uncached", send, None),
+                ("miss", send, bump),
+                ("cached body", send, None),
+                ("not modified", lambda: send({"If-None-Match": etag}), None),
+            ]
+            for label, fn, before in cases:
+                read_cache.enabled = label != "uncached"
+                if label == "cached body":
+                    send()
+                if label == "not modified":
+                    etag = send().headers["etag"]
+                results.append({"endpoint": endpoint, "case": label, **time_requests(fn, args.repeat, before)})
+        AuditBatcher.flush_all()
+    writer.close()
+    opa.stop()
+
+    print(f"{'endpoint':<22} {'case':<13} {'status':>6} {'bytes':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    for row in results:
+        print(f"{row['endpoint']:<22} {row['case']:<13} {row['status']:>6} {row['bytes']:>8} "
+              f"{row['p50_ms']:>9} {row['p95_ms']:>9}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "read_cache", "rows": args.rows, "results": results}, f, indent=2)
+        print(f"📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Benchmark for streaming transaction risk scoring
+
+  * fold rate: events/s through RiskEngine.observe (timestamp parsing and the
+    constant-time window, novelty and z-score updates) for --users active
+    users, and through risk.observe alone with pre-parsed times
+  * memory: bytes of risk state per active user (tracemalloc), and per user
+    in the snapshot file
+  * tailing: --rows transactions ingested through ingest.py into --shards
+    shards, then folded in by RiskEngine.catch_up from SQLite (events/s)
+  * snapshot: write and restore time and size; a restored engine must score
+    every user exactly as the one that wrote it
+  * rebalance: after moving users to one more shard, catching up again must
+    skip the copied rows rather than count them twice
+
+Usage (from backend/):
+    python benchmarks/bench_risk.py --users 10000 --events 500000 --rows 200000 --output risk.json
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import harness  # noqa: F401  (puts backend/app on sys.path)
+
+import ingest
+import risk
+from shards import Rebalancer, ShardRouter, migrate_all
+
+
+def make_events(users: int, count: int, seed: int = 7) -> list:
+    """(user_id, timestamp, amount, merchant) spread over the last two days, in time order"""
+    rng = random.Random(seed)
+    now = time.time()
+    start = now - 2 * 86400
+    step = (now - start) / count
+    events = []
+    for index in range(count):
+        at = start + index * step
+        amount = rng.lognormvariate(3.5, 1.0)
+        # One debit in 25 is far outside the user's usual range
+        if rng.random() < 0.04:
+            amount *= 20
+        events.append((
+            f"user-{rng.randrange(users)}",
+            datetime.fromtimestamp(at, timezone.utc).isoformat(),
+            round(amount if rng.random() < 0.1 else -amount, 2),
+            f"Merchant {int(rng.paretovariate(1.2)) % 400}",
+        ))
+    return events
+
+
+def bench_fold(events: list, users: int) -> dict:
+    engine = risk.RiskEngine(ShardRouter(lambda: ""), lambda: "")
+    started = time.perf_counter()
+    for user_id, timestamp, amount, merchant in events:
+        engine.observe(user_id, timestamp, amount, merchant)
+    observe_seconds = time.perf_counter() - started
+
+    states = {}
+    parsed = [(user_id, risk.parse_time(timestamp), amount, merchant)
+              for user_id, timestamp, amount, merchant in events]
+    started = time.perf_counter()
+    for user_id, at, amount, merchant in parsed:
+        state = states.get(user_id)
+        if state is None:
+            state = states[user_id] = risk.UserState()
+        risk.observe(state, at, amount, merchant)
+    fold_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for index in range(users):
+        engine.score(f"user-{index}")
+    score_seconds = time.perf_counter() - started
+    return {
+        "events": len(events),
+        "active_users": len(engine.users),
+        "observe_events_per_sec": round(len(events) / observe_seconds),
+        "fold_events_per_sec": round(len(events) / fold_seconds),
+        "score_us": round(score_seconds / users * 1e6, 1),
+    }
+
+
+def bench_memory(users: int) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    states = {f"user-{index}": risk.UserState() for index in range(users)}
+    now = time.time()
+    for user_id, state in states.items():
+        for event in range(40):
+            risk.observe(state, now - event * 600, -25.0 - event, f"Merchant {event}")
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {"users": users, "bytes_per_user": round(used / users)}
+
+
+def ingest_rows(primary: str, events: list, batch_rows: int = 20000):
+    with sqlite3.connect(primary) as conn:
+        conn.executemany("INSERT OR IGNORE INTO users (id, username, email, created_at) VALUES (?, ?, ?, ?)",
+                         [(user_id, user_id, f"{user_id}@bench.local", "2025-01-01T00:00:00")
+                          for user_id in sorted({event[0] for event in events})])
+    conn.close()
+    for start in range(0, len(events), batch_rows):
+        lines = "".join(json.dumps({"user_id": user_id, "timestamp": timestamp, "amount": amount,
+                                    "merchant": merchant}) + "\n"
+                        for user_id, timestamp, amount, merchant in events[start:start + batch_rows])
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = ingest.ingest_stream(primary, io.StringIO(lines), "ndjson", f"bench-risk-{start}", "bench")
+        assert result["rows_rejected"] == 0, result
+
+
+def scores(engine: risk.RiskEngine, now: float) -> dict:
+    return {user_id: risk.features(state, now) for user_id, state in engine.users.items()}
+
+
+def bench_tail(events: list, shards: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="fintrust-risk-") as directory:
+        primary = os.path.join(directory, "fintrust.db")
+        snapshot = os.path.join(directory, "fintrust.risk")
+        with contextlib.redirect_stdout(io.StringIO()):
+            migrate_all(primary)
+            if shards > 1:
+                Rebalancer(primary, shards, drain_seconds=0).run()
+        router = ShardRouter(lambda: primary)
+        engine = risk.RiskEngine(router, lambda: snapshot)
+        # Rows the migrations seed
+        engine.catch_up()
+        ingest_rows(primary, events)
+
+        started = time.perf_counter()
+        applied = engine.catch_up()
+        tail_seconds = time.perf_counter() - started
+        assert applied == len(events), (applied, len(events))
+
+        started = time.perf_counter()
+        size = engine.save_snapshot()
+        save_seconds = time.perf_counter() - started
+        restored = risk.RiskEngine(router, lambda: snapshot)
+        started = time.perf_counter()
+        assert restored.load_snapshot()
+        load_seconds = time.perf_counter() - started
+        now = time.time()
+        assert scores(restored, now) == scores(engine, now), "restored state scores differently"
+
+        # Copies made by the rebalance are not new transactions
+        with contextlib.redirect_stdout(io.StringIO()):
+            moved = Rebalancer(primary, shards + 1, drain_seconds=0).run()
+        router.close()
+        assert engine.catch_up() == 0
+        assert scores(engine, now) == scores(restored, now)
+        engine_users = len(engine.users)
+        for conn in engine._connections.values():
+            conn.close()
+        for conn in restored._connections.values():
+            conn.close()
+
+    return {
+        "shards": shards,
+        "rows": len(events),
+        "tail_events_per_sec": round(applied / tail_seconds),
+        "snapshot_bytes": size,
+        "snapshot_bytes_per_user": round(size / engine_users),
+        "snapshot_save_ms": round(save_seconds * 1000, 1),
+        "snapshot_load_ms": round(load_seconds * 1000, 1),
+        "rebalance_rows_copied": moved.get("rows_moved"),
+        "rebalance_rows_skipped": engine.skipped_copies,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming risk scoring throughput, memory and snapshots")
+    parser.add_argument("--users", type=int, default=10000, help="Active users")
+    parser.add_argument("--events", type=int, default=500000, help="Events for the in-memory fold")
+    parser.add_argument("--rows", type=int, default=200000, help="Transactions ingested for the tailing run")
+    parser.add_argument("--shards", type=int, default=2)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = {
+        "fold": bench_fold(make_events(args.users, args.events), args.users),
+        "memory": bench_memory(args.users),
+        "tail": bench_tail(make_events(args.users, args.rows, seed=11), args.shards),
+    }
+    fold, memory, tail = results["fold"], results["memory"], results["tail"]
+    print(f"fold     {fold['events']} events, {fold['active_users']} users: "
+          f"{fold['observe_events_per_sec']} events/s via observe(), {fold['fold_events_per_sec']} events/s "
+          f"pre-parsed, score {fold['score_us']} us")
+    print(f"memory   {memory['bytes_per_user']} bytes of state per active user")
+    print(f"tail     {tail['rows']} rows over {tail['shards']} shards: {tail['tail_events_per_sec']} events/s")
+    print(f"snapshot {tail['snapshot_bytes']} bytes ({tail['snapshot_bytes_per_user']} per user), "
+          f"write {tail['snapshot_save_ms']} ms, restore {tail['snapshot_load_ms']} ms")
+    print(f"rebalance {tail['rebalance_rows_copied']} rows copied, {tail['rebalance_rows_skipped']} skipped by the tailer")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "risk", **results}, f, indent=2)
+        print(f"📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Benchmark for transaction search
+
+Read side: loads --rows transactions (default 1M), 10% of them for one heavy
+user and the rest spread over --users users, and times searches of a typical
+and of the heavy history both ways, p50/p95 over --repeat runs per query:
+  like  - WHERE user_id = ? AND (merchant LIKE ? OR description LIKE ?), newest first
+  fts   - search.search() against the transaction_search FTS5 index, by relevance and by recency
+
+LIKE cost grows with how far into the history its LIMIT is filled: next to
+nothing for terms on most rows, a full history scan for rare or absent ones.
+FTS cost grows with the number of matches, independent of history length,
+and relevance ranking scores every match.
+
+Write side: rows/s for the same inserts with and without index maintenance:
+  bulk      - chunked executemany as ingest.py does it, then search.index_rows per chunk
+  row       - single-row INSERT + COMMIT, indexed by the insert trigger
+
+Usage (from backend/):
+    python benchmarks/bench_search.py --rows 1000000 --users 100 --output search.json
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import harness  # noqa: F401  (puts backend/app on sys.path)
+
+import search
+from migrate import migrate
+
+MERCHANTS = ("Amazon Marketplace", "Amazon Prime", "Starbucks Coffee", "Blue Bottle Coffee", "Whole Foods Market",
+             "Shell Gas Station", "Netflix", "Uber Trip", "Target", "7-Eleven", "Apple Store", "Café Nero",
+             "Delta Air Lines", "Spotify", "Home Depot", "Costco Wholesale", "Chipotle", "Lyft", "CVS Pharmacy",
+             "Trader Joe's")
+DESCRIPTIONS = ("Online purchase", "Morning coffee", "Weekly groceries", "Fuel", "Monthly subscription",
+                "Ride home", "Latte and croissant", "Household supplies", "Snacks", "Flight booking",
+                "Prescription pickup", "Lunch", "Hardware and tools", "Bulk groceries")
+
+HEAVY_USER = "user-heavy"
+HEAVY_SHARE = 0.1
+# About one row in 5000, so a search for it has to look at a whole history
+RARE_MERCHANT = "Zeppelin Museum"
+
+# (label, search text, equivalent LIKE pattern)
+QUERIES = (
+    ("common", "coffee", "%coffee%"),
+    ("two terms", "amazon prime", "%amazon prime%"),
+    ("prefix", "star*", "%star%"),
+    ("uncommon", "pharmacy", "%pharmacy%"),
+    ("rare", "zeppelin", "%zeppelin%"),
+    ("no match", "xylophone", "%xylophone%"),
+)
+
+LIKE_SQL = """
+    SELECT id, amount, merchant, description, timestamp
+    FROM user_transactions
+    WHERE user_id = ? AND (merchant LIKE ? OR description LIKE ?)
+    ORDER BY timestamp DESC
+    LIMIT ?
+"""
+
+INSERT_SQL = """
+    INSERT INTO user_transactions
+        (user_id, account_id, amount, transaction_type, merchant, description, timestamp, batch_id, batch_row)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def generate_rows(rows: int, users: int, batch_id):
+    rng = random.Random(42)
+    for i in range(rows):
+        amount = round((i % 400) - 250.5, 2)
+        user_id = HEAVY_USER if rng.random() < HEAVY_SHARE else f"user-{rng.randrange(users):04d}"
+        yield (user_id, None, amount, "debit" if amount < 0 else "credit",
+               RARE_MERCHANT if rng.random() < 0.0002 else f"{rng.choice(MERCHANTS)} #{rng.randrange(500)}",
+               f"{rng.choice(DESCRIPTIONS)} ref {i}",
+               f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00Z",
+               batch_id, i if batch_id else None)
+
+
+def fresh_database(directory: str, name: str) -> sqlite3.Connection:
+    path = os.path.join(directory, f"{name}.db")
+    migrate(path)
+    return sqlite3.connect(path, isolation_level=None)
+
+
+def load_bulk(conn: sqlite3.Connection, rows: int, users: int, chunk_rows: int, index: bool) -> float:
+    start = time.perf_counter()
+    batch = []
+    for values in generate_rows(rows, users, "bench"):
+        batch.append(values)
+        if len(batch) == chunk_rows:
+            _write_chunk(conn, batch, index)
+            batch = []
+    if batch:
+        _write_chunk(conn, batch, index)
+    return time.perf_counter() - start
+
+
+def _write_chunk(conn, batch, index: bool):
+    conn.execute("BEGIN IMMEDIATE")
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM user_transactions").fetchone()[0]
+    conn.executemany(INSERT_SQL, batch)
+    if index:
+        search.index_rows(conn, last_id)
+    conn.execute("COMMIT")
+
+
+def load_rows(conn: sqlite3.Connection, rows: int, users: int) -> float:
+    start = time.perf_counter()
+    for values in generate_rows(rows, users, None):
+        conn.execute("BEGIN")
+        conn.execute(INSERT_SQL, values)
+        conn.execute("COMMIT")
+    return time.perf_counter() - start
+
+
+def time_query(fn, repeat: int) -> dict:
+    count = len(fn())
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "results": count,
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+    }
+
+
+def write_benchmark(directory: str, args) -> list:
+    results = []
+    for index in (False, True):
+        conn = fresh_database(directory, f"write-bulk-{index}")
+        elapsed = load_bulk(conn, args.write_rows, args.users, args.chunk_rows, index)
+        results.append({"path": "bulk", "indexed": index, "rows": args.write_rows,
+                        "rows_per_sec": round(args.write_rows / elapsed)})
+        conn.close()
+
+        conn = fresh_database(directory, f"write-row-{index}")
+        if not index:
+            conn.execute("DROP TRIGGER trg_transaction_search_insert")
+        elapsed = load_rows(conn, args.row_rows, args.users)
+        results.append({"path": "row", "indexed": index, "rows": args.row_rows,
+                        "rows_per_sec": round(args.row_rows / elapsed)})
+        conn.close()
+    return results
+
+
+def read_benchmark(directory: str, args) -> tuple:
+    conn = fresh_database(directory, "read")
+    load_seconds = load_bulk(conn, args.rows, args.users, args.chunk_rows, index=True)
+    conn.execute("INSERT INTO transaction_search (transaction_search) VALUES ('optimize')")
+    results, histories = [], {}
+    for user_id in ("user-0000", HEAVY_USER):
+        histories[user_id] = conn.execute(
+            "SELECT COUNT(*) FROM user_transactions WHERE user_id = ?", (user_id,)).fetchone()[0]
+        for label, text, pattern in QUERIES:
+            cases = {
+                "like": lambda: conn.execute(LIKE_SQL, (user_id, pattern, pattern, args.limit)).fetchall(),
+                "fts relevance": lambda: search.search(conn, user_id, text, "relevance", args.limit)["results"],
+                "fts recent": lambda: search.search(conn, user_id, text, "recent", args.limit)["results"],
+            }
+            like_p50 = None
+            for method, fn in cases.items():
+                row = {"user": user_id, "history_rows": histories[user_id], "query": label, "text": text,
+                       "method": method, **time_query(fn, args.repeat)}
+                like_p50 = like_p50 or row["p50_ms"]
+                row["speedup"] = round(like_p50 / row["p50_ms"], 1) if row["p50_ms"] else None
+                results.append(row)
+    conn.close()
+    return results, {"rows": args.rows, "users": args.users, "history_rows": histories,
+                     "load_rows_per_sec": round(args.rows / load_seconds)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transaction search benchmark: FTS5 index vs LIKE")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=20, help="Page size")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--chunk-rows", type=int, default=5000)
+    parser.add_argument("--write-rows", type=int, default=200_000, help="Rows per bulk write case (0 to skip)")
+    parser.add_argument("--row-rows", type=int, default=5000, help="Rows per single-row write case")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        writes = write_benchmark(directory, args) if args.write_rows else []
+        reads, dataset = read_benchmark(directory, args)
+
+    print(f"dataset: {dataset['rows']} rows over {dataset['users']} users + {HEAVY_USER}, "
+          f"loaded at {dataset['load_rows_per_sec']} rows/s with the index")
+    print(f"\n{'write path':<10} {'indexed':>8} {'rows':>9} {'rows/s':>10}")
+    for row in writes:
+        print(f"{row['path']:<10} {str(row['indexed']):>8} {row['rows']:>9} {row['rows_per_sec']:>10}")
+    print(f"\n{'user':<11} {'history':>8} {'query':<10} {'method':<14} {'results':>8} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'vs like':>8}")
+    for row in reads:
+        print(f"{row['user']:<11} {row['history_rows']:>8} {row['query']:<10} {row['method']:<14} {row['results']:>8} "
+              f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['speedup']:>7}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "search", "dataset": dataset, "writes": writes, "reads": reads}, f, indent=2)
+        print(f"📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
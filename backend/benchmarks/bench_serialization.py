@@ -0,0 +1,162 @@
+"""
+Benchmark for list-endpoint serialization
+
+Times the path from a SQLite query to response body bytes for the accounts and
+transactions list endpoints at 10 / 1k / 100k rows:
+  model   - sqlite3.Row -> pydantic models -> response_model validation -> JSONResponse
+  dicts   - sqlite3.Row -> per-row dicts -> JSONResponse (old transactions path)
+  fast    - row tuples -> compiled RowMapper -> orjson (or json fallback)
+
+Usage (from backend/):
+    python benchmarks/bench_serialization.py --rows 10,1000,100000 --output serialization.json
+"""
+import argparse
+import json
+import sqlite3
+import statistics
+import time
+
+import harness  # noqa: F401  (puts backend/app on sys.path)
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+import serialization
+from routes.accounts import Account, AccountSummary, account_rows
+from routes.transactions import transaction_rows
+
+ACCOUNTS_SQL = "SELECT id, user_id, account_type, balance, created_at FROM user_accounts WHERE user_id = ? ORDER BY created_at DESC"
+TRANSACTIONS_SQL = "SELECT id, amount, merchant, timestamp FROM user_transactions WHERE user_id = ? ORDER BY timestamp DESC"
+
+
+def build_database(rows: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE user_accounts (id INTEGER PRIMARY KEY, user_id TEXT, account_type TEXT, balance REAL, created_at TEXT)")
+    conn.execute("CREATE TABLE user_transactions (id INTEGER PRIMARY KEY, user_id TEXT, amount REAL, merchant TEXT, timestamp TEXT)")
+    conn.executemany(
+        "INSERT INTO user_accounts (user_id, account_type, balance, created_at) VALUES (?, ?, ?, ?)",
+        (("user-001", ("checking", "savings", "investment")[i % 3], round(i * 13.37, 2),
+          f"2025-08-{1 + i % 28:02d}T{i % 24:02d}:00:00") for i in range(rows)),
+    )
+    conn.executemany(
+        "INSERT INTO user_transactions (user_id, amount, merchant, timestamp) VALUES (?, ?, ?, ?)",
+        (("user-001", round((i % 400) - 200.5, 2), f"Merchant {i % 97}",
+          f"2025-08-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00Z") for i in range(rows)),
+    )
+    conn.commit()
+    return conn
+
+
+def _query(conn, sql, row_factory):
+    cursor = conn.cursor()
+    cursor.row_factory = row_factory
+    cursor.execute(sql, ("user-001",))
+    return cursor.fetchall()
+
+
+def accounts_model(conn, field) -> bytes:
+    rows = _query(conn, ACCOUNTS_SQL, sqlite3.Row)
+    accounts = [Account(id=r["id"], user_id=r["user_id"], account_type=r["account_type"],
+                        balance=r["balance"], created_at=r["created_at"]) for r in rows]
+    summary = AccountSummary(total_accounts=len(accounts), total_balance=sum(a.balance for a in accounts),
+                             accounts=accounts)
+    # What FastAPI does with response_model before rendering
+    content = serialize_response_sync(field, summary)
+    return JSONResponse(content).body
+
+
+def accounts_fast(conn, field=None) -> bytes:
+    cursor = conn.cursor()
+    rows = serialization.fetch_tuples(cursor, ACCOUNTS_SQL, ("user-001",))
+    return serialization.FastJSONResponse({
+        "total_accounts": len(rows),
+        "total_balance": float(sum(row[3] for row in rows)),
+        "accounts": account_rows(rows),
+    }).body
+
+
+def transactions_dicts(conn, field=None) -> bytes:
+    rows = _query(conn, TRANSACTIONS_SQL, sqlite3.Row)
+    transactions = [{"id": r["id"], "amount": r["amount"], "merchant": r["merchant"], "timestamp": r["timestamp"]}
+                    for r in rows]
+    return JSONResponse({"transactions": transactions}).body
+
+
+def transactions_fast(conn, field=None) -> bytes:
+    cursor = conn.cursor()
+    rows = serialization.fetch_tuples(cursor, TRANSACTIONS_SQL, ("user-001",))
+    return serialization.FastJSONResponse({"transactions": transaction_rows(rows)}).body
+
+
+def serialize_response_sync(field, content):
+    # serialize_response never awaits for async endpoints; drive the coroutine directly
+    coroutine = serialize_response(field=field, response_content=content)
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("serialize_response suspended unexpectedly")
+
+
+def time_case(fn, conn, field, repeat: int) -> list:
+    fn(conn, field)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(conn, field)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List endpoint serialization benchmark")
+    parser.add_argument("--rows", default="10,1000,100000")
+    parser.add_argument("--repeat", type=int, default=0, help="Iterations per case (default scales with rows)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    field = create_response_field(name="Response_get_user_accounts", type_=AccountSummary)
+    encoder = "orjson" if serialization.orjson is not None else "json"
+    cases = [
+        ("accounts", "model", accounts_model),
+        ("accounts", "fast", accounts_fast),
+        ("transactions", "dicts", transactions_dicts),
+        ("transactions", "fast", transactions_fast),
+    ]
+
+    results = []
+    print(f"encoder: {encoder}")
+    print(f"{'endpoint':<13} {'path':<6} {'rows':>7} {'p50 ms':>10} {'rows/s':>12} {'bytes':>10} {'speedup':>8}")
+    for rows in [int(r) for r in args.rows.split(",") if r]:
+        conn = build_database(rows)
+        repeat = args.repeat or max(3, min(200, 200_000 // max(rows, 1)))
+        baseline = {}
+        for endpoint, path, fn in cases:
+            samples = time_case(fn, conn, field, repeat)
+            p50 = statistics.median(samples)
+            baseline.setdefault(endpoint, p50)
+            body = fn(conn, field)
+            row = {
+                "endpoint": endpoint,
+                "path": path,
+                "encoder": encoder if path == "fast" else "json",
+                "rows": rows,
+                "repeat": repeat,
+                "p50_ms": round(p50, 4),
+                "rows_per_sec": round(rows / (p50 / 1000)) if p50 else None,
+                "body_bytes": len(body),
+                "speedup": round(baseline[endpoint] / p50, 2),
+            }
+            results.append(row)
+            print(f"{endpoint:<13} {path:<6} {rows:>7} {row['p50_ms']:>10} {row['rows_per_sec']:>12} "
+                  f"{row['body_bytes']:>10} {row['speedup']:>7}x")
+        conn.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "serialization", "encoder": encoder, "results": results}, f, indent=2)
+        print(f"📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark for sharded storage
+
+Write throughput against shard count: for each --shards value, a fresh set of
+databases laid out for that many shards, and --writers threads that each
+route a random user through shards.ShardRouter and commit one transaction
+insert (with its rollup, search index and data version triggers) per write,
+for --seconds. Reports commits/s, p50/p99 commit latency and lock timeouts.
+
+Then rebalances a populated database from the first to the last shard count
+and reports how long it took and how many users and rows moved.
+
+Usage (from backend/):
+    python benchmarks/bench_sharding.py --shards 1 2 4 8 --writers 16 --output sharding.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+import harness  # noqa: F401  (puts backend/app on sys.path)
+
+from shards import Rebalancer, ShardRouter, migrate_all
+
+INSERT_SQL = """
+    INSERT INTO user_transactions (user_id, account_id, amount, transaction_type, merchant, description, timestamp)
+    VALUES (?, NULL, ?, 'debit', ?, 'benchmark write', '2025-08-01T12:00:00')
+"""
+
+
+def prepare(directory: str, shard_count: int) -> str:
+    primary = os.path.join(directory, "fintrust.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrate_all(primary)
+        if shard_count > 1:
+            Rebalancer(primary, shard_count, drain_seconds=0).run()
+    return primary
+
+
+def run_writers(primary: str, users: list, writers: int, seconds: float) -> dict:
+    router = ShardRouter(lambda: primary)
+    latencies, timeouts = [], [0]
+    deadline = time.perf_counter() + seconds
+
+    def write():
+        rng = random.Random()
+        samples = []
+        while time.perf_counter() < deadline:
+            user_id = rng.choice(users)
+            start = time.perf_counter()
+            try:
+                conn = router.connect(user_id, write=True)
+                try:
+                    conn.execute(INSERT_SQL, (user_id, -rng.randint(1, 500) / 10, f"Merchant {rng.randint(0, 50)}"))
+                    conn.commit()
+                finally:
+                    conn.close()
+            except sqlite3.OperationalError:
+                timeouts[0] += 1
+                continue
+            samples.append((time.perf_counter() - start) * 1000)
+        latencies.extend(samples)
+
+    threads = [threading.Thread(target=write) for _ in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    router.close()
+
+    latencies.sort()
+    return {
+        "commits": len(latencies),
+        "commits_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)], 2) if latencies else None,
+        "lock_timeouts": timeouts[0],
+    }
+
+
+def populate(primary: str, users: list, rows_per_user: int):
+    conn = sqlite3.connect(primary)
+    for user_id in users:
+        account_id = conn.execute(
+            "INSERT INTO user_accounts (user_id, account_type, balance, created_at) "
+            "VALUES (?, 'checking', 1000.0, '2025-01-01T00:00:00')", (user_id,)).lastrowid
+        conn.executemany(
+            "INSERT INTO user_transactions (user_id, account_id, amount, transaction_type, merchant, timestamp) "
+            "VALUES (?, ?, ?, 'debit', ?, ?)",
+            [(user_id, account_id, -(i % 90 + 0.5), f"Merchant {i % 31}", f"2025-{1 + i % 12:02d}-10T08:00:00")
+             for i in range(rows_per_user)])
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded storage write throughput benchmark")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rebalance-rows", type=int, default=20, help="Transactions per user for the rebalance run")
+    parser.add_argument("--dir", help="Directory for the databases (default: a temporary one); use real storage")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    users = [f"user-{i:05d}" for i in range(args.users)]
+    results = []
+    for shard_count in args.shards:
+        with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+            primary = prepare(directory, shard_count)
+            results.append({"shards": shard_count, "writers": args.writers,
+                            **run_writers(primary, users, args.writers, args.seconds)})
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        primary = prepare(directory, args.shards[0])
+        populate(primary, users, args.rebalance_rows)
+        with contextlib.redirect_stdout(io.StringIO()):
+            rebalance = Rebalancer(primary, args.shards[-1], drain_seconds=0.05).run()
+
+    print(f"{'shards':>6} {'writers':>7} {'commits/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'timeouts':>8}")
+    for row in results:
+        print(f"{row['shards']:>6} {row['writers']:>7} {row['commits_per_sec']:>10} {row['p50_ms']:>8} "
+              f"{row['p99_ms']:>8} {row['lock_timeouts']:>8}")
+    print(f"Rebalance {rebalance['from']} -> {rebalance['target']} shards: {rebalance['users_moved']} of "
+          f"{args.users} users, {rebalance['rows_moved']} rows in {rebalance['seconds']}s "
+          f"({rebalance['batches']} batches)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "sharding", "results": results, "rebalance": rebalance}, f, indent=2)
+        print(f"📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark for the token/policy cache backends across worker processes
+
+Simulates --requests requests spread at random over --workers processes, as
+the uvicorn workers behind one port see them. Each request looks up one of
+--keys tokens, drawn with a Zipf-like skew; on a miss the worker "verifies"
+the token and caches it. The two backends:
+  memory  - result_cache.TTLCache, one per worker, each warming up on its own
+  shared  - shared_cache.SharedMemoryCache, one mmap table for all workers
+Reports the overall hit ratio and p50/p99 get() latency (hits and misses
+together) for each worker count.
+
+Usage (from backend/):
+    python benchmarks/bench_shared_cache.py --workers 1,2,4,8 --output shared_cache.json
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import statistics
+import tempfile
+import time
+
+import harness  # noqa: F401  (puts backend/app on sys.path)
+
+CLAIMS = {"sub": "user-000000", "email": "user@example.com", "preferred_username": "user",
+          "roles": ["user", "account_reader"], "exp": 4102444800}
+
+
+def run_worker(backend: str, directory: str, worker: int, workers: int, args, barrier, results):
+    from result_cache import TTLCache
+    from shared_cache import SharedMemoryCache
+
+    if backend == "shared":
+        cache = SharedMemoryCache("bench", args.max_entries, args.ttl, directory=directory)
+    else:
+        cache = TTLCache(args.max_entries, args.ttl)
+    # Every worker draws the same request stream and serves its share of it
+    rng = random.Random(args.seed)
+    weights = [1 / (rank + 1) ** args.skew for rank in range(args.keys)]
+    stream = rng.choices(range(args.keys), weights, k=args.requests)
+    owners = random.Random(args.seed + 1).choices(range(workers), k=args.requests)
+    mine = [f"token-{key:06d}" for key, owner in zip(stream, owners) if owner == worker]
+
+    barrier.wait()
+    samples, hits = [], 0
+    for key in mine:
+        start = time.perf_counter_ns()
+        value = cache.get(key)
+        samples.append(time.perf_counter_ns() - start)
+        if value is None:
+            cache.set(key, {**CLAIMS, "sub": key})
+        else:
+            hits += 1
+    results.put((len(mine), hits, samples))
+
+
+def run(backend: str, workers: int, args) -> dict:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    with tempfile.TemporaryDirectory() as directory:
+        processes = [context.Process(target=run_worker, args=(backend, directory, n, workers, args, barrier, results))
+                     for n in range(workers)]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    requests = sum(c[0] for c in collected)
+    hits = sum(c[1] for c in collected)
+    samples = sorted(s for c in collected for s in c[2])
+    return {
+        "backend": backend,
+        "workers": workers,
+        "requests": requests,
+        "hit_ratio": round(hits / requests, 4),
+        "get_p50_us": round(statistics.median(samples) / 1000, 2),
+        "get_p99_us": round(samples[int(len(samples) * 0.99)] / 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-process vs shared-memory auth cache benchmark")
+    parser.add_argument("--workers", default="1,2,4,8", help="Comma-separated worker counts")
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--keys", type=int, default=20_000, help="Distinct tokens")
+    parser.add_argument("--skew", type=float, default=0.8, help="Zipf exponent of token popularity")
+    parser.add_argument("--max-entries", type=int, default=8192)
+    parser.add_argument("--ttl", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = [run(backend, int(workers), args)
+               for workers in args.workers.split(",") for backend in ("memory", "shared")]
+
+    print(f"{'backend':<8} {'workers':>7} {'requests':>9} {'hit ratio':>10} {'get p50 us':>11} {'get p99 us':>11}")
+    for row in results:
+        print(f"{row['backend']:<8} {row['workers']:>7} {row['requests']:>9} {row['hit_ratio']:>10} "
+              f"{row['get_p50_us']:>11} {row['get_p99_us']:>11}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "shared_cache", "keys": args.keys, "skew": args.skew,
+                       "max_entries": args.max_entries, "results": results}, f, indent=2)
+        print(f"📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+Shared setup for gateway benchmarks
+Puts backend/app on sys.path and makes the audit-log directory importable as
+the audit_log package, as the Docker image does.
+"""
+import os
+import sys
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+APP_DIR = os.path.join(BACKEND_DIR, "app")
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+
+def ensure_audit_log_package():
+    try:
+        import audit_log.logger  # noqa: F401
+    except ImportError:
+        package = types.ModuleType("audit_log")
+        package.__path__ = [os.path.join(REPO_DIR, "audit-log")]
+        sys.modules["audit_log"] = package
+
+
+ensure_audit_log_package()
@@ -0,0 +1,338 @@
+"""
+Load test for FinTrust Gateway
+
+Replays a weighted request mix from a JSONL scenario file against the FastAPI
+app, either in-process (ASGI transport) or over a local socket (uvicorn), with
+OPA and the encryption service replaced by local stubs with injected latency.
+Reports throughput, p50/p95/p99 latency and error rate per endpoint, and can
+compare a run against a saved baseline to flag regressions between commits.
+
+Scenario lines (one request template per line):
+    {"name": "list_accounts", "method": "GET", "path": "/api/v1/accounts",
+     "user": "user-001", "weight": 40}
+Optional keys: "body" (JSON body), "headers", "expect" (status code, default
+any 2xx) and "unique_field" (body field suffixed with a sequence number so
+every request is distinct, e.g. to defeat the evaluate result cache).
+
+Usage (from backend/):
+    python benchmarks/loadtest.py --duration 20 --concurrency 32 --save-baseline baseline.json
+    python benchmarks/loadtest.py --duration 20 --concurrency 32 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+from harness import BENCH_DIR
+from stubs import start_encryption_stub, start_opa_stub
+
+
+# ------------------------------
+# Scenario
+# ------------------------------
+
+class Scenario:
+    def __init__(self, spec: dict):
+        self.name = spec["name"]
+        self.method = spec.get("method", "GET").upper()
+        self.path = spec["path"]
+        self.user = spec.get("user")
+        self.weight = float(spec.get("weight", 1))
+        self.body = spec.get("body")
+        self.headers = spec.get("headers", {})
+        self.expect = spec.get("expect")
+        self.unique_field = spec.get("unique_field")
+
+    def ok(self, status: int) -> bool:
+        return status == self.expect if self.expect else 200 <= status < 300
+
+
+def load_scenarios(path: str) -> list:
+    scenarios = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                scenarios.append(Scenario(json.loads(line)))
+            except (json.JSONDecodeError, KeyError) as e:
+                raise SystemExit(f"❌ {path}:{number}: invalid scenario line ({e})")
+    if not scenarios:
+        raise SystemExit(f"❌ {path}: no scenarios")
+    return scenarios
+
+
+# ------------------------------
+# App under test
+# ------------------------------
+
+def load_app(opa_url: str, encryption_url: str, db_path: str, admission: bool):
+    """Import the gateway wired to the stubs and a scratch database"""
+    os.environ["OPA_URL"] = opa_url
+    os.environ["ENCRYPTION_API"] = encryption_url
+    os.environ["ADMISSION_ENABLED"] = "true" if admission else "false"
+
+    import db
+    from audit_log import logger
+
+    db.DB_PATH = db_path
+    logger.DB_PATH = db_path
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        db.init_database()
+
+    import main
+    return main.app
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.asynccontextmanager
+async def open_client(app, mode: str, concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    if mode == "asgi":
+        transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 40000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", limits=limits) as client:
+            yield client
+        return
+
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, name="loadtest-uvicorn", daemon=True)
+    thread.start()
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits) as client:
+            yield client
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+# ------------------------------
+# Runner
+# ------------------------------
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+
+    def record(self, name: str, elapsed: float, status: int, ok: bool):
+        self.latencies.setdefault(name, []).append(elapsed)
+        statuses = self.statuses.setdefault(name, {})
+        statuses[status] = statuses.get(status, 0) + 1
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+
+async def run_load(client, scenarios: list, tokens: dict, duration: float, max_requests: int,
+                   concurrency: int, seed: int, recorder: Recorder) -> float:
+    rng = random.Random(seed)
+    weights = [scenario.weight for scenario in scenarios]
+    sequence = iter(range(1, 1 << 62))
+    deadline = time.perf_counter() + duration
+    remaining = [max_requests or float("inf")]
+
+    async def worker():
+        while remaining[0] > 0 and time.perf_counter() < deadline:
+            remaining[0] -= 1
+            scenario = rng.choices(scenarios, weights)[0]
+            headers = dict(scenario.headers)
+            if scenario.user:
+                headers["Authorization"] = f"Bearer {tokens[scenario.user]}"
+            body = scenario.body
+            if scenario.unique_field and body is not None:
+                body = dict(body)
+                body[scenario.unique_field] = f"{body.get(scenario.unique_field, '')}-{next(sequence)}"
+
+            start = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, scenario.path, json=body, headers=headers)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            recorder.record(scenario.name, time.perf_counter() - start, status, scenario.ok(status))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    def stats(latencies: list, errors: int) -> dict:
+        ordered = sorted(latencies)
+        return {
+            "requests": len(ordered),
+            "throughput_rps": round(len(ordered) / elapsed, 2),
+            "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+            "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+            "error_rate": round(errors / len(ordered), 4) if ordered else 0.0,
+        }
+
+    endpoints = {}
+    for name, latencies in sorted(recorder.latencies.items()):
+        endpoints[name] = stats(latencies, recorder.errors.get(name, 0))
+        endpoints[name]["statuses"] = {str(code): count for code, count in sorted(recorder.statuses[name].items())}
+
+    everything = [latency for latencies in recorder.latencies.values() for latency in latencies]
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "overall": stats(everything, sum(recorder.errors.values())),
+        "endpoints": endpoints,
+    }
+
+
+# ------------------------------
+# Baseline comparison
+# ------------------------------
+
+def compare(baseline: dict, current: dict, tolerance: float, min_delta_ms: float) -> list:
+    """
+    Regression flags per endpoint: p95/p99 slower or throughput lower by more
+    than tolerance (latency also by more than min_delta_ms, to ignore
+    sub-millisecond noise), or a higher error rate.
+    """
+    flags = []
+    sections = {"overall": (baseline.get("overall"), current.get("overall"))}
+    for name, stats in baseline.get("endpoints", {}).items():
+        sections[name] = (stats, current.get("endpoints", {}).get(name))
+
+    for name, (before, after) in sections.items():
+        if not before:
+            continue
+        if not after:
+            flags.append(f"{name}: missing from this run")
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if after[key] > before[key] * (1 + tolerance) and after[key] - before[key] > min_delta_ms:
+                flags.append(f"{name}: {key} {before[key]} -> {after[key]}")
+        if after["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            flags.append(f"{name}: throughput_rps {before['throughput_rps']} -> {after['throughput_rps']}")
+        if after["error_rate"] > before["error_rate"] + 0.01:
+            flags.append(f"{name}: error_rate {before['error_rate']} -> {after['error_rate']}")
+    return flags
+
+
+def print_report(report: dict):
+    header = f"{'endpoint':<24} {'requests':>9} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["endpoints"].items()) + [("overall", report["overall"])]
+    for name, stats in rows:
+        print(f"{name:<24} {stats['requests']:>9} {stats['throughput_rps']:>9} {stats['p50_ms']:>9} "
+              f"{stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['error_rate']:>8.2%}")
+
+
+async def main_async(args) -> dict:
+    scenarios = load_scenarios(args.scenario)
+    opa = start_opa_stub(args.opa_latency_ms, args.jitter_ms)
+    encryption = start_encryption_stub(args.encryption_latency_ms, args.jitter_ms)
+    workdir = tempfile.mkdtemp(prefix="fintrust-loadtest-")
+    try:
+        app = load_app(opa.url, encryption.url, os.path.join(workdir, "fintrust.db"), args.admission)
+
+        from auth import create_access_token
+        tokens = {s.user: create_access_token(s.user) for s in scenarios if s.user}
+
+        # Handlers and the audit logger print per request; keep the report readable
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+        with output:
+            async with open_client(app, args.mode, args.concurrency) as client:
+                if args.warmup:
+                    await run_load(client, scenarios, tokens, args.warmup, 0, args.concurrency, args.seed, Recorder())
+                recorder = Recorder()
+                elapsed = await run_load(client, scenarios, tokens, args.duration, args.requests,
+                                         args.concurrency, args.seed + 1, recorder)
+    finally:
+        opa.stop()
+        encryption.stop()
+
+    report = summarize(recorder, elapsed)
+    report["config"] = {
+        "scenario": os.path.basename(args.scenario),
+        "mode": args.mode,
+        "concurrency": args.concurrency,
+        "duration_seconds": args.duration,
+        "opa_latency_ms": args.opa_latency_ms,
+        "encryption_latency_ms": args.encryption_latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "admission": args.admission,
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the FinTrust gateway against local stubs")
+    parser.add_argument("--scenario", default=os.path.join(BENCH_DIR, "scenarios", "mixed.jsonl"))
+    parser.add_argument("--mode", choices=["asgi", "socket"], default="asgi",
+                        help="asgi drives the app in-process; socket goes through uvicorn on a local port")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests (0 = duration only)")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Unmeasured seconds before the run")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--opa-latency-ms", type=float, default=2.0)
+    parser.add_argument("--encryption-latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--admission", action="store_true",
+                        help="Keep admission control on (off by default: few users at high rates would be throttled)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--save-baseline", help="Write the JSON report as the new baseline")
+    parser.add_argument("--baseline", help="Compare against this baseline; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression (0.15 = 15%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore latency regressions smaller than this")
+    parser.add_argument("--verbose", action="store_true", help="Keep app logging on stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"💾 Report written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print(f"⚠️  Baseline was recorded with a different configuration: {baseline.get('config')}")
+        flags = compare(baseline, report, args.tolerance, args.min_delta_ms)
+        if flags:
+            print(f"❌ {len(flags)} regression(s) against {args.baseline}:")
+            for flag in flags:
+                print(f"   - {flag}")
+            sys.exit(1)
+        print(f"✅ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Local stand-ins for OPA and the encryption service
+
+Small threaded HTTP servers that answer the endpoints the backend calls,
+with configurable injected latency, so the gateway can be load-tested
+without the docker-compose stack.
+"""
+import base64
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    routes = {}
+    latency_ms = 0.0
+    jitter_ms = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        handler = self.routes.get((method, self.path))
+        if handler is None:
+            return self._respond(404, {"error": "not found"})
+
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        try:
+            body = json.loads(raw) if raw else {}
+        except json.JSONDecodeError:
+            return self._respond(400, {"error": "invalid json"})
+        status, response = handler(body)
+        self._respond(status, response)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+def _opa_allow(body):
+    # Mirror the policy's shape: allow unless the input explicitly asks for a denial
+    allowed = body.get("input", {}).get("action") != "deny"
+    return 200, {"result": allowed}
+
+
+def _loan_evaluate(body):
+    if not body.get("encrypted_payload"):
+        return 400, {"error": "Missing encrypted_payload"}
+    result = base64.b64encode(json.dumps({"approved": True, "score": 812.5}).encode()).decode()
+    return 200, {"encrypted_loan_result": result, "model_version": "loan-v1"}
+
+
+def _health(body):
+    return 200, {"status": "healthy", "service": "stub"}
+
+
+OPA_ROUTES = {
+    ("POST", "/v1/data/fintrust/allow"): _opa_allow,
+    ("GET", "/health"): _health,
+}
+
+ENCRYPTION_ROUTES = {
+    ("POST", "/loan/evaluate"): _loan_evaluate,
+    ("GET", "/health"): _health,
+}
+
+
+class StubServer:
+    """Runs a stub on 127.0.0.1 in a background thread; port 0 picks a free port"""
+
+    def __init__(self, name: str, routes: dict, latency_ms: float = 0.0, jitter_ms: float = 0.0, port: int = 0):
+        handler = type(f"{name}Handler", (StubHandler,), {
+            "routes": routes,
+            "latency_ms": latency_ms,
+            "jitter_ms": jitter_ms,
+        })
+        self.name = name
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name=f"stub-{name}", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_opa_stub(latency_ms: float = 0.0, jitter_ms: float = 0.0, port: int = 0) -> StubServer:
+    return StubServer("opa", OPA_ROUTES, latency_ms, jitter_ms, port).start()
+
+
+def start_encryption_stub(latency_ms: float = 0.0, jitter_ms: float = 0.0, port: int = 0) -> StubServer:
+    return StubServer("encryption", ENCRYPTION_ROUTES, latency_ms, jitter_ms, port).start()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run OPA and encryption-service stubs")
+    parser.add_argument("--opa-port", type=int, default=8181)
+    parser.add_argument("--encryption-port", type=int, default=5000)
+    parser.add_argument("--opa-latency-ms", type=float, default=2.0)
+    parser.add_argument("--encryption-latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    opa = start_opa_stub(args.opa_latency_ms, args.jitter_ms, args.opa_port)
+    encryption = start_encryption_stub(args.encryption_latency_ms, args.jitter_ms, args.encryption_port)
+    print(f"🛡️  OPA stub: {opa.url}")
+    print(f"🔐 Encryption stub: {encryption.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        opa.stop()
+        encryption.stop()
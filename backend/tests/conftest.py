@@ -0,0 +1,11 @@
+"""
+Shared setup for backend tests
+Reuses the benchmarks' harness: backend/app on sys.path and the audit-log
+directory importable as the audit_log package.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import harness  # noqa: F401,E402
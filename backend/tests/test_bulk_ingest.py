@@ -0,0 +1,82 @@
+"""
+Tests for POST /api/v1/transactions/bulk
+A client that disconnects mid-upload must leave its batch resumable.
+"""
+import asyncio
+import contextlib
+import io
+import json
+import sqlite3
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import auth
+import db
+from routes import transactions
+from shards import migrate_all
+
+ROWS = [{"user_id": "user-001", "amount": -12.5 - i, "merchant": f"Merchant {i}",
+         "timestamp": f"2025-03-{i + 1:02d}T10:00:00"} for i in range(5)]
+BODY = "".join(json.dumps(row) + "\n" for row in ROWS).encode()
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    primary = str(tmp_path / "fintrust.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrate_all(primary)
+    monkeypatch.setattr(db, "DB_PATH", primary)
+    monkeypatch.setattr(transactions, "check_access", lambda **kwargs: True)
+    monkeypatch.setattr(transactions, "log_event", lambda **kwargs: None)
+    app = FastAPI()
+    app.include_router(transactions.router, prefix="/api/v1")
+    app.dependency_overrides[auth.get_current_user] = lambda: auth.TokenPayload(
+        sub="ingest-client", preferred_username="ingest-client", roles=["ingest"])
+    return app
+
+
+def upload_then_disconnect(app: FastAPI, path: str, body: bytes):
+    """Send body as the first part of a longer upload, then disconnect"""
+    messages = [{"type": "http.request", "body": body, "more_body": True}, {"type": "http.disconnect"}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+             "query_string": b"batch_id=b1", "server": ("test", 80), "client": ("test", 1234),
+             "headers": [(b"content-type", b"application/x-ndjson"), (b"host", b"test")]}
+
+    async def run():
+        with contextlib.suppress(Exception):
+            await app(scope, receive, send)
+
+    asyncio.run(run())
+
+
+def test_disconnect_leaves_batch_resumable(app):
+    # Cut off in the middle of the last row
+    upload_then_disconnect(app, "/api/v1/transactions/bulk", BODY[:-20])
+
+    with sqlite3.connect(db.DB_PATH) as conn:
+        status = conn.execute("SELECT status FROM ingest_batches WHERE batch_id = 'b1'").fetchone()
+        inserted = conn.execute("SELECT COUNT(*) FROM user_transactions WHERE batch_id = 'b1'").fetchone()[0]
+    conn.close()
+    assert status == ("running",)
+    assert inserted == 0
+
+    with TestClient(app) as client:
+        response = client.post("/api/v1/transactions/bulk?batch_id=b1", content=BODY,
+                               headers={"Content-Type": "application/x-ndjson"})
+    summary = response.json()
+    assert response.status_code == 200
+    assert summary["replayed"] is False
+    assert summary["status"] == "completed"
+    assert summary["rows_inserted"] == len(ROWS)
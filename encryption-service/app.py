@@ -2,61 +2,169 @@
 Simplified Encryption Service for FinTrust Gateway
 Works without TenSEAL for local development
 """
+import time
+_import_started = time.perf_counter()
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import json
 import random
 import base64
+import fcntl
+from collections import namedtuple
 from datetime import datetime
-from cryptography.fernet import Fernet
 import os
+import metrics
+import profiling
+import startup
+import worker_stats
+from metrics import STARTUP_SECONDS, stage
 
 app = Flask(__name__)
 CORS(app)
 
-# Generate a key for this session (in production, use a persistent key)
-SERVER_KEY = Fernet.generate_key()
-fernet = Fernet(SERVER_KEY)
+# Request/crypto metrics on GET /metrics
+metrics.init_app(app, metrics.SlowRequestLog(
+    threshold_ms=float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "1000")),
+    sample_rate=float(os.getenv("SLOW_REQUEST_SAMPLE_RATE", "1.0"))
+))
+
+# Admin-only CPU and allocation profiling (ADMIN_TOKEN; see profiling.py)
+profiling.init_app(app)
+
+# Keys and the HE context are built off the boot path (see startup.py)
+boot = startup.from_env()
+
+# Warm-up begins by the first request at the latest (servers that import app)
+app.before_request(boot.start)
 
 # Simple polynomial coefficients for loan evaluation
 LOAN_COEFFICIENTS = [1000, 2, -0.5]  # ax^2 + bx + c
+# Weights of (income/1000, credit_score, loan_amount/1000); LOAN_COEFFICIENTS[0] is the bias
+LOAN_WEIGHTS = [LOAN_COEFFICIENTS[1], LOAN_COEFFICIENTS[2], -0.1]
+# Bump whenever LOAN_COEFFICIENTS change: compiled HE plans are cached per version
+LOAN_MODEL_VERSION = "loan-v1"
+
+# Real HE path: /loan/evaluate scores the features encrypted under a TenSEAL
+# CKKS context (with Galois keys for the slot sum) instead of in plaintext
+HE_ENABLED = os.getenv("HE_ENABLED", "0") == "1"
 
 # Logging
 LOG_FILE = "encryption_logs.json"
 
+SessionKey = namedtuple("SessionKey", "key fernet")
+
+def _configured_keys():
+    """
+    Keys from SERVER_KEY_FILE (one per line, re-read on rotation) or SERVER_KEY
+    (comma-separated); the first encrypts, all of them decrypt
+    """
+    path = os.getenv("SERVER_KEY_FILE")
+    if path:
+        with open(path) as f:
+            return [line.strip().encode() for line in f if line.strip()]
+    return [key.strip().encode() for key in os.getenv("SERVER_KEY", "").split(",") if key.strip()]
+
+def _load_session_key():
+    # cryptography is imported here rather than at module level
+    from cryptography.fernet import Fernet, MultiFernet
+
+    # Configured keys survive restarts; otherwise one per session
+    keys = _configured_keys()
+    if not keys:
+        keys = [Fernet.generate_key()]
+        if session_key.last:
+            # Rotating: tokens issued under the previous key still decrypt
+            keys.append(session_key.last.key)
+    print(f"🔑 Session key: {base64.b64encode(keys[0]).decode()[:20]}...")
+    return SessionKey(keys[0], MultiFernet([Fernet(key) for key in keys]))
+
+def _load_he_context():
+    # tenseal and numpy come in with homomorphic_utils
+    import homomorphic_utils as he
+
+    return he.create_tenseal_context()
+
+session_key = boot.component("session_key", _load_session_key)
+he_context = boot.component("he_context", _load_he_context) if HE_ENABLED else None
+
+def server_fernet():
+    """The session key's Fernet instance, built on first use if warm-up has not got to it"""
+    return session_key.get().fernet
+
+def score_loan(features):
+    """LOAN_COEFFICIENTS[0] + LOAN_WEIGHTS . features, under CKKS when HE_ENABLED"""
+    if he_context is None:
+        return LOAN_COEFFICIENTS[0] + sum(w * x for w, x in zip(LOAN_WEIGHTS, features)), "plaintext"
+
+    import homomorphic_utils as he
+
+    context = he_context.get()
+    encrypted = he.client_encrypt_vector(context, features)
+    result = he.evaluate_linear_on_encrypted(encrypted, context, LOAN_WEIGHTS, LOAN_COEFFICIENTS[0])
+    if result is None:
+        raise RuntimeError("homomorphic evaluation failed")
+    return he.client_decrypt_vector(context, result)[0], "ckks"
+
+def rotate_session_key():
+    """Switch to a new session key (the prefork master calls this on SIGHUP)"""
+    return session_key.rebuild()
+
 def log_event(event_data):
     """Log events to file"""
     try:
-        event_data["timestamp"] = datetime.utcnow().isoformat()
+        with stage("log_write"):
+            event_data["timestamp"] = datetime.utcnow().isoformat()
 
-        # Read existing logs
-        logs = []
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, "r") as f:
-                logs = json.load(f)
+            # Prefork workers share the file: one read-modify-write at a time
+            with open(LOG_FILE + ".lock", "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
 
-        # Add new log
-        logs.append(event_data)
+                # Read existing logs
+                logs = []
+                if os.path.exists(LOG_FILE):
+                    with open(LOG_FILE, "r") as f:
+                        logs = json.load(f)
 
-        # Keep only last 100 logs
-        logs = logs[-100:]
+                # Add new log
+                logs.append(event_data)
 
-        # Write back
-        with open(LOG_FILE, "w") as f:
-            json.dump(logs, f, indent=2)
+                # Keep only last 100 logs
+                logs = logs[-100:]
+
+                # Write back
+                with open(LOG_FILE, "w") as f:
+                    json.dump(logs, f, indent=2)
 
     except Exception as e:
         print(f"Logging error: {e}")
 
 @app.route("/health", methods=["GET"])
 def health():
-    """Health check endpoint"""
+    """Liveness: answers while warm-up is still running ("starting")"""
+    state = boot.state
     return jsonify({
-        "status": "healthy",
+        "status": "healthy" if state == "ready" else state,
         "service": "FinTrust Encryption Service",
         "version": "1.0.0-dev"
     })
 
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness: 503 until warm-up has built the keys (and HE context), with per-component timings"""
+    report = boot.report()
+    return jsonify(report), 200 if report["status"] == "ready" else 503
+
+@app.route("/metrics/workers", methods=["GET"])
+def worker_metrics():
+    """Per-worker request and CPU counters under the prefork server (none on the development server)"""
+    stats = worker_stats.STATS
+    return jsonify({
+        "server": "prefork" if stats else "development",
+        "pid": os.getpid(),
+        "workers": stats.snapshot() if stats else []
+    })
+
 @app.route("/encrypt", methods=["POST"])
 def encrypt_data():
     """Encrypt data using Fernet (symmetric encryption)"""
@@ -74,7 +182,8 @@ def encrypt_data():
             plaintext_bytes = json.dumps(plaintext).encode()
 
         # Encrypt
-        encrypted = fernet.encrypt(plaintext_bytes)
+        with stage("fernet_encrypt"):
+            encrypted = server_fernet().encrypt(plaintext_bytes)
         encrypted_b64 = base64.b64encode(encrypted).decode()
 
         # Log event
@@ -110,7 +219,8 @@ def decrypt_data():
 
         # Decrypt
         encrypted = base64.b64decode(encrypted_b64)
-        decrypted_bytes = fernet.decrypt(encrypted)
+        with stage("fernet_decrypt"):
+            decrypted_bytes = server_fernet().decrypt(encrypted)
 
         # Try to parse as JSON, fallback to string
         try:
@@ -139,8 +249,8 @@ def decrypt_data():
 @app.route("/loan/evaluate", methods=["POST"])
 def evaluate_loan():
     """
-    Simplified loan evaluation without homomorphic encryption
-    In production, this would use TenSEAL for privacy-preserving computation
+    Loan evaluation: with HE_ENABLED the score is computed on the features
+    encrypted under the CKKS context, otherwise in plaintext
     """
     try:
         data = request.json
@@ -150,7 +260,8 @@ def evaluate_loan():
             # Try to decrypt if encrypted
             try:
                 encrypted = base64.b64decode(data["encrypted_payload"])
-                decrypted_bytes = fernet.decrypt(encrypted)
+                with stage("fernet_decrypt"):
+                    decrypted_bytes = server_fernet().decrypt(encrypted)
                 loan_data = json.loads(decrypted_bytes.decode())
             except:
                 return jsonify({"error": "Could not decrypt loan data"}), 400
@@ -165,12 +276,7 @@ def evaluate_loan():
 
         # Simple loan evaluation formula
         # Score = a + b*income/1000 + c*credit_score + d*loan_amount/1000
-        score = (
-            LOAN_COEFFICIENTS[0] +
-            LOAN_COEFFICIENTS[1] * (income / 1000) +
-            LOAN_COEFFICIENTS[2] * credit_score +
-            (-0.1) * (loan_amount / 1000)
-        )
+        score, evaluation = score_loan([income / 1000, credit_score, loan_amount / 1000])
 
         # Determine approval
         approved = score > 750
@@ -181,11 +287,14 @@ def evaluate_loan():
             "score": round(score, 2),
             "interest_rate": round(interest_rate, 2),
             "max_loan_amount": round(income * 4, 2),
+            "model_version": LOAN_MODEL_VERSION,
+            "evaluation": evaluation,
             "evaluation_id": f"eval_{random.randint(100000, 999999)}"
         }
 
         # Encrypt result for consistency
-        result_encrypted = fernet.encrypt(json.dumps(result).encode())
+        with stage("fernet_encrypt"):
+            result_encrypted = server_fernet().encrypt(json.dumps(result).encode())
         result_b64 = base64.b64encode(result_encrypted).decode()
 
         # Log event
@@ -198,6 +307,7 @@ def evaluate_loan():
 
         return jsonify({
             "encrypted_loan_result": result_b64,
+            "model_version": LOAN_MODEL_VERSION,
             "plain_result": result  # Include plain result for development
         })
 
@@ -228,14 +338,19 @@ def get_key_info():
     return jsonify({
         "key_algorithm": "Fernet",
         "key_id": "dev-session-key",
-        "key_b64": base64.b64encode(SERVER_KEY).decode(),
+        "key_b64": base64.b64encode(session_key.get().key).decode(),
         "warning": "This key is for development only!"
     })
 
+STARTUP_SECONDS.set("import", value=time.perf_counter() - _import_started)
+
 if __name__ == "__main__":
-    print("🔐 Starting FinTrust Encryption Service...")
-    print(f"🔑 Session key: {base64.b64encode(SERVER_KEY).decode()[:20]}...")
+    debug = os.getenv("FLASK_DEBUG", "1") == "1"
+    print(f"🔐 Starting FinTrust Encryption Service ({boot.mode} startup)...")
     print("📊 Logs will be saved to: encryption_logs.json")
-    print("⚠️  This is a development version - NOT for production!")
+    print("⚠️  This is a development version - NOT for production! (gunicorn -c gunicorn.conf.py app:app)")
 
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # Under the reloader this process only watches files; the child it starts serves
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        boot.start()
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=debug)
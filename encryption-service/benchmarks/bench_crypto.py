@@ -0,0 +1,268 @@
+"""
+Micro-benchmarks for the encryption service's crypto primitives
+
+Covers fernet_utils, the app.py handlers (through the Flask test client) and
+the homomorphic_utils functions: context creation, encrypt, decrypt,
+polynomial evaluation and DP noise. Sweeps payload sizes and CKKS ring sizes
+and reports ops/s, latency percentiles, peak RSS and ciphertext bytes (the
+serialized output size; for create_context, the public context with its keys).
+
+Runs offline on a CPU-only Linux box; log files are written to a scratch
+directory instead of the service's working directory.
+
+Usage (from encryption-service/):
+    python benchmarks/bench_crypto.py --output crypto.json
+    python benchmarks/bench_crypto.py --suites ckks --rings 8192,16384 --he-repeat 20
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fernet_utils  # noqa: E402
+import homomorphic_utils as he  # noqa: E402
+
+SUITES = ("fernet", "handlers", "ckks")
+
+
+# ------------------------------
+# Measurement
+# ------------------------------
+
+def _reset_peak_rss() -> bool:
+    """Reset the kernel's RSS high-water mark so each case reports its own peak (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux and never resets
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def measure(suite: str, operation: str, fn, repeat: int, warmup: int = 1, ciphertext_bytes=None, **params) -> dict:
+    """
+    Time fn() repeat times after warmup calls. ciphertext_bytes, if callable,
+    is applied to fn's last result.
+    """
+    for _ in range(warmup):
+        fn()
+    _reset_peak_rss()
+
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+
+    ordered = sorted(samples)
+    total = sum(samples)
+    row = {
+        "suite": suite,
+        "operation": operation,
+        "params": params,
+        "repeat": repeat,
+        "ops_per_sec": round(repeat / total, 2) if total else None,
+        "latency_ms": {
+            "p50": round(percentile(ordered, 50) * 1000, 4),
+            "p95": round(percentile(ordered, 95) * 1000, 4),
+            "p99": round(percentile(ordered, 99) * 1000, 4),
+            "mean": round(statistics.fmean(samples) * 1000, 4),
+            "max": round(ordered[-1] * 1000, 4),
+        },
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "ciphertext_bytes": ciphertext_bytes(result) if callable(ciphertext_bytes) else ciphertext_bytes,
+    }
+    _print_row(row)
+    return row
+
+
+def _print_row(row: dict):
+    params = ",".join(f"{k}={v}" for k, v in row["params"].items())
+    latency = row["latency_ms"]
+    cipher = row["ciphertext_bytes"] if row["ciphertext_bytes"] is not None else "-"
+    print(f"{row['suite']:<9} {row['operation']:<24} {params:<44} {row['ops_per_sec']:>11} "
+          f"{latency['p50']:>10} {latency['p95']:>10} {latency['p99']:>10} {row['peak_rss_mb']:>8} {cipher:>10}")
+
+
+def _payload(size: int, rng: random.Random) -> str:
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(size))
+
+
+# ------------------------------
+# Suites
+# ------------------------------
+
+def bench_fernet(args, rng) -> list:
+    rows = []
+    fernet = fernet_utils.get_fernet()
+    for size in args.payload_sizes:
+        data = _payload(size, rng).encode()
+        token = fernet.encrypt(data)
+        rows.append(measure("fernet", "encrypt", lambda: fernet.encrypt(data), args.repeat,
+                            ciphertext_bytes=len, payload_bytes=size))
+        rows.append(measure("fernet", "decrypt", lambda: fernet.decrypt(token), args.repeat,
+                            ciphertext_bytes=len(token), payload_bytes=size))
+
+    # log_encrypted: encrypt plus an appending file write
+    fernet_utils.LOG_FILE = os.path.join(args.workdir, "encrypted_log.txt")
+    for size in args.payload_sizes:
+        message = _payload(size, rng)
+        rows.append(measure("fernet", "log_encrypted", lambda: fernet_utils.log_encrypted(message), args.repeat,
+                            payload_bytes=size))
+    return rows
+
+
+def bench_handlers(args, rng) -> list:
+    import app as service
+
+    service.LOG_FILE = os.path.join(args.workdir, "encryption_logs.json")
+    client = service.app.test_client()
+    rows = []
+
+    rows.append(measure("handlers", "GET /health", lambda: client.get("/health"), args.repeat))
+
+    for size in args.payload_sizes:
+        plaintext = _payload(size, rng)
+        encrypted = client.post("/encrypt", json={"plaintext": plaintext}).get_json()["encrypted_data"]
+        rows.append(measure("handlers", "POST /encrypt",
+                            lambda: client.post("/encrypt", json={"plaintext": plaintext}), args.repeat,
+                            ciphertext_bytes=lambda r: len(r.get_json()["encrypted_data"]), payload_bytes=size))
+        rows.append(measure("handlers", "POST /decrypt",
+                            lambda: client.post("/decrypt", json={"encrypted_data": encrypted}), args.repeat,
+                            ciphertext_bytes=len(encrypted), payload_bytes=size))
+
+    loan = json.dumps({"income": 72000, "credit_score": 710, "loan_amount": 15000}).encode()
+    encrypted_loan = base64.b64encode(service.server_fernet().encrypt(loan)).decode()
+    rows.append(measure("handlers", "POST /loan/evaluate",
+                        lambda: client.post("/loan/evaluate", json={"encrypted_payload": encrypted_loan}), args.repeat,
+                        ciphertext_bytes=lambda r: len(r.get_json()["encrypted_loan_result"]),
+                        payload_bytes=len(loan)))
+    return rows
+
+
+def bench_ckks(args, rng) -> list:
+    rows = []
+    coefficients = [float(c) for c in args.coefficients]
+    for ring in args.rings:
+        rows.append(measure("ckks", "create_context",
+                            lambda: he.create_tenseal_context(ring, args.depth), args.he_repeat, warmup=0,
+                            ciphertext_bytes=lambda ctx: len(ctx.serialize(save_secret_key=False)),
+                            poly_modulus_degree=ring, depth=args.depth))
+        context = he.create_tenseal_context(ring, args.depth)
+        slots = ring // 2
+
+        for size in args.vector_sizes:
+            if size > slots:
+                print(f"⚠️  Skipping vector size {size}: ring {ring} has {slots} slots")
+                continue
+            values = [rng.uniform(-1, 1) for _ in range(size)]
+            params = {"poly_modulus_degree": ring, "depth": args.depth, "vector_size": size}
+            encrypted = he.client_encrypt_vector(context, values)
+
+            rows.append(measure("ckks", "encrypt", lambda: he.client_encrypt_vector(context, values),
+                                args.he_repeat, ciphertext_bytes=len, **params))
+            rows.append(measure("ckks", "decrypt", lambda: he.client_decrypt_vector(context, encrypted),
+                                args.he_repeat, ciphertext_bytes=len(encrypted), **params))
+            rows.append(measure("ckks", "evaluate_polynomial",
+                                lambda: he.evaluate_polynomial_on_encrypted(encrypted, context, coefficients,
+                                                                            model_version="bench"),
+                                args.he_repeat, ciphertext_bytes=len, degree=len(coefficients) - 1, **params))
+            rows.append(measure("ckks", "dp_noise", lambda: he.add_differential_privacy(values, 1.0, 0.5),
+                                args.repeat, vector_size=size))
+    return rows
+
+
+# ------------------------------
+# Entry point
+# ------------------------------
+
+def _int_list(value: str) -> list:
+    return [int(v) for v in value.split(",") if v]
+
+
+def environment() -> dict:
+    from importlib.metadata import PackageNotFoundError, version
+
+    def package_version(name):
+        try:
+            return version(name)
+        except PackageNotFoundError:
+            return "unknown"
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "tenseal": package_version("tenseal"),
+        "cryptography": package_version("cryptography"),
+        "flask": package_version("flask"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crypto primitive micro-benchmarks")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"Comma-separated subset of {','.join(SUITES)}")
+    parser.add_argument("--payload-sizes", type=_int_list, default=[64, 1024, 16384, 262144],
+                        help="Fernet payload sizes in bytes")
+    parser.add_argument("--rings", type=_int_list, default=[8192, 16384], help="CKKS poly_modulus_degree values")
+    parser.add_argument("--depth", type=int, default=he.DEFAULT_MAX_DEPTH, help="CKKS multiplicative depth")
+    parser.add_argument("--vector-sizes", type=_int_list, default=[1, 64, 4096], help="CKKS vector lengths")
+    parser.add_argument("--coefficients", type=lambda v: v.split(","), default=["1000", "2", "-0.5"],
+                        help="Polynomial evaluated on ciphertexts (default: the loan model)")
+    parser.add_argument("--repeat", type=int, default=200, help="Iterations for Fernet, handler and DP cases")
+    parser.add_argument("--he-repeat", type=int, default=10, help="Iterations for CKKS cases")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    suites = [s for s in args.suites.split(",") if s]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+
+    rng = random.Random(args.seed)
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="fintrust-bench-") as workdir:
+        args.workdir = workdir
+        print(f"{'suite':<9} {'operation':<24} {'params':<44} {'ops/s':>11} "
+              f"{'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'rss MB':>8} {'ct bytes':>10}")
+        for suite in suites:
+            rows.extend({"fernet": bench_fernet, "handlers": bench_handlers, "ckks": bench_ckks}[suite](args, rng))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "crypto", "environment": environment(), "results": rows}, f, indent=2)
+        print(f"📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark for compiled CKKS polynomial evaluation plans
+
+Reports, per polynomial degree: plan strategy, depth used, multiplications,
+evaluation latency and precision error against plaintext evaluation. The
+naive power-by-power loop is measured alongside for comparison whenever it
+still fits in a supported modulus chain (it needs one level per degree).
+
+Usage (from encryption-service/):
+    python benchmarks/bench_poly_plan.py --max-degree 8 --repeat 5 --output poly_plan.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tenseal as ts  # noqa: E402
+from homomorphic_utils import create_tenseal_context, execute_plan  # noqa: E402
+from poly_plan import compile_plan  # noqa: E402
+
+# Largest multiplicative depth each ring size supports with [60, 40 * depth, 60]
+MAX_DEPTH_BY_RING = {8192: 2, 16384: 7, 32768: 19}
+
+
+def ring_for_depth(depth: int) -> int:
+    for ring, max_depth in sorted(MAX_DEPTH_BY_RING.items()):
+        if depth <= max_depth:
+            return ring
+    raise ValueError(f"No supported ring size for depth {depth}")
+
+
+def naive_evaluate(x, coefficients):
+    """The original x_power *= x loop, with the constant added as plaintext"""
+    result = x * coefficients[1] + coefficients[0]
+    x_power = x
+    for i in range(2, len(coefficients)):
+        x_power = x * x_power
+        result += x_power * coefficients[i]
+    return result
+
+
+def time_call(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, samples
+
+
+def bench_degree(degree: int, repeat: int, slots: int, seed: int) -> dict:
+    rng = random.Random(seed + degree)
+    coefficients = [rng.uniform(-1, 1) for _ in range(degree + 1)]
+    values = [rng.uniform(-1, 1) for _ in range(slots)]
+    expected = [sum(c * v ** i for i, c in enumerate(coefficients)) for v in values]
+
+    # Find the shallowest plan, then the smallest ring that can run it
+    plan = None
+    for depth in range(0, max(MAX_DEPTH_BY_RING.values()) + 1):
+        try:
+            plan = compile_plan(coefficients, depth)
+            break
+        except ValueError:
+            continue
+    ring = ring_for_depth(plan.depth)
+    context = create_tenseal_context(ring, max(plan.depth, 1))
+    x = ts.ckks_vector(context, values)
+
+    compile_samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        compile_plan(coefficients, plan.depth)
+        compile_samples.append((time.perf_counter() - start) * 1000)
+
+    result, samples = time_call(lambda: execute_plan(x, plan), repeat)
+    error = max(abs(a - b) for a, b in zip(result.decrypt(), expected))
+
+    row = {
+        **plan.describe(),
+        "poly_modulus_degree": ring,
+        "compile_ms": round(statistics.median(compile_samples), 4),
+        "latency_ms_p50": round(statistics.median(samples), 3),
+        "latency_ms_max": round(max(samples), 3),
+        "max_abs_error": error,
+    }
+
+    # The naive loop needs one level per degree: x^i is built with i - 1 sequential products
+    naive_depth = degree
+    if 0 < degree and naive_depth <= max(MAX_DEPTH_BY_RING.values()):
+        naive_context = create_tenseal_context(ring_for_depth(naive_depth), naive_depth)
+        naive_x = ts.ckks_vector(naive_context, values)
+        naive_result, naive_samples = time_call(lambda: naive_evaluate(naive_x, coefficients), repeat)
+        row["naive_depth"] = naive_depth
+        row["naive_poly_modulus_degree"] = ring_for_depth(naive_depth)
+        row["naive_latency_ms_p50"] = round(statistics.median(naive_samples), 3)
+        row["naive_max_abs_error"] = max(abs(a - b) for a, b in zip(naive_result.decrypt(), expected))
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CKKS evaluation plan benchmark")
+    parser.add_argument("--min-degree", type=int, default=1)
+    parser.add_argument("--max-degree", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--slots", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    rows = []
+    print(f"{'deg':>3} {'strategy':>8} {'ring':>6} {'depth':>5} {'ct*':>4} {'pt*':>4} "
+          f"{'p50 ms':>9} {'naive ms':>9} {'max err':>10}")
+    for degree in range(args.min_degree, args.max_degree + 1):
+        row = bench_degree(degree, args.repeat, args.slots, args.seed)
+        rows.append(row)
+        naive = row.get("naive_latency_ms_p50")
+        print(f"{row['degree']:>3} {row['strategy']:>8} {row['poly_modulus_degree']:>6} {row['depth']:>5} "
+              f"{row['ct_multiplications']:>4} {row['scalar_multiplications']:>4} "
+              f"{row['latency_ms_p50']:>9.3f} {naive if naive is not None else '-':>9} "
+              f"{row['max_abs_error']:>10.2e}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "poly_plan", "results": rows}, f, indent=2)
+        print(f"📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Cold-start benchmark for the encryption service
+
+Two reports:
+
+  * Import profile: runs `python -X importtime -c "import app"` and sums each
+    module's self time by top-level package, so the packages that dominate
+    boot stand out (flask/werkzeug vs cryptography vs tenseal/numpy).
+  * Time to live / ready per STARTUP_MODE: starts `python app.py` (no
+    reloader) on a free port, polls /health and /ready, then times the first
+    /encrypt. Reports spawn-to-live, spawn-to-ready, the first request's
+    latency and the server's own warm-up timings from /ready.
+
+With --he the service also builds the CKKS context (HE_ENABLED=1), which
+needs tenseal installed.
+
+Usage (from encryption-service/):
+    python benchmarks/bench_startup.py --output startup.json
+    python benchmarks/bench_startup.py --modes background eager --he --runs 3
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+# ------------------------------
+# Import profile
+# ------------------------------
+
+def import_profile(env: dict, top: int) -> dict:
+    """Self import time per top-level package and the app module's direct imports"""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=SERVICE_DIR,
+                               env=env, capture_output=True, text=True, check=True)
+    by_package, children, direct, total_us = {}, [], [], 0
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = int(match[1]), int(match[2]), len(match[3]), match[4]
+        package = module.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+        # A module is listed after everything it imported: collect the one-level-deep
+        # lines until their top-level importer shows up
+        if indent == 3:
+            children.append({"module": module, "cumulative_ms": round(cumulative_us / 1000, 2)})
+        elif indent == 1:
+            if module == "app":
+                total_us, direct = cumulative_us, children
+            children = []
+
+    packages = sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "app_import_ms": round(total_us / 1000, 2),
+        "packages": [{"package": name, "self_ms": round(us / 1000, 2)} for name, us in packages],
+        "app_imports": sorted(direct, key=lambda row: row["cumulative_ms"], reverse=True)[:top],
+    }
+
+
+# ------------------------------
+# Time to live / ready
+# ------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+    except OSError:
+        return None, None
+
+
+def start_once(mode: str, env: dict, timeout: float) -> dict:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = dict(env, STARTUP_MODE=mode, PORT=str(port), FLASK_DEBUG="0")
+    with tempfile.TemporaryDirectory(prefix="fintrust-startup-") as workdir:
+        spawned = time.perf_counter()
+        process = subprocess.Popen([sys.executable, os.path.join(SERVICE_DIR, "app.py")], cwd=workdir, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            live = ready = report = None
+            deadline = spawned + timeout
+            while ready is None and time.perf_counter() < deadline:
+                status, body = _get(f"{base}/ready" if live else f"{base}/health")
+                now = time.perf_counter()
+                if status == 200 and live is None:
+                    live = now
+                elif status == 200:
+                    ready, report = now, body
+                elif status == 503:
+                    report = body
+                time.sleep(0.002)
+            if ready is None:
+                raise RuntimeError(f"{mode}: not ready after {timeout}s ({report})")
+
+            request = urllib.request.Request(f"{base}/encrypt", data=b'{"plaintext": "cold start"}',
+                                             headers={"Content-Type": "application/json"})
+            started = time.perf_counter()
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+            first_request = time.perf_counter() - started
+        finally:
+            process.terminate()
+            process.wait()
+
+    return {
+        "live_ms": (live - spawned) * 1000,
+        "ready_ms": (ready - spawned) * 1000,
+        "first_encrypt_ms": first_request * 1000,
+        "components": {name: info["seconds"] for name, info in report["components"].items()},
+    }
+
+
+def summarize(mode: str, runs: list) -> dict:
+    def median(key):
+        return round(statistics.median(run[key] for run in runs), 2)
+
+    return {
+        "mode": mode,
+        "runs": len(runs),
+        "live_ms": median("live_ms"),
+        "ready_ms": median("ready_ms"),
+        "first_encrypt_ms": median("first_encrypt_ms"),
+        "components_ms": {name: round(statistics.median((run["components"][name] or 0) for run in runs) * 1000, 2)
+                          for name in runs[-1]["components"]},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encryption service cold-start benchmark")
+    parser.add_argument("--modes", nargs="+", default=["lazy", "background", "eager"])
+    parser.add_argument("--runs", type=int, default=5, help="Server starts per mode (medians are reported)")
+    parser.add_argument("--top", type=int, default=10, help="Packages and imports listed in the profile")
+    parser.add_argument("--he", action="store_true", help="Enable the TenSEAL path (HE_ENABLED=1)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    env = dict(os.environ, HE_ENABLED="1" if args.he else "0")
+    profile = import_profile(env, args.top)
+    print(f"import app: {profile['app_import_ms']}ms")
+    print(f"{'package':<20} {'self ms':>9}")
+    for row in profile["packages"]:
+        print(f"{row['package']:<20} {row['self_ms']:>9}")
+    print(f"{'app.py import':<20} {'cum ms':>9}")
+    for row in profile["app_imports"]:
+        print(f"{row['module']:<20} {row['cumulative_ms']:>9}")
+
+    results = [summarize(mode, [start_once(mode, env, args.timeout) for _ in range(args.runs)])
+               for mode in args.modes]
+    print(f"{'mode':<11} {'live ms':>9} {'ready ms':>9} {'1st enc ms':>11}  components ms")
+    for row in results:
+        print(f"{row['mode']:<11} {row['live_ms']:>9} {row['ready_ms']:>9} {row['first_encrypt_ms']:>11}  "
+              f"{row['components_ms']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "startup", "he_enabled": args.he, "import_profile": profile,
+                       "results": results}, f, indent=2)
+        print(f"📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
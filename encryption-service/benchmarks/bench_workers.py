@@ -0,0 +1,178 @@
+"""
+Throughput of the prefork server against worker count
+
+For each --workers value, starts `gunicorn -c gunicorn.conf.py app:app` with
+WEB_CONCURRENCY set to it, waits for /ready, then runs --clients load
+processes that POST --endpoint back to back for --seconds. Reports req/s,
+p50/p99 latency, how evenly the requests spread over the workers and their
+CPU time (from /metrics/workers), and memory: summed RSS against summed PSS
+of the master and workers, which shows how much of the preloaded state the
+workers still share with the master.
+
+The load generator runs on the same machine, so on a box with few cores it
+competes with the workers for CPU; compare rows with each other, not with
+numbers from elsewhere.
+
+Usage (from encryption-service/):
+    python benchmarks/bench_workers.py --workers 1 2 4 8 --clients 16 --output workers.json
+    python benchmarks/bench_workers.py --he --endpoint /loan/evaluate
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get_json(url: str):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def _wait_ready(base: str, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            _get_json(f"{base}/ready")
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.05)
+    raise RuntimeError(f"Server at {base} not ready after {timeout}s")
+
+
+def _memory_kb(pid: int) -> tuple:
+    """(RSS, PSS) in KiB from /proc/<pid>/smaps_rollup (Linux)"""
+    rss = pss = 0
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Rss:"):
+                rss = int(line.split()[1])
+            elif line.startswith("Pss:"):
+                pss = int(line.split()[1])
+    return rss, pss
+
+
+def _children(pid: int) -> list:
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def _client(port: int, endpoint: str, body: bytes, deadline: float, results):
+    latencies, errors = [], 0
+    headers = {"Content-Type": "application/json"}
+    while time.time() < deadline:
+        # Sync workers close the connection after every response
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        start = time.perf_counter()
+        try:
+            conn.request("POST", endpoint, body, headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+                continue
+        except OSError:
+            errors += 1
+            continue
+        finally:
+            conn.close()
+        latencies.append(time.perf_counter() - start)
+    results.put((latencies, errors))
+
+
+def run(workers: int, args, env: dict) -> dict:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = dict(env, WEB_CONCURRENCY=str(workers), PORT=str(port), PYTHONPATH=SERVICE_DIR)
+    with tempfile.TemporaryDirectory(prefix="fintrust-workers-") as workdir:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", os.path.join(SERVICE_DIR, "gunicorn.conf.py"), "app:app"],
+            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _wait_ready(base, args.timeout)
+            # Every worker has booted and answered at least once
+            time.sleep(0.5)
+
+            body = json.dumps({"plaintext": "x" * args.payload_bytes, "income": 85000,
+                               "credit_score": 720, "loan_amount": 20000}).encode()
+            results = multiprocessing.Queue()
+            deadline = time.time() + args.seconds
+            clients = [multiprocessing.Process(target=_client, args=(port, args.endpoint, body, deadline, results))
+                       for _ in range(args.clients)]
+            started = time.perf_counter()
+            for client in clients:
+                client.start()
+            outcomes = [results.get() for _ in clients]
+            elapsed = time.perf_counter() - started
+            for client in clients:
+                client.join()
+
+            stats = _get_json(f"{base}/metrics/workers")["workers"]
+            memory = [_memory_kb(pid) for pid in [server.pid] + _children(server.pid)]
+        finally:
+            server.terminate()
+            server.wait()
+
+    latencies = sorted(latency for outcome in outcomes for latency in outcome[0])
+    per_worker = sorted(worker["requests"] for worker in stats)
+    return {
+        "workers": workers,
+        "clients": args.clients,
+        "requests": len(latencies),
+        "errors": sum(outcome[1] for outcome in outcomes),
+        "req_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2) if latencies else None,
+        "requests_per_worker": per_worker,
+        "worker_cpu_seconds": round(sum(w["cpu_user_seconds"] + w["cpu_system_seconds"] for w in stats), 2),
+        "rss_mb": round(sum(rss for rss, _ in memory) / 1024, 1),
+        "pss_mb": round(sum(pss for _, pss in memory) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefork server throughput against worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent load processes")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--endpoint", default="/encrypt", help="POST endpoint to load (/encrypt or /loan/evaluate)")
+    parser.add_argument("--payload-bytes", type=int, default=1024, help="Plaintext size for /encrypt")
+    parser.add_argument("--he", action="store_true", help="Preload the TenSEAL context too (HE_ENABLED=1)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    env = dict(os.environ, HE_ENABLED="1" if args.he else "0")
+    results = [run(workers, args, env) for workers in sorted(set(args.workers))]
+
+    print(f"{'workers':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6} {'cpu s':>6} "
+          f"{'rss MB':>7} {'pss MB':>7}  requests per worker")
+    for row in results:
+        print(f"{row['workers']:>7} {row['req_per_sec']:>8} {row['p50_ms']:>8} {row['p99_ms']:>8} {row['errors']:>6} "
+              f"{row['worker_cpu_seconds']:>6} {row['rss_mb']:>7} {row['pss_mb']:>7}  {row['requests_per_worker']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "workers", "cpu_count": os.cpu_count(), "endpoint": args.endpoint,
+                       "he_enabled": args.he, "results": results}, f, indent=2)
+        print(f"📊 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,21 @@
-from cryptography.fernet import Fernet
 from datetime import datetime
+from metrics import stage
+from startup import Component
 
-# For production, store this key securely (e.g., in a vault or .env)
-FERNET_KEY = Fernet.generate_key()
-fernet = Fernet(FERNET_KEY)
+def _generate_fernet():
+    # cryptography is imported on first use, not when this module loads
+    from cryptography.fernet import Fernet
+
+    # For production, store this key securely (e.g., in a vault or .env)
+    return Fernet(Fernet.generate_key())
+
+log_fernet = Component("log_fernet", _generate_fernet)
 
 LOG_FILE = "logs/encrypted_log.txt"
 
+def get_fernet():
+    return log_fernet.get()
+
 def log_encrypted(message: str):
     """
     Encrypts and logs a message with timestamp.
@@ -14,7 +23,8 @@ def log_encrypted(message: str):
     timestamp = datetime.utcnow().isoformat()
     log_entry = f"[{timestamp}] {message}"
     
-    encrypted = fernet.encrypt(log_entry.encode()).decode()
+    with stage("fernet_encrypt"):
+        encrypted = get_fernet().encrypt(log_entry.encode()).decode()
 
     with open(LOG_FILE, "a") as f:
         f.write(encrypted + "\n")
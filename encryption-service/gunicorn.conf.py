@@ -0,0 +1,93 @@
+"""
+Gunicorn configuration for the FinTrust Encryption Service
+Production serving: the master imports the app and builds the keys (and,
+with HE_ENABLED, the CKKS context that /loan/evaluate scores under) once,
+then forks one sync worker per core; the workers evaluate with that state,
+shared copy-on-write, and never build their own. SIGHUP rotates the
+session key in the master and replaces the workers gracefully: new workers
+fork with the new key, old ones finish their in-flight requests first.
+
+    gunicorn -c gunicorn.conf.py app:app
+    kill -HUP <master pid>        # rotate the session key
+
+Request and crypto metrics on /metrics are per process (whichever worker
+answers); the fintrust_worker_* series and /metrics/workers cover all workers.
+"""
+import gc
+import multiprocessing
+import os
+import time
+
+# Everything is built in the master before the first fork; a warm-up thread
+# would not survive the fork, and lazy building would repeat it per worker
+os.environ["STARTUP_MODE"] = "eager"
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+# Crypto is CPU-bound: one request at a time per process, one process per core
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or multiprocessing.cpu_count()
+worker_class = "sync"
+preload_app = True
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+
+def _freeze_shared_state():
+    # Keep the cyclic collector off the objects built so far, so workers do
+    # not write to (and copy) the pages they share with the master
+    gc.collect()
+    gc.freeze()
+
+
+def on_starting(server):
+    import worker_stats
+
+    # Room for a full set of replacement workers during a reload
+    worker_stats.enable(max(64, 4 * workers))
+
+
+def when_ready(server):
+    import app  # already imported by preload_app
+
+    app.boot.start()
+    # A component missing here would be built again by every worker
+    failed = {c.name: c.error for c in app.boot.components if not c.ready}
+    if failed:
+        raise RuntimeError(f"Preloading failed, not forking workers: {failed}")
+    _freeze_shared_state()
+    server.log.info("Keys preloaded (%s); forking %d workers", app.boot.report()["components"], workers)
+
+
+def on_reload(server):
+    import app
+
+    app.rotate_session_key()
+    _freeze_shared_state()
+    server.log.info("Session key rotated; replacing workers")
+
+
+def pre_fork(server, worker):
+    import worker_stats
+
+    worker.stats_slot = worker_stats.STATS.claim()
+
+
+def post_fork(server, worker):
+    import worker_stats
+
+    worker_stats.STATS.bind(worker.stats_slot)
+
+
+def child_exit(server, worker):
+    import worker_stats
+
+    worker_stats.STATS.release(worker.stats_slot)
+
+
+def pre_request(worker, req):
+    worker.request_started = time.perf_counter()
+
+
+def post_request(worker, req, environ, resp):
+    import worker_stats
+
+    worker_stats.STATS.record(time.perf_counter() - worker.request_started, (resp.status_code or 500) >= 500)
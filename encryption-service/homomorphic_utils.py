@@ -1,19 +1,35 @@
 import tenseal as ts
 import numpy as np
 import random
+from poly_plan import DEFAULT_MAX_DEPTH, EvaluationPlan, Term, compile_plan, get_plan
+from metrics import timed_stage
 
 # ------------------------------
 # TenSEAL Context Initialization
 # ------------------------------
 
-def create_tenseal_context():
+def coeff_mod_bit_sizes_for_depth(depth: int) -> list:
     """
-    Creates a TenSEAL CKKS context with 8192 poly modulus degree.
+    Modulus chain with one 40-bit level per multiplication, e.g. depth 2 -> [60, 40, 40, 60].
+    """
+    return [60] + [40] * depth + [60]
+
+def available_depth(context: ts.Context) -> int:
+    """
+    Number of rescales a fresh ciphertext can take before the chain is exhausted.
+    """
+    return context.seal_context().data.first_context_data().chain_index()
+
+@timed_stage("ckks_context")
+def create_tenseal_context(poly_modulus_degree: int = 8192, depth: int = DEFAULT_MAX_DEPTH):
+    """
+    Creates a TenSEAL CKKS context (8192 poly modulus degree by default)
+    with enough levels for `depth` sequential multiplications.
     """
     context = ts.context(
         ts.SCHEME_TYPE.CKKS,
-        poly_modulus_degree=8192,
-        coeff_mod_bit_sizes=[60, 40, 40, 60]
+        poly_modulus_degree=poly_modulus_degree,
+        coeff_mod_bit_sizes=coeff_mod_bit_sizes_for_depth(depth)
     )
     context.generate_galois_keys()
     context.global_scale = 2 ** 40
@@ -23,6 +39,7 @@ def create_tenseal_context():
 # Encryption / Decryption
 # ------------------------------
 
+@timed_stage("ckks_encrypt")
 def client_encrypt_vector(context: ts.Context, data: list) -> bytes:
     """
     Encrypts a list of floats using the provided TenSEAL context.
@@ -35,6 +52,7 @@ def client_encrypt_vector(context: ts.Context, data: list) -> bytes:
         print(f"[ERROR] Encryption failed: {e}")
         return None
 
+@timed_stage("ckks_decrypt")
 def client_decrypt_vector(context: ts.Context, encrypted_bytes: bytes) -> list:
     """
     Decrypts a serialized CKKS vector using the client-side context.
@@ -50,30 +68,86 @@ def client_decrypt_vector(context: ts.Context, encrypted_bytes: bytes) -> list:
 # Homomorphic Polynomial Evaluation
 # ------------------------------
 
-def evaluate_polynomial_on_encrypted(enc_bytes: bytes, context: ts.Context, coefficients: list) -> bytes:
+# TenSEAL mod-switches the right-hand operand of a multiplication in place when
+# levels differ, so shared powers go on the left (or on the right only when they
+# are the deeper operand) to keep them at their own level for later terms.
+
+def _term_on_encrypted(term: Term, powers: dict):
+    if term.fuse_left is not None:
+        return powers[term.fuse_left] * (powers[term.fuse_right] * term.coefficient)
+    if term.coefficient == 1:
+        return powers[term.power]
+    return powers[term.power] * term.coefficient
+
+def _sum_terms(terms, powers: dict, constant: float):
+    total = None
+    for term in terms:
+        value = _term_on_encrypted(term, powers)
+        total = value if total is None else total + value
+    if total is not None and constant:
+        total = total + constant
+    return total
+
+def execute_plan(x: ts.CKKSVector, plan: EvaluationPlan) -> ts.CKKSVector:
+    """
+    Runs a compiled evaluation plan on an encrypted vector.
+    Constants are added as plaintext, so they never consume a level.
+    """
+    powers = {1: x}
+    for step in plan.powers:
+        # step.left is a power of two and never shallower than step.right
+        powers[step.target] = powers[step.right] * powers[step.left]
+
+    result = _sum_terms(plan.terms, powers, 0)
+    for block in plan.blocks:
+        if block.terms:
+            inner = _sum_terms(block.terms, powers, block.constant)
+            value = powers[block.giant] * inner
+        else:
+            value = powers[block.giant] * block.constant
+        result = value if result is None else result + value
+
+    if result is None:
+        # Constant polynomial: x * 0 keeps the output encrypted under the same key
+        result = x * 0
+    return result + plan.constant if plan.constant else result
+
+@timed_stage("ckks_evaluate")
+def evaluate_polynomial_on_encrypted(enc_bytes: bytes, context: ts.Context, coefficients: list,
+                                     model_version: str = None) -> bytes:
     """
     Homomorphically evaluates a polynomial on an encrypted CKKS vector:
     P(x) = a0 + a1*x + a2*x^2 + ...
+    Plans are compiled to fit the context's modulus chain and cached per model_version.
     """
     try:
         x = ts.ckks_vector_from(context, enc_bytes)
-        result = ts.ckks_vector(context, [coefficients[0]] * len(x.decrypt()))
-
-        x_power = x
-        for i in range(1, len(coefficients)):
-            result += x_power * coefficients[i]
-            if i < len(coefficients) - 1:
-                x_power *= x
-
-        return result.serialize()
+        max_depth = available_depth(context)
+        plan = get_plan(model_version, coefficients, max_depth) if model_version \
+            else compile_plan(coefficients, max_depth)
+        return execute_plan(x, plan).serialize()
     except Exception as e:
         print(f"[ERROR] Polynomial evaluation failed: {e}")
         return None
 
+@timed_stage("ckks_evaluate")
+def evaluate_linear_on_encrypted(enc_bytes: bytes, context: ts.Context, weights: list, bias: float) -> bytes:
+    """
+    Homomorphically evaluates bias + weights . x on an encrypted CKKS vector.
+    One plaintext multiplication (one level); the slot sum uses the context's Galois keys.
+    """
+    try:
+        x = ts.ckks_vector_from(context, enc_bytes)
+        return (x.dot(weights) + bias).serialize()
+    except Exception as e:
+        print(f"[ERROR] Linear evaluation failed: {e}")
+        return None
+
 # ------------------------------
 # Differential Privacy Noise
 # ------------------------------
 
+@timed_stage("dp_noise")
 def add_differential_privacy(values: list, sensitivity: float, epsilon: float) -> list:
     """
     Applies Gaussian noise to a list of floats using (ε, 0)-DP.
@@ -0,0 +1,244 @@
+"""
+Metrics for the FinTrust Encryption Service
+Prometheus-format request and crypto-operation metrics, mirroring the
+backend's /metrics surface. Flask serves requests on several threads, so
+metric updates are guarded by a lock.
+"""
+import bisect
+import contextvars
+import functools
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import Response, g, request
+
+# Latency buckets in seconds (10µs .. 10s); Fernet calls are a few µs
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+
+
+def _format_labels(names, values, extra=""):
+    parts = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, *label_values, amount=1.0):
+        with _lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self):
+        for label_values, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values, amount=1.0):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values, value):
+        with _lock:
+            self._values[label_values] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        bounds = [f'le="{bound}"' for bound in self.buckets] + ['le="+Inf"']
+        for label_values, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(self.labels, label_values, bound)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {series[-1]}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}"
+
+
+METRICS = []
+
+
+def _register(metric):
+    METRICS.append(metric)
+    return metric
+
+
+REQUEST_SECONDS = _register(Histogram(
+    "fintrust_request_duration_seconds", "End-to-end request latency", ("method", "route", "status")))
+STAGE_SECONDS = _register(Histogram(
+    "fintrust_stage_duration_seconds", "Time spent per crypto operation within a request", ("route", "stage")))
+IN_FLIGHT = _register(Gauge(
+    "fintrust_requests_in_flight", "Requests currently being handled", ("method",)))
+ERRORS = _register(Counter(
+    "fintrust_request_errors_total", "Requests that failed with a 5xx status", ("method", "route", "status")))
+CRYPTO_SECONDS = _register(Histogram(
+    "fintrust_crypto_duration_seconds", "Latency of individual crypto (and log write) operations", ("operation",)))
+CRYPTO_ERRORS = _register(Counter(
+    "fintrust_crypto_errors_total", "Crypto operations that raised", ("operation",)))
+SLOW_REQUESTS = _register(Counter(
+    "fintrust_slow_requests_total", "Requests slower than the slow-request threshold", ("route",)))
+STARTUP_SECONDS = _register(Gauge(
+    "fintrust_startup_seconds", "Time spent per startup phase (module import, each warmed component)", ("phase",)))
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------
+# Crypto operation spans
+# ------------------------------
+
+_current_stages = contextvars.ContextVar("fintrust_stages", default=None)
+
+
+@contextmanager
+def stage(name):
+    """
+    Time one crypto operation. Always recorded in fintrust_crypto_duration_seconds;
+    inside a request it is also part of that request's stage breakdown.
+    """
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        CRYPTO_SECONDS.observe(elapsed, name)
+        if failed:
+            CRYPTO_ERRORS.inc(name)
+        stages = _current_stages.get()
+        if stages is not None:
+            stages.append((name, elapsed))
+
+
+def timed_stage(name):
+    """Decorator form of stage()"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ------------------------------
+# Flask integration
+# ------------------------------
+
+class SlowRequestLog:
+    """Bounded, sampled log of outlier requests with their stage breakdown"""
+
+    def __init__(self, threshold_ms=1000.0, sample_rate=1.0, max_entries=200):
+        self.threshold = threshold_ms / 1000
+        self.sample_rate = sample_rate
+        self.entries = deque(maxlen=max_entries)
+
+    def maybe_record(self, method, route, status, elapsed, stages):
+        if elapsed < self.threshold:
+            return
+        SLOW_REQUESTS.inc(route)
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        breakdown = {}
+        for name, seconds in stages:
+            breakdown[name] = round(breakdown.get(name, 0.0) + seconds * 1000, 3)
+        breakdown["other"] = round(max(0.0, elapsed - sum(s for _, s in stages)) * 1000, 3)
+        entry = {
+            "timestamp": time.time(),
+            "method": method,
+            "route": route,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 3),
+            "stages_ms": breakdown,
+        }
+        self.entries.append(entry)
+        print(f"🐢 Slow request: {method} {route} {status} {entry['duration_ms']}ms {breakdown}")
+
+
+def init_app(app, slow_log: SlowRequestLog):
+    """Install request hooks and the /metrics endpoint on a Flask app"""
+
+    @app.before_request
+    def _start_request():
+        g.metrics_start = time.perf_counter()
+        g.metrics_stages = []
+        g.metrics_token = _current_stages.set(g.metrics_stages)
+        IN_FLIGHT.inc(request.method)
+
+    @app.after_request
+    def _finish_request(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _teardown_request(exc):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        IN_FLIGHT.dec(request.method)
+        _current_stages.reset(g.pop("metrics_token"))
+
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        status = g.pop("metrics_status", 500)
+        REQUEST_SECONDS.observe(elapsed, request.method, route, str(status))
+        if status >= 500:
+            ERRORS.inc(request.method, route, str(status))
+        stages = g.pop("metrics_stages", [])
+        for name, seconds in stages:
+            STAGE_SECONDS.observe(seconds, route, name)
+        slow_log.maybe_record(request.method, route, status, elapsed, stages)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        """Prometheus text exposition of request and crypto metrics"""
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+    @app.route("/metrics/slow-requests", methods=["GET"])
+    def slow_requests():
+        """Recent sampled slow requests with their crypto stage breakdown (development only)"""
+        limit = request.args.get("limit", 50, type=int)
+        return {"threshold_ms": slow_log.threshold * 1000, "requests": list(slow_log.entries)[-limit:]}
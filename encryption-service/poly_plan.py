@@ -0,0 +1,314 @@
+"""
+Polynomial evaluation plans for CKKS scoring
+
+Compiles a coefficient vector into an evaluation schedule that keeps the
+multiplicative depth inside the context's modulus chain and uses as few
+ciphertext multiplications as possible. Plans are pure Python, so they can be
+compiled and inspected without TenSEAL installed.
+"""
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# Default CKKS chain [60, 40, 40, 60] leaves two levels for multiplications
+DEFAULT_MAX_DEPTH = 2
+
+# Coefficients smaller than this are treated as zero and skipped
+ZERO_TOLERANCE = 1e-12
+
+
+@dataclass(frozen=True)
+class PowerStep:
+    """x^target = x^left * x^right"""
+    target: int
+    left: int
+    right: int
+
+
+@dataclass(frozen=True)
+class Term:
+    """
+    coefficient * x^power, optionally with the coefficient fused into the
+    shallower factor: (coefficient * x^fuse_right) * x^fuse_left.
+    """
+    power: int
+    coefficient: float
+    fuse_left: Optional[int] = None
+    fuse_right: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class Block:
+    """Baby-step polynomial multiplied by a giant power: (c0 + sum terms) * x^giant"""
+    giant: int
+    constant: float
+    terms: Tuple[Term, ...]
+
+
+@dataclass(frozen=True)
+class EvaluationPlan:
+    coefficients: Tuple[float, ...]
+    strategy: str
+    powers: Tuple[PowerStep, ...]
+    constant: float
+    terms: Tuple[Term, ...]
+    blocks: Tuple[Block, ...]
+    baby_step: int
+    depth: int
+    ct_multiplications: int
+    scalar_multiplications: int
+
+    @property
+    def degree(self) -> int:
+        return len(self.coefficients) - 1
+
+    @property
+    def rescales(self) -> int:
+        """TenSEAL rescales once after every multiplication"""
+        return self.ct_multiplications + self.scalar_multiplications
+
+    def describe(self) -> dict:
+        return {
+            "degree": self.degree,
+            "strategy": self.strategy,
+            "baby_step": self.baby_step,
+            "depth": self.depth,
+            "ct_multiplications": self.ct_multiplications,
+            "scalar_multiplications": self.scalar_multiplications,
+            "rescales": self.rescales,
+        }
+
+
+def power_depth(power: int) -> int:
+    """Multiplicative depth of x^power built by a balanced product tree"""
+    return math.ceil(math.log2(power)) if power > 1 else 0
+
+
+def _split(power: int) -> Tuple[int, int]:
+    """Split x^power into a power of two and the remainder (depth-optimal)"""
+    left = 1 << (power_depth(power) - 1)
+    return left, power - left
+
+
+def _schedule_powers(needed: List[int]) -> Dict[int, PowerStep]:
+    """Product-tree schedule for every needed power and its dependencies"""
+    steps: Dict[int, PowerStep] = {}
+
+    def visit(power: int):
+        if power <= 1 or power in steps:
+            return
+        left, right = _split(power)
+        visit(left)
+        visit(right)
+        steps[power] = PowerStep(power, left, right)
+
+    for power in sorted(needed):
+        visit(power)
+    return steps
+
+
+def _is_zero(value: float) -> bool:
+    return abs(value) < ZERO_TOLERANCE
+
+
+def _scalar_cost(coefficient: float) -> int:
+    return 0 if coefficient == 1 else 1
+
+
+def _term_depth(power: int, coefficient: float) -> int:
+    return power_depth(power) + _scalar_cost(coefficient)
+
+
+def _fuse_terms(terms: List[Term], steps: Dict[int, PowerStep]) -> Tuple[List[Term], Dict[int, PowerStep]]:
+    """
+    Fold each scalar into the shallower factor of its power when that power is
+    not needed anywhere else, so the scalar rides on an existing level.
+    """
+    used_as_factor = {}
+    for step in steps.values():
+        used_as_factor[step.left] = used_as_factor.get(step.left, 0) + 1
+        used_as_factor[step.right] = used_as_factor.get(step.right, 0) + 1
+
+    fused = []
+    for term in terms:
+        step = steps.get(term.power)
+        if (
+            step is None
+            or used_as_factor.get(term.power)
+            or _scalar_cost(term.coefficient) == 0
+            or power_depth(step.right) >= power_depth(step.left)
+        ):
+            fused.append(term)
+            continue
+        fused.append(Term(term.power, term.coefficient, fuse_left=step.left, fuse_right=step.right))
+        del steps[term.power]
+    return fused, steps
+
+
+def _fused_depth(term: Term) -> int:
+    if term.fuse_left is None:
+        return _term_depth(term.power, term.coefficient)
+    return max(power_depth(term.fuse_left), power_depth(term.fuse_right) + 1) + 1
+
+
+def _compile_direct(coefficients: Tuple[float, ...]) -> EvaluationPlan:
+    terms = [
+        Term(power, coefficient)
+        for power, coefficient in enumerate(coefficients)
+        if power > 0 and not _is_zero(coefficient)
+    ]
+    steps = _schedule_powers([term.power for term in terms])
+    terms, steps = _fuse_terms(terms, steps)
+
+    ct_mults = len(steps) + sum(1 for term in terms if term.fuse_left is not None)
+    scalar_mults = sum(_scalar_cost(term.coefficient) for term in terms)
+    depth = max((_fused_depth(term) for term in terms), default=0)
+
+    return EvaluationPlan(
+        coefficients=coefficients,
+        strategy="direct",
+        powers=tuple(steps[p] for p in sorted(steps)),
+        constant=coefficients[0],
+        terms=tuple(terms),
+        blocks=(),
+        baby_step=0,
+        depth=depth,
+        ct_multiplications=ct_mults,
+        scalar_multiplications=scalar_mults,
+    )
+
+
+def _compile_bsgs(coefficients: Tuple[float, ...]) -> EvaluationPlan:
+    """
+    Baby-step/giant-step: P(x) = q_0(x) + sum_j q_j(x) * x^(j*k) where every
+    q_j has degree < k and shares the baby powers x^1 .. x^(k-1).
+    """
+    size = len(coefficients)
+    baby_step = 1 << math.ceil(math.log2(math.sqrt(size)))
+
+    chunks = [coefficients[start:start + baby_step] for start in range(0, size, baby_step)]
+
+    def baby_terms(chunk):
+        return [
+            Term(power, coefficient)
+            for power, coefficient in enumerate(chunk)
+            if power > 0 and not _is_zero(coefficient)
+        ]
+
+    head_terms = baby_terms(chunks[0])
+    blocks = []
+    needed = [term.power for term in head_terms]
+    for index, chunk in enumerate(chunks[1:], start=1):
+        terms = baby_terms(chunk)
+        if not terms and _is_zero(chunk[0]):
+            continue
+        giant = index * baby_step
+        blocks.append(Block(giant, chunk[0], tuple(terms)))
+        needed.extend(term.power for term in terms)
+        needed.append(giant)
+
+    steps = _schedule_powers(needed)
+
+    ct_mults = len(steps)
+    scalar_mults = sum(_scalar_cost(term.coefficient) for term in head_terms)
+    depth = max((_term_depth(term.power, term.coefficient) for term in head_terms), default=0)
+    for block in blocks:
+        if block.terms:
+            # (c0 + sum c_i x^i) * x^giant
+            ct_mults += 1
+            scalar_mults += sum(_scalar_cost(term.coefficient) for term in block.terms)
+            inner = max(_term_depth(term.power, term.coefficient) for term in block.terms)
+            depth = max(depth, max(inner, power_depth(block.giant)) + 1)
+        else:
+            # Constant-only block degenerates to c0 * x^giant
+            scalar_mults += _scalar_cost(block.constant)
+            depth = max(depth, _term_depth(block.giant, block.constant))
+
+    return EvaluationPlan(
+        coefficients=coefficients,
+        strategy="bsgs",
+        powers=tuple(steps[p] for p in sorted(steps)),
+        constant=coefficients[0],
+        terms=tuple(head_terms),
+        blocks=tuple(blocks),
+        baby_step=baby_step,
+        depth=depth,
+        ct_multiplications=ct_mults,
+        scalar_multiplications=scalar_mults,
+    )
+
+
+def _normalize(coefficients: list) -> Tuple[float, ...]:
+    """Float tuple with trailing zero coefficients dropped"""
+    normalized = tuple(float(c) for c in coefficients)
+    while len(normalized) > 1 and _is_zero(normalized[-1]):
+        normalized = normalized[:-1]
+    if not normalized:
+        raise ValueError("Polynomial needs at least one coefficient")
+    return normalized
+
+
+def compile_plan(coefficients: list, max_depth: int = DEFAULT_MAX_DEPTH) -> EvaluationPlan:
+    """
+    Compile P(x) = a0 + a1*x + a2*x^2 + ... into the cheapest schedule that
+    fits within max_depth levels. Raises ValueError if no strategy fits.
+    """
+    coefficients = _normalize(coefficients)
+    candidates = [_compile_direct(coefficients)]
+    if len(coefficients) > 4:
+        candidates.append(_compile_bsgs(coefficients))
+
+    fitting = [plan for plan in candidates if plan.depth <= max_depth]
+    if not fitting:
+        needed = min(plan.depth for plan in candidates)
+        raise ValueError(
+            f"Degree {len(coefficients) - 1} polynomial needs depth {needed}, "
+            f"context provides {max_depth}"
+        )
+    return min(fitting, key=lambda plan: (plan.ct_multiplications, plan.depth, plan.scalar_multiplications))
+
+
+def evaluate_plan_plain(plan: EvaluationPlan, x: float) -> float:
+    """Run a plan on a plaintext value; reference for precision checks"""
+    powers = {1: x}
+    for step in plan.powers:
+        powers[step.target] = powers[step.left] * powers[step.right]
+
+    def term_value(term: Term) -> float:
+        if term.fuse_left is not None:
+            return (term.coefficient * powers[term.fuse_right]) * powers[term.fuse_left]
+        return term.coefficient * powers[term.power]
+
+    result = plan.constant + sum(term_value(term) for term in plan.terms)
+    for block in plan.blocks:
+        inner = block.constant + sum(term_value(term) for term in block.terms)
+        result += inner * powers[block.giant]
+    return result
+
+
+# ------------------------------
+# Plan cache (keyed by model version)
+# ------------------------------
+
+_PLAN_CACHE: Dict[Tuple[str, int], EvaluationPlan] = {}
+
+
+def get_plan(model_version: str, coefficients: list, max_depth: int = DEFAULT_MAX_DEPTH) -> EvaluationPlan:
+    """
+    Return the compiled plan for a model version, compiling it on first use.
+    A version is immutable: reusing it with different coefficients is an error.
+    """
+    key = (model_version, max_depth)
+    plan = _PLAN_CACHE.get(key)
+    if plan is None:
+        plan = compile_plan(coefficients, max_depth)
+        _PLAN_CACHE[key] = plan
+        return plan
+
+    if _normalize(coefficients) != plan.coefficients:
+        raise ValueError(f"Model version {model_version} was compiled with different coefficients")
+    return plan
+
+
+def clear_plan_cache():
+    _PLAN_CACHE.clear()
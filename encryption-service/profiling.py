@@ -0,0 +1,542 @@
+"""
+Profiling for the FinTrust Encryption Service
+Admin-started sessions that run for a fixed number of seconds inside a
+serving process, under live load, without a restart or external tools:
+
+  * cpu     every thread's Python stack is read (sys._current_frames) every
+            interval_ms of process CPU time (SIGPROF) or, when the session is
+            started off the main thread (the threaded development server), of
+            wall time (a sampler thread), and the distinct stacks are counted;
+            results come back as folded stacks ("a;b;c 42", the input of
+            flamegraph.pl, inferno and speedscope) or as JSON with the top
+            functions. Threads waiting for work are left out unless
+            include_idle is set.
+  * memory  tracemalloc traces allocations for the session; a snapshot at the
+            end is compared with one taken at the start, and the allocation
+            sites that grew are reported with the route whose view they were
+            allocated under.
+
+The sampler takes at most one sample per millisecond (well under a percent
+of a core at the 10 ms default). tracemalloc records a stack for every
+allocation, which makes allocation-heavy code several times slower, so
+memory sessions should last seconds. Both stop by themselves after at most
+PROFILE_MAX_SECONDS. Under the prefork server a session profiles the worker
+that took the start request. Workers handle an even share of the load, so
+that worker is representative. Results are written to PROFILE_DIR, so any
+worker can serve them.
+
+The endpoints answer only requests carrying X-Admin-Token equal to
+ADMIN_TOKEN; without ADMIN_TOKEN they are not served at all.
+
+    POST /admin/profile/cpu?seconds=10&interval_ms=10
+    POST /admin/profile/memory?seconds=10&frames=16
+    GET  /admin/profile/<id>?format=folded
+"""
+import functools
+import hmac
+import inspect
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+
+from flask import Response, abort, has_request_context, jsonify, request
+
+# Frames kept per sampled stack (from the root); deeper ones are cut off
+MAX_STACK_DEPTH = 128
+# Distinct stacks per CPU session; samples of further stacks are counted as truncated
+MAX_STACKS = 20000
+MIN_INTERVAL_MS = 1.0
+MAX_FRAMES = 64
+
+# Leaf frames of threads that are waiting for work rather than running
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("socket.py", "accept"),
+    ("socketserver.py", "serve_forever"),
+    # gunicorn's sync worker between requests
+    ("sync.py", "wait"),
+    ("sync.py", "accept"),
+}
+
+# The sampler SIGPROF is delivered to; the handler stays installed between sessions
+_signal_sampler = None
+
+
+def _on_sigprof(signum, frame):
+    sampler = _signal_sampler
+    if sampler is not None:
+        sampler.on_signal(frame)
+
+
+def can_sample_by_signal():
+    """SIGPROF sampling needs a POSIX timer and its handler installed from the main thread"""
+    return hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+
+
+class ProfilerBusy(Exception):
+    """A session of the same kind is already running in this process"""
+
+
+class RouteMap:
+    """Finds the route whose view a frame belongs to"""
+
+    def __init__(self, routes=()):
+        # CPU samples hold code objects; tracemalloc frames only file and line
+        self.codes = {}
+        self.lines = {}
+        for label, view in routes:
+            code = getattr(inspect.unwrap(view), "__code__", None)
+            if code is None:
+                continue
+            self.codes[code] = label
+            last = max((line for _, _, line in code.co_lines() if line), default=code.co_firstlineno)
+            self.lines.setdefault(code.co_filename, []).append((code.co_firstlineno, last, label))
+
+    def for_line(self, filename, lineno):
+        for first, last, label in self.lines.get(filename, ()):
+            if first <= lineno <= last:
+                return label
+        return None
+
+
+def routes_of(app):
+    """(label, view) for every URL rule of a Flask app"""
+    return [(f"{','.join(sorted(rule.methods - {'HEAD', 'OPTIONS'}))} {rule.rule}", app.view_functions[rule.endpoint])
+            for rule in app.url_map.iter_rules() if rule.endpoint in app.view_functions]
+
+
+def current_route():
+    """Method and URL rule of the request being handled on this thread, for CPU profile samples"""
+    if not has_request_context():
+        return None
+    rule = request.url_rule
+    return f"{request.method} {rule.rule if rule else '(not routed)'}"
+
+
+def _short_path(filename):
+    """The path relative to the longest sys.path entry containing it"""
+    best = filename
+    for entry in sys.path:
+        if entry and filename.startswith(entry + os.sep) and len(filename) - len(entry) - 1 < len(best):
+            best = filename[len(entry) + 1:]
+    return best
+
+
+class CpuSampler:
+    """
+    Counts the Python stacks of the process's threads. Driven by SIGPROF
+    (started from the main thread), a sample is taken every interval of
+    process CPU time, wherever the main thread is running; driven by a
+    thread, every interval of wall time, but only when the sampler gets the
+    GIL, which favours moments when other threads are blocked.
+    """
+
+    def __init__(self, interval, include_idle, route_map):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.route_map = route_map
+        self.mode = None
+        self.stacks = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.truncated_samples = 0
+        self.ticks = 0
+        self.cpu_seconds = 0.0
+        self._idle = {}
+        self._thread_names = {}
+        self._main = threading.main_thread().ident
+
+    def _is_idle(self, code):
+        idle = self._idle.get(code)
+        if idle is None:
+            idle = self._idle[code] = (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+        return idle
+
+    def _thread_name(self, ident):
+        name = self._thread_names.get(ident)
+        if name is None:
+            self._thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            name = self._thread_names.setdefault(ident, f"thread-{ident}")
+        return name
+
+    def _record(self, ident, frame, running, route=None):
+        if not running and not self.include_idle and self._is_idle(frame.f_code):
+            self.idle_samples += 1
+            return
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        codes.reverse()
+        if route is None:
+            for code in codes:
+                route = self.route_map.codes.get(code)
+                if route is not None:
+                    break
+        key = (route or self._thread_name(ident), tuple(codes[:MAX_STACK_DEPTH]))
+        if key in self.stacks or len(self.stacks) < MAX_STACKS:
+            self.stacks[key] += 1
+        else:
+            self.truncated_samples += 1
+        self.samples += 1
+
+    def on_signal(self, frame):
+        started = time.perf_counter()
+        self.ticks += 1
+        for ident, current in sys._current_frames().items():
+            if ident == self._main:
+                # The interrupted frame, not the handler's. The handler runs in
+                # the main thread's context, so its request is known even outside the view
+                self._record(ident, frame, not self._is_idle(frame.f_code), current_route())
+            else:
+                self._record(ident, current, False)
+        self.cpu_seconds += time.perf_counter() - started
+
+    def run_signal(self, seconds, stop):
+        """Arm SIGPROF for `seconds` of wall time; the handler must have been installed from the main thread"""
+        global _signal_sampler
+        self.mode = "signal"
+        _signal_sampler = self
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        try:
+            stop.wait(seconds)
+        finally:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            _signal_sampler = None
+
+    def run_thread(self, seconds, stop):
+        self.mode = "thread"
+        me = threading.get_ident()
+        cpu_started = time.thread_time()
+        deadline = time.perf_counter() + seconds
+        next_at = time.perf_counter()
+        while not stop.is_set():
+            self.ticks += 1
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self._record(ident, frame, False)
+            next_at += self.interval
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            # Late ticks are dropped rather than bunched up
+            if next_at < now:
+                next_at = now + self.interval
+            stop.wait(min(next_at, deadline) - now)
+        self.cpu_seconds = time.thread_time() - cpu_started
+
+    def result(self, limit=50):
+        labels = {}
+
+        def label(code):
+            text = labels.get(code)
+            if text is None:
+                text = labels[code] = f"{_short_path(code.co_filename)}:{code.co_qualname}"
+            return text
+
+        folded = []
+        own = Counter()
+        total = Counter()
+        routes = Counter()
+        for (root, codes), count in self.stacks.most_common():
+            names = [label(code) for code in codes]
+            folded.append([";".join([root] + names), count])
+            routes[root] += count
+            if names:
+                own[names[-1]] += count
+            for name in set(names):
+                total[name] += count
+        samples = max(self.samples, 1)
+        return {
+            "mode": self.mode,
+            "samples": self.samples,
+            "idle_samples_skipped": self.idle_samples,
+            "truncated_samples": self.truncated_samples,
+            "ticks": self.ticks,
+            "sampler_cpu_seconds": round(self.cpu_seconds, 4),
+            "routes": [{"route": root, "samples": count, "percent": round(100 * count / samples, 2)}
+                       for root, count in routes.most_common()],
+            "top_functions": [{"function": name, "self": count, "total": total[name],
+                               "self_percent": round(100 * count / samples, 2)}
+                              for name, count in own.most_common(limit)],
+            "folded": folded,
+        }
+
+
+def memory_report(baseline, final, route_map, limit=50):
+    """Allocation sites and routes that grew between two tracemalloc snapshots"""
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    diffs = final.filter_traces(ignore).compare_to(baseline.filter_traces(ignore), "traceback")
+
+    sites = {}
+    routes = {}
+    for diff in diffs:
+        route = None
+        for frame in diff.traceback:
+            route = route_map.for_line(frame.filename, frame.lineno) or route
+        route = route or "(outside request views)"
+        site = diff.traceback[-1]
+        key = (f"{_short_path(site.filename)}:{site.lineno}", route)
+        for totals in (sites.setdefault(key, [0, 0, 0, 0]), routes.setdefault(route, [0, 0, 0, 0])):
+            totals[0] += diff.size_diff
+            totals[1] += diff.count_diff
+            totals[2] += diff.size
+            totals[3] += diff.count
+
+    def rows(items, keys, order):
+        return [dict(zip(keys, key), size_diff_bytes=v[0], count_diff=v[1], size_bytes=v[2], count=v[3])
+                for key, v in sorted(items, key=lambda item: item[1][order], reverse=True)[:limit]]
+
+    return {
+        "grown": rows(sites.items(), ("site", "route"), 0),
+        "largest": rows(sites.items(), ("site", "route"), 2),
+        "routes": rows((((key,), value) for key, value in routes.items()), ("route",), 0),
+    }
+
+
+class ProfileStore:
+    """Session markers and results as files, readable by every worker"""
+
+    def __init__(self, directory, keep):
+        self.directory = directory
+        self.keep = keep
+
+    def _path(self, session_id, suffix):
+        return os.path.join(self.directory, f"{session_id}.{suffix}")
+
+    def _write(self, path, data):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    def start(self, session):
+        os.makedirs(self.directory, exist_ok=True)
+        self._write(self._path(session["id"], "running"), session)
+
+    def finish(self, session_id, result):
+        self._write(self._path(session_id, "json"), result)
+        try:
+            os.remove(self._path(session_id, "running"))
+        except FileNotFoundError:
+            pass
+        self._prune()
+
+    def get(self, session_id):
+        """The result, the running session's marker, or None for an unknown id"""
+        if not session_id.isalnum():
+            return None
+        for suffix in ("json", "running"):
+            try:
+                with open(self._path(session_id, suffix)) as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                continue
+        return None
+
+    def _prune(self):
+        results = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                   if name.endswith(".json")]
+        results.sort(key=os.path.getmtime)
+        for path in results[:-self.keep]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class Profiler:
+    """Starts CPU and allocation sessions in this process, one of each kind at a time"""
+
+    def __init__(self, store, max_seconds):
+        self.store = store
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self._running = {}
+        self._stop = threading.Event()
+
+    def _begin(self, kind, seconds, options):
+        seconds = min(max(float(seconds), 1.0), self.max_seconds)
+        now = time.time()
+        session = {"id": uuid.uuid4().hex, "kind": kind, "status": "running", "pid": os.getpid(),
+                   "started_at": now, "until": now + seconds, "seconds": seconds, **options}
+        with self._lock:
+            if kind in self._running:
+                raise ProfilerBusy(f"A {kind} profile is already running in this worker "
+                                   f"(session {self._running[kind]['id']})")
+            self._running[kind] = session
+        try:
+            self.store.start(session)
+        except OSError:
+            with self._lock:
+                del self._running[kind]
+            raise
+        return session
+
+    def _end(self, session, result, status="complete"):
+        result = {**session, **result, "status": status, "finished_at": time.time()}
+        try:
+            self.store.finish(session["id"], result)
+        except OSError as e:
+            print(f"❌ Could not store profile {session['id']}: {e}")
+        with self._lock:
+            del self._running[session["kind"]]
+        print(f"🔬 {session['kind'].upper()} profile {session['id']} {status}")
+
+    def _fail(self, session, error):
+        self._end(session, {"error": f"{type(error).__name__}: {error}"}, "failed")
+
+    def start_cpu(self, routes, seconds=10.0, interval_ms=10.0, include_idle=False, mode="auto"):
+        """mode: "signal", "thread", or "auto" for signal whenever this is the main thread"""
+        if mode not in ("auto", "signal", "thread"):
+            raise ValueError(f"Unknown sampling mode {mode!r}")
+        if mode != "thread" and not can_sample_by_signal():
+            if mode == "signal":
+                raise ValueError("SIGPROF sampling must be started from the main thread")
+            mode = "thread"
+        if mode != "thread" and signal.getsignal(signal.SIGPROF) not in (signal.SIG_DFL, signal.SIG_IGN, _on_sigprof):
+            if mode == "signal":
+                raise ValueError("SIGPROF already has a handler in this process")
+            mode = "thread"
+        if mode == "auto":
+            mode = "signal"
+        interval_ms = max(float(interval_ms), MIN_INTERVAL_MS)
+        session = self._begin("cpu", seconds, {"mode": mode, "interval_ms": interval_ms,
+                                               "include_idle": include_idle})
+        sampler = CpuSampler(interval_ms / 1000, include_idle, RouteMap(routes))
+        if mode == "signal":
+            signal.signal(signal.SIGPROF, _on_sigprof)
+
+        def run():
+            try:
+                if mode == "signal":
+                    sampler.run_signal(session["seconds"], self._stop)
+                else:
+                    sampler.run_thread(session["seconds"], self._stop)
+                result = sampler.result()
+                result["sampler_cpu_percent"] = round(100 * sampler.cpu_seconds / session["seconds"], 3)
+            except Exception as e:
+                self._fail(session, e)
+                return
+            self._end(session, result)
+
+        threading.Thread(target=run, name="fintrust-cpu-profile", daemon=True).start()
+        return session
+
+    def start_memory(self, routes, seconds=10.0, frames=16):
+        frames = min(max(int(frames), 1), MAX_FRAMES)
+        session = self._begin("memory", seconds, {"frames": frames})
+        route_map = RouteMap(routes)
+        # Tracing switched on some other way (PYTHONTRACEMALLOC) is left on
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(frames)
+        baseline = tracemalloc.take_snapshot()
+
+        def run():
+            try:
+                self._stop.wait(session["seconds"])
+                final = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                overhead = tracemalloc.get_tracemalloc_memory()
+                if started_tracing:
+                    tracemalloc.stop()
+                result = memory_report(baseline, final, route_map)
+            except Exception as e:
+                if started_tracing and tracemalloc.is_tracing():
+                    tracemalloc.stop()
+                self._fail(session, e)
+                return
+            result.update(traced_bytes=current, traced_peak_bytes=peak, tracemalloc_overhead_bytes=overhead)
+            self._end(session, result)
+
+        threading.Thread(target=run, name="fintrust-memory-profile", daemon=True).start()
+        return session
+
+    def result(self, session_id):
+        """A session's result (status "complete" or "failed"), or its marker while it runs"""
+        found = self.store.get(session_id)
+        if found is not None and found["status"] == "running" and time.time() > found["until"] + 60:
+            # The worker that ran it went away before writing a result
+            found["status"] = "lost"
+        return found
+
+
+def render_folded(result):
+    """A CPU result as folded stacks, one "frame;frame;frame samples" line per stack"""
+    return "".join(f"{stack} {count}\n" for stack, count in result.get("folded", []))
+
+
+profiler = Profiler(
+    ProfileStore(os.getenv("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "fintrust-profiles"),
+                 int(os.getenv("PROFILE_KEEP_RESULTS", "20"))),
+    float(os.getenv("PROFILE_MAX_SECONDS", "300")),
+)
+
+
+def _admin_only(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = os.getenv("ADMIN_TOKEN")
+        if not token:
+            abort(404)
+        if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), token):
+            return jsonify({"error": "Admin token required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def init_app(app):
+    """Install the /admin/profile endpoints on a Flask app"""
+
+    def started(start, **options):
+        try:
+            session = start(routes_of(app), **options)
+        except ProfilerBusy as e:
+            return jsonify({"error": str(e)}), 409
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        print(f"🔬 {session['kind'].upper()} profile {session['id']} ({session['seconds']}s) started")
+        return jsonify(session), 202
+
+    @app.route("/admin/profile/cpu", methods=["POST"])
+    @_admin_only
+    def start_cpu_profile():
+        """Sample this worker's Python stacks for `seconds`; the result is at GET /admin/profile/<id>"""
+        return started(profiler.start_cpu,
+                       seconds=request.args.get("seconds", 10.0, type=float),
+                       interval_ms=request.args.get("interval_ms", 10.0, type=float),
+                       include_idle=request.args.get("include_idle", "false").lower() == "true",
+                       mode=request.args.get("mode", "auto"))
+
+    @app.route("/admin/profile/memory", methods=["POST"])
+    @_admin_only
+    def start_memory_profile():
+        """Trace this worker's allocations for `seconds` (slows every allocation meanwhile)"""
+        return started(profiler.start_memory,
+                       seconds=request.args.get("seconds", 10.0, type=float),
+                       frames=request.args.get("frames", 16, type=int))
+
+    @app.route("/admin/profile/<session_id>", methods=["GET"])
+    @_admin_only
+    def get_profile(session_id):
+        """A profile session's result (format=folded for CPU flame graphs), or 202 while it runs"""
+        result = profiler.result(session_id)
+        if result is None:
+            return jsonify({"error": "Unknown profile session"}), 404
+        if result["status"] == "running":
+            return jsonify(result), 202
+        if request.args.get("format") == "folded":
+            if result["kind"] != "cpu":
+                return jsonify({"error": "Folded output is for CPU profiles"}), 400
+            return Response(render_folded(result), mimetype="text/plain")
+        return jsonify(result)
@@ -0,0 +1,137 @@
+"""
+Startup for the FinTrust Encryption Service
+Service state that is slow to build (the Fernet keys behind the cryptography
+import and, with HE_ENABLED, the TenSEAL/numpy imports and a CKKS context
+with Galois keys) is kept in Components, built once by whichever thread asks
+first. STARTUP_MODE decides when that happens:
+
+    background  serve at once, warm every component in a thread (default)
+    lazy        build each component on its first use only
+    eager       warm everything before the first request is served
+
+/health (liveness) answers as soon as Flask is up; /ready answers 200 once
+warm-up has finished.
+"""
+import os
+import threading
+import time
+
+from metrics import STARTUP_SECONDS
+
+MODES = ("background", "lazy", "eager")
+
+
+class Component:
+    """A piece of service state built once, on first use or by warm-up"""
+
+    def __init__(self, name, build):
+        self.name = name
+        self._build = build
+        self._lock = threading.Lock()
+        self._value = None
+        self._built = False
+        self.seconds = None
+        self.error = None
+
+    @property
+    def ready(self):
+        return self._built
+
+    @property
+    def last(self):
+        """The most recently built value (None before the first build); never builds"""
+        return self._value
+
+    def get(self):
+        if self._built:
+            return self._value
+        with self._lock:
+            if not self._built:
+                start = time.perf_counter()
+                try:
+                    value = self._build()
+                except Exception as e:
+                    # Left unbuilt: the next get() tries again
+                    self.error = f"{type(e).__name__}: {e}"
+                    raise
+                self.seconds = time.perf_counter() - start
+                STARTUP_SECONDS.set(self.name, value=self.seconds)
+                self._value, self._built, self.error = value, True, None
+        return self._value
+
+    def rebuild(self):
+        """Build a fresh value and swap it in, e.g. to rotate a key"""
+        with self._lock:
+            self._built = False
+        return self.get()
+
+    def describe(self):
+        return {
+            "ready": self._built,
+            "seconds": round(self.seconds, 4) if self.seconds is not None else None,
+            "error": self.error,
+        }
+
+
+class Startup:
+    """Warms the registered components in order, according to the startup mode"""
+
+    def __init__(self, mode="background"):
+        if mode not in MODES:
+            raise ValueError(f"STARTUP_MODE must be one of {', '.join(MODES)}, got {mode!r}")
+        self.mode = mode
+        self.components = []
+        self._start_lock = threading.Lock()
+        self._started = None
+        self._finished = None
+
+    def component(self, name, build):
+        component = Component(name, build)
+        self.components.append(component)
+        return component
+
+    def start(self):
+        """
+        Begin warm-up (idempotent, so it can also run on every request). In
+        eager mode this returns once every component has been built.
+        """
+        if self._started is not None:
+            return
+        with self._start_lock:
+            if self._started is not None:
+                return
+            self._started = time.perf_counter()
+        if self.mode == "eager":
+            self._warm()
+        elif self.mode == "background":
+            threading.Thread(target=self._warm, name="fintrust-warmup", daemon=True).start()
+
+    def _warm(self):
+        for component in self.components:
+            try:
+                component.get()
+            except Exception:
+                print(f"❌ Warm-up of {component.name} failed: {component.error}")
+        self._finished = time.perf_counter()
+        STARTUP_SECONDS.set("warmup", value=self._finished - self._started)
+        print(f"🔥 Warm-up finished in {(self._finished - self._started) * 1000:.1f}ms")
+
+    @property
+    def state(self):
+        if self._started is None:
+            return "starting"
+        if self.mode == "lazy" or all(component.ready for component in self.components):
+            return "ready"
+        # Every component was tried and one failed; it is retried on use
+        return "failed" if self._finished is not None else "starting"
+
+    def report(self):
+        return {
+            "status": self.state,
+            "mode": self.mode,
+            "components": {component.name: component.describe() for component in self.components},
+        }
+
+
+def from_env():
+    return Startup(os.getenv("STARTUP_MODE", "background"))
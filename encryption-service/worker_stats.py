@@ -0,0 +1,125 @@
+"""
+Worker statistics for the FinTrust Encryption Service
+Per-worker request and CPU counters for the prefork server (gunicorn.conf.py).
+The master maps an anonymous shared region before forking and hands each
+worker a slot; a worker writes only its own slot, so there is no locking,
+and any worker can read them all for GET /metrics/workers and the
+fintrust_worker_* series on /metrics.
+"""
+import mmap
+import os
+import struct
+import time
+
+import metrics
+
+# pid, requests, errors, started (epoch), busy seconds, user CPU, system CPU
+_SLOT = struct.Struct("qqqdddd")
+# Claimed by the master, not yet taken over by the forked worker
+_RESERVED = -1
+
+
+class WorkerStats:
+    def __init__(self, slots):
+        self.slots = slots
+        self._map = mmap.mmap(-1, _SLOT.size * slots)
+        self._slot = None
+
+    def _read(self, slot):
+        return _SLOT.unpack_from(self._map, slot * _SLOT.size)
+
+    def _write(self, slot, *values):
+        _SLOT.pack_into(self._map, slot * _SLOT.size, *values)
+
+    def claim(self) -> int:
+        """Master, before forking a worker: a free slot, cleared and reserved"""
+        for slot in range(self.slots):
+            if self._read(slot)[0] == 0:
+                self._write(slot, _RESERVED, 0, 0, 0.0, 0.0, 0.0, 0.0)
+                return slot
+        raise RuntimeError(f"All {self.slots} worker stat slots are in use")
+
+    def release(self, slot):
+        """Master, once the worker has exited"""
+        self._write(slot, 0, 0, 0, 0.0, 0.0, 0.0, 0.0)
+
+    def bind(self, slot):
+        """Worker, right after the fork: take over the slot claimed for it"""
+        self._slot = slot
+        cpu = os.times()
+        self._write(slot, os.getpid(), 0, 0, time.time(), 0.0, cpu.user, cpu.system)
+
+    def record(self, seconds, failed):
+        """Worker, after each request"""
+        if self._slot is None:
+            return
+        pid, requests, errors, started, busy, _, _ = self._read(self._slot)
+        cpu = os.times()
+        self._write(self._slot, pid, requests + 1, errors + bool(failed), started, busy + seconds,
+                    cpu.user, cpu.system)
+
+    def snapshot(self) -> list:
+        now = time.time()
+        workers = []
+        for slot in range(self.slots):
+            pid, requests, errors, started, busy, user, system = self._read(slot)
+            if pid <= 0:
+                continue
+            uptime = max(now - started, 1e-9)
+            workers.append({
+                "slot": slot,
+                "pid": pid,
+                "uptime_seconds": round(uptime, 3),
+                "requests": requests,
+                "errors": errors,
+                "busy_seconds": round(busy, 6),
+                "cpu_user_seconds": round(user, 3),
+                "cpu_system_seconds": round(system, 3),
+                # Share of wall time spent in requests and on a CPU
+                "busy_ratio": round(busy / uptime, 4),
+                "cpu_ratio": round((user + system) / uptime, 4),
+            })
+        return workers
+
+
+# Set by the prefork server's master before the first fork; None on the development server
+STATS = None
+
+
+def enable(slots) -> WorkerStats:
+    global STATS
+    if STATS is None:
+        STATS = WorkerStats(slots)
+    return STATS
+
+
+class _WorkerSeries:
+    """Renders one snapshot field per live worker, labelled by pid"""
+
+    def __init__(self, name, help_text, kind, fields):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        # (extra label string, snapshot field)
+        self.fields = fields
+
+    def render(self):
+        if STATS is None:
+            return
+        for worker in STATS.snapshot():
+            for extra, field in self.fields:
+                labels = f'pid="{worker["pid"]}"' + (f",{extra}" if extra else "")
+                yield f"{self.name}{{{labels}}} {worker[field]}"
+
+
+metrics._register(_WorkerSeries(
+    "fintrust_worker_requests_total", "Requests handled per prefork worker", "counter", [("", "requests")]))
+metrics._register(_WorkerSeries(
+    "fintrust_worker_errors_total", "Requests that failed with a 5xx status per prefork worker", "counter",
+    [("", "errors")]))
+metrics._register(_WorkerSeries(
+    "fintrust_worker_busy_seconds_total", "Wall time spent handling requests per prefork worker", "counter",
+    [("", "busy_seconds")]))
+metrics._register(_WorkerSeries(
+    "fintrust_worker_cpu_seconds_total", "CPU time per prefork worker", "counter",
+    [('mode="user"', "cpu_user_seconds"), ('mode="system"', "cpu_system_seconds")]))
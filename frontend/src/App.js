@@ -69,13 +69,12 @@ function App() {
     try {
       setLoading(true);
 
-      // Load accounts
-      const accountsResponse = await api.get('/api/v1/accounts');
-      setAccounts(accountsResponse.data.accounts || []);
-
-      // Load transactions  
-      const transactionsResponse = await api.get('/api/v1/transactions');
-      setTransactions(transactionsResponse.data.transactions || []);
+      // Accounts and transactions in one request
+      const dashboardResponse = await api.get('/api/v1/dashboard', {
+        params: { fields: 'accounts,transactions' }
+      });
+      setAccounts(dashboardResponse.data.accounts?.accounts || []);
+      setTransactions(dashboardResponse.data.transactions || []);
 
     } catch (err) {
       setError(`Failed to load data: ${err.response?.data?.detail || err.message}`);